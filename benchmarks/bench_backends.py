@@ -0,0 +1,86 @@
+"""Compares per operation latency of local cache backends and memcached
+adapters (if a client package is installed and memcached is running at
+MEMCACHED_HOST, defaults to 127.0.0.1). Multiple keys operations use
+100 keys.
+
+Usage::
+
+    $ python benchmarks/bench_backends.py
+"""
+
+import os
+import shutil
+import tempfile
+import warnings
+from timeit import repeat
+
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.sqlite import SQLiteCache
+
+NUMBER = 2000
+KEYS = ["key%d" % i for i in range(100)]
+MAPPING = dict((key, "value of " + key) for key in KEYS)
+
+
+def memcached():
+    host = os.environ.get("MEMCACHED_HOST", "127.0.0.1")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            from wheezy.caching.memcache import MemcachedClient
+
+            client = MemcachedClient([host])
+            if client.set("bench", 1):
+                yield "python-memcached", client
+        except ImportError:
+            pass
+        try:
+            from wheezy.core.pooling import EagerPool
+
+            from wheezy.caching.pylibmc import MemcachedClient, client_factory
+
+            pool = EagerPool(lambda: client_factory([host]), size=1)
+            client = MemcachedClient(pool)
+            if client.set("bench", 1):
+                yield "pylibmc", client
+        except Exception:
+            pass
+
+
+def measure(cache):
+    cache.set_multi(MAPPING, 100)
+    results = []
+    for stmt in (
+        lambda: cache.get("key1"),
+        lambda: cache.set("key1", "value", 100),
+        lambda: cache.get_multi(KEYS),
+        lambda: cache.set_multi(MAPPING, 100),
+    ):
+        t = min(repeat(stmt, number=NUMBER, repeat=3))
+        results.append(t * 1e6 / NUMBER)
+    return results
+
+
+def main():
+    path = tempfile.mkdtemp()
+    try:
+        backends = [
+            ("MemoryCache", MemoryCache()),
+            ("SQLiteCache", SQLiteCache(os.path.join(path, "cache.db"))),
+        ]
+        backends.extend(memcached())
+        print(
+            "%-18s %10s %10s %14s %14s"
+            % ("backend", "get us", "set us", "get_multi us", "set_multi us")
+        )
+        for name, cache in backends:
+            print(
+                "%-18s %10.1f %10.1f %14.1f %14.1f"
+                % ((name,) + tuple(measure(cache)))
+            )
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Compares MemoryCache operations timed by system and coarse clocks.
+
+Usage::
+
+    $ python benchmarks/bench_clock.py
+"""
+
+from timeit import repeat
+
+from wheezy.caching.clock import CoarseClock, FakeClock
+from wheezy.caching.memory import MemoryCache
+
+NUMBER = 200000
+
+
+def main():
+    coarse = CoarseClock()
+    try:
+        print("%-12s %12s %12s" % ("clock", "get ns/op", "set ns/op"))
+        for name, clock in (
+            ("system", None),
+            ("coarse", coarse),
+            ("fake", FakeClock()),
+        ):
+            cache = MemoryCache(clock=clock)
+            cache.set("k", 1, 100)
+            get = min(repeat(lambda: cache.get("k"), number=NUMBER, repeat=5))
+            set = min(
+                repeat(lambda: cache.set("k", 1, 100), number=NUMBER, repeat=5)
+            )
+            print(
+                "%-12s %12.1f %12.1f"
+                % (name, get * 1e9 / NUMBER, set * 1e9 / NUMBER)
+            )
+    finally:
+        coarse.stop()
+
+
+if __name__ == "__main__":
+    main()
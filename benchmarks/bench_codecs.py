@@ -0,0 +1,77 @@
+"""Measures serialize and deserialize time per codec and value shape.
+
+Usage::
+
+    $ python benchmarks/bench_codecs.py [number of rounds]
+"""
+
+import sys
+from datetime import date
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from time import perf_counter
+
+from wheezy.caching.codec import BytesCodec, MarshalCodec, PickleCodec
+
+SHAPES = {
+    "small dict": {"id": 1, "name": "item", "price": 9.99, "tags": ["a"]},
+    "rows": [(i, "name%d" % i, i * 0.5) for i in range(1000)],
+    "text": "<p>fragment</p>" * 1000,
+    "blob": b"\x00" * (1 << 20),
+    "dict with blob": {"id": 1, "image": b"\x00" * (1 << 20)},
+    "objects": [date(2020, 1, 1 + i % 28) for i in range(1000)],
+}
+
+
+class ClientPickle(object):
+    """Pickle as memcached clients do it."""
+
+    def encode(self, value):
+        return dumps(value, HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        return loads(data)
+
+
+CODECS = {
+    "client pickle": ClientPickle(),
+    "pickle": PickleCodec(),
+    "marshal": MarshalCodec(),
+    "bytes": BytesCodec(),
+}
+
+
+def measure(codec, value, rounds):
+    try:
+        data = codec.encode(value)
+    except (TypeError, ValueError):
+        return None
+    encode = codec.encode
+    decode = codec.decode
+    view = memoryview(data)
+    start = perf_counter()
+    for _ in range(rounds):
+        encode(value)
+    dumps_time = perf_counter() - start
+    start = perf_counter()
+    for _ in range(rounds):
+        decode(view)
+    loads_time = perf_counter() - start
+    return dumps_time / rounds * 1e6, loads_time / rounds * 1e6, len(data)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(
+        "%-15s %-14s %12s %12s %10s"
+        % ("shape", "codec", "dumps, us", "loads, us", "bytes")
+    )
+    for shape, value in SHAPES.items():
+        for name, codec in CODECS.items():
+            result = measure(codec, value, rounds)
+            if result is None:
+                continue
+            print("%-15s %-14s %12.2f %12.2f %10d" % ((shape, name) + result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measures the overhead of hot keys sampling on MemoryCache reads and
+how well the sampled top keys match the real ones.
+
+Usage::
+
+    $ python benchmarks/bench_hotkeys.py [sampling rate] [capacity]
+"""
+
+import random
+import sys
+from collections import Counter
+from time import perf_counter
+
+from wheezy.caching.hotkeys import HotKeys
+from wheezy.caching.memory import MemoryCache
+
+READS = 1000000
+KEYS = 100000
+
+
+def workload():
+    """Zipf like reads: a few keys take a large share of traffic."""
+    rnd = random.Random(7)
+    weights = [1.0 / (i + 1) for i in range(KEYS)]
+    return rnd.choices(["key%d" % i for i in range(KEYS)], weights, k=READS)
+
+
+def run(cache, keys):
+    get = cache.get
+    start = perf_counter()
+    for key in keys:
+        get(key)
+    return (perf_counter() - start) / len(keys) * 1e9
+
+
+def main():
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 0.01
+    capacity = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    keys = workload()
+    hot_keys = HotKeys(rate, capacity)
+    caches = (
+        ("MemoryCache", MemoryCache()),
+        ("MemoryCache(hot_keys)", MemoryCache(hot_keys=hot_keys)),
+    )
+    for name, cache in caches:
+        cache.set_multi(dict((key, key) for key in set(keys)), 3600)
+    for name, cache in caches:
+        run(cache, keys)
+    hot_keys.clear()
+    for name, cache in caches:
+        print("%-25s %8.1f ns/get" % (name, run(cache, keys)))
+    actual = Counter(keys).most_common(10)
+    sampled = hot_keys.top(10)
+    print(
+        "\n%-10s %10s %8s   %-10s %10s %8s"
+        % ("key", "reads", "share", "sampled", "reads", "share")
+    )
+    for (key, count), (skey, reads, share) in zip(actual, sampled):
+        print(
+            "%-10s %10d %7.2f%%   %-10s %10d %7.2f%%"
+            % (key, count, count * 100.0 / READS, skey, reads, share * 100)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Compares memory taken by MemoryCache and CompactMemoryCache.
+
+Usage::
+
+    $ python benchmarks/bench_memory.py [number of entries]
+"""
+
+import sys
+import tracemalloc
+
+from wheezy.caching.compact import CompactMemoryCache
+from wheezy.caching.memory import MemoryCache
+
+
+def measure(factory, n):
+    keys = ["key%d" % i for i in range(n)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = factory()
+    for start in range(0, n, 1000):
+        stop = start + 1000
+        cache.set_multi(dict((k, 1) for k in keys[start:stop]), 600)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print("%-24s %12s %12s" % ("cache", "MB", "bytes/entry"))
+    for name, factory in (
+        ("MemoryCache", MemoryCache),
+        ("CompactMemoryCache", CompactMemoryCache),
+    ):
+        used = measure(factory, n)
+        print("%-24s %12.1f %12.1f" % (name, used / 1e6, used / n))
+
+
+if __name__ == "__main__":
+    main()
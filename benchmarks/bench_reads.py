@@ -0,0 +1,70 @@
+"""Measures read heavy (99% get) cache throughput and latency as a
+number of threads grows.
+
+Usage::
+
+    $ python benchmarks/bench_reads.py
+
+Unbounded MemoryCache serves hits without taking the lock, while
+bounded one takes it to keep eviction order.
+"""
+
+import sys
+from threading import Barrier, Thread
+from time import perf_counter
+
+from wheezy.caching.memory import MemoryCache
+
+OPS = 400000
+KEYS = ["key%d" % i for i in range(10000)]
+
+
+def worker(cache, barrier, n):
+    keys = KEYS
+    get = cache.get
+    set = cache.set
+    barrier.wait()
+    for i in range(n):
+        key = keys[i % 10000]
+        if i % 100 == 0:
+            set(key, i, 100)
+        else:
+            get(key)
+
+
+def run(cache, threads):
+    for key in KEYS:
+        cache.set(key, key, 100)
+    n = OPS // threads
+    barrier = Barrier(threads + 1)
+    workers = [
+        Thread(target=worker, args=(cache, barrier, n)) for i in range(threads)
+    ]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = perf_counter()
+    for t in workers:
+        t.join()
+    return perf_counter() - start
+
+
+def main():
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("GIL enabled: %s" % gil)
+    print("%-24s %8s %12s %12s" % ("cache", "threads", "ops/s", "ns/op"))
+    for name, factory in (
+        ("MemoryCache", MemoryCache),
+        ("MemoryCache(max_items)", lambda: MemoryCache(max_items=20000)),
+    ):
+        for threads in (1, 2, 4, 8, 16):
+            elapsed = run(factory(), threads)
+            ops = OPS // threads * threads
+            print(
+                "%-24s %8d %12.0f %12.1f"
+                % (name, threads, ops / elapsed, elapsed * 1e9 / ops)
+            )
+
+
+if __name__ == "__main__":
+    main()
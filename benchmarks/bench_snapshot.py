@@ -0,0 +1,43 @@
+"""Measures MemoryCache dump and load time.
+
+Usage::
+
+    $ python benchmarks/bench_snapshot.py [number of items]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+from wheezy.caching.memory import MemoryCache
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    cache = MemoryCache()
+    for start in range(0, n, 10000):
+        cache.set_multi(
+            dict(("key%d" % i, i) for i in range(start, start + 10000)), 3600
+        )
+    path = tempfile.mkdtemp()
+    try:
+        snapshot = os.path.join(path, "snapshot")
+        start = perf_counter()
+        cache.dump(snapshot)
+        dump = perf_counter() - start
+        cache = MemoryCache()
+        start = perf_counter()
+        cache.load(snapshot)
+        load = perf_counter() - start
+        print(
+            "items: %d, file: %.1f MB" % (n, os.path.getsize(snapshot) / 1e6)
+        )
+        print("dump: %.2f s, load: %.2f s" % (dump, load))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Measures cache throughput as a number of threads grows.
+
+Usage::
+
+    $ python benchmarks/bench_threads.py
+
+On free-threaded builds (python3.13t, python3.14t) ShardedMemoryCache
+throughput rises with a number of threads, while MemoryCache is
+serialized by its single lock.
+"""
+
+import sys
+from threading import Barrier, Thread
+from time import perf_counter
+
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.sharded import ShardedMemoryCache
+
+OPS = 200000
+KEYS = ["key%d" % i for i in range(10000)]
+
+
+def worker(cache, barrier, n):
+    keys = KEYS
+    get = cache.get
+    set = cache.set
+    barrier.wait()
+    for i in range(n):
+        key = keys[i % 10000]
+        if i % 10 == 0:
+            set(key, i, 100)
+        else:
+            get(key)
+
+
+def run(cache, threads):
+    n = OPS // threads
+    barrier = Barrier(threads + 1)
+    workers = [
+        Thread(target=worker, args=(cache, barrier, n)) for i in range(threads)
+    ]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = perf_counter()
+    for t in workers:
+        t.join()
+    return n * threads / (perf_counter() - start)
+
+
+def main():
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("GIL enabled: %s" % gil)
+    print("%-24s %8s %12s" % ("cache", "threads", "ops/s"))
+    for name, factory in (
+        ("MemoryCache", MemoryCache),
+        ("ShardedMemoryCache", lambda: ShardedMemoryCache(shards=32)),
+    ):
+        for threads in (1, 2, 4, 8, 16, 32):
+            ops = run(factory(), threads)
+            print("%-24s %8d %12.0f" % (name, threads, ops))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,18 @@
 from wheezy.caching.client import CacheClient
+from wheezy.caching.compact import CompactMemoryCache
 from wheezy.caching.dependency import CacheDependency
 from wheezy.caching.memory import MemoryCache
 from wheezy.caching.null import NullCache
+from wheezy.caching.sharded import ShardedMemoryCache
+from wheezy.caching.tiered import TieredCache
 
-__all__ = ("CacheClient", "CacheDependency", "MemoryCache", "NullCache")
+__all__ = (
+    "CacheClient",
+    "CacheDependency",
+    "CompactMemoryCache",
+    "MemoryCache",
+    "NullCache",
+    "ShardedMemoryCache",
+    "TieredCache",
+)
 __version__ = "0.1"
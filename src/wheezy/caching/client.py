@@ -1,3 +1,6 @@
+from wheezy.caching.utils import jitter_multi, jitter_time
+
+
 class CacheClient(object):
     """CacheClient serves mediator purpose between a single entry
     point that implements Cache and one or many namespaces
@@ -7,25 +10,45 @@ class CacheClient(object):
     effectively hiding details from client code.
     """
 
-    def __init__(self, namespaces, default_namespace):
+    def __init__(
+        self, namespaces, default_namespace, hot_keys=None, jitter=None
+    ):
         """
         ``namespaces`` - a mapping between namespace and cache.
         ``default_namespace`` - namespace to use in case it is not
             specified in cache operation.
+        ``hot_keys`` - a sampler of reads per namespace (see
+            ``wheezy.caching.hotkeys.HotKeys``).
+        ``jitter`` - a mapping between namespace and a fraction of
+            ``time`` a write is shortened by at random, so items
+            written together do not expire at once.
         """
         self.default_namespace = default_namespace
         self.namespaces = namespaces
+        self.hot_keys = hot_keys
+        self.jitter = jitter or {}
+        assert all(0 <= j < 1 for j in self.jitter.values())
 
     def set(self, key, value, time=0, namespace=None):
         """Sets a key's value, regardless of previous contents
         in cache.
         """
         namespace = namespace or self.default_namespace
+        if namespace in self.jitter:
+            time = jitter_time(time, self.jitter[namespace])
         return self.namespaces[namespace].set(key, value, time, namespace)
 
     def set_multi(self, mapping, time=0, namespace=None):
         """Set multiple keys' values at once."""
         namespace = namespace or self.default_namespace
+        if namespace in self.jitter:
+            return jitter_multi(
+                self.namespaces[namespace].set_multi,
+                mapping,
+                time,
+                self.jitter[namespace],
+                namespace,
+            )
         return self.namespaces[namespace].set_multi(mapping, time, namespace)
 
     def add(self, key, value, time=0, namespace=None):
@@ -33,6 +56,8 @@ class CacheClient(object):
         already.
         """
         namespace = namespace or self.default_namespace
+        if namespace in self.jitter:
+            time = jitter_time(time, self.jitter[namespace])
         return self.namespaces[namespace].add(key, value, time, namespace)
 
     def add_multi(self, mapping, time=0, namespace=None):
@@ -40,11 +65,21 @@ class CacheClient(object):
         already in cache.
         """
         namespace = namespace or self.default_namespace
+        if namespace in self.jitter:
+            return jitter_multi(
+                self.namespaces[namespace].add_multi,
+                mapping,
+                time,
+                self.jitter[namespace],
+                namespace,
+            )
         return self.namespaces[namespace].add_multi(mapping, time, namespace)
 
     def replace(self, key, value, time=0, namespace=None):
         """Replaces a key's value, failing if item isn't already."""
         namespace = namespace or self.default_namespace
+        if namespace in self.jitter:
+            time = jitter_time(time, self.jitter[namespace])
         return self.namespaces[namespace].replace(key, value, time, namespace)
 
     def replace_multi(self, mapping, time=0, namespace=None):
@@ -52,6 +87,14 @@ class CacheClient(object):
         keys not in cache.
         """
         namespace = namespace or self.default_namespace
+        if namespace in self.jitter:
+            return jitter_multi(
+                self.namespaces[namespace].replace_multi,
+                mapping,
+                time,
+                self.jitter[namespace],
+                namespace,
+            )
         return self.namespaces[namespace].replace_multi(
             mapping, time, namespace
         )
@@ -59,6 +102,8 @@ class CacheClient(object):
     def get(self, key, namespace=None):
         """Looks up a single key."""
         namespace = namespace or self.default_namespace
+        if self.hot_keys is not None:
+            self.hot_keys.sample(key, namespace)
         return self.namespaces[namespace].get(key, namespace)
 
     def get_multi(self, keys, namespace=None):
@@ -66,8 +111,64 @@ class CacheClient(object):
         This is the recommended way to do bulk loads.
         """
         namespace = namespace or self.default_namespace
+        if self.hot_keys is not None:
+            keys = list(keys)
+            self.hot_keys.sample_multi(keys, namespace)
         return self.namespaces[namespace].get_multi(keys, namespace)
 
+    def gets(self, key, namespace=None):
+        """Looks up a single key, returns a tuple of value and cas
+        token.
+        """
+        namespace = namespace or self.default_namespace
+        if self.hot_keys is not None:
+            self.hot_keys.sample(key, namespace)
+        return self.namespaces[namespace].gets(key, namespace)
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys, returns a dict of found keys to a
+        tuple of value and cas token.
+        """
+        namespace = namespace or self.default_namespace
+        if self.hot_keys is not None:
+            keys = list(keys)
+            self.hot_keys.sample_multi(keys, namespace)
+        return self.namespaces[namespace].gets_multi(keys, namespace)
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``.
+        """
+        namespace = namespace or self.default_namespace
+        if namespace in self.jitter:
+            time = jitter_time(time, self.jitter[namespace])
+        return self.namespaces[namespace].cas(
+            key, value, token, time, namespace
+        )
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        namespace = namespace or self.default_namespace
+        return self.namespaces[namespace].touch(key, time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        namespace = namespace or self.default_namespace
+        return self.namespaces[namespace].touch_multi(keys, time, namespace)
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+        """
+        namespace = namespace or self.default_namespace
+        if self.hot_keys is not None:
+            self.hot_keys.sample(key, namespace)
+        return self.namespaces[namespace].get_and_touch(key, time, namespace)
+
     def delete(self, key, seconds=0, namespace=None):
         """Deletes a key from cache."""
         namespace = namespace or self.default_namespace
@@ -0,0 +1,56 @@
+"""``clock`` module provides sources of current unix time in whole
+seconds. A clock exposes the time as ``now`` attribute. Caches that
+accept a ``clock`` read system time if it is not set.
+"""
+
+from threading import Event, Thread, current_thread
+from time import time as unixtime
+
+
+class CoarseClock(object):
+    """Keeps current time in ``now`` attribute that is updated by a
+    daemon ticker thread once per second, so reading the time costs an
+    attribute access only. Call ``stop`` to stop the ticker.
+
+    >>> c = CoarseClock()
+    >>> abs(c.now - int(unixtime())) <= 1
+    True
+    >>> c.stop()
+    """
+
+    def __init__(self):
+        self.now = int(unixtime())
+        self.stopped = Event()
+        self.thread = Thread(
+            target=self.run, name="wheezy.caching.clock", daemon=True
+        )
+        self.thread.start()
+
+    def run(self):
+        stopped = self.stopped
+        while not stopped.wait(1.0 - unixtime() % 1.0):
+            self.now = int(unixtime())
+
+    def stop(self):
+        """Signals the ticker to stop and waits for it."""
+        self.stopped.set()
+        if self.thread is not current_thread():
+            self.thread.join()
+
+
+class FakeClock(object):
+    """A clock that changes only when told to, intended for
+    deterministic tests and benchmarks.
+
+    >>> c = FakeClock(100)
+    >>> c.advance(5)
+    >>> c.now
+    105
+    """
+
+    def __init__(self, now=None):
+        self.now = int(unixtime()) if now is None else now
+
+    def advance(self, seconds):
+        """Moves the clock forward by ``seconds``."""
+        self.now += seconds
@@ -0,0 +1,292 @@
+"""``codec`` module provides codecs that serialize values stored by
+memcached adapters.
+"""
+
+import marshal
+from io import BytesIO
+from pickle import Pickler, Unpickler, dumps, loads
+from struct import Struct
+
+COUNTS = Struct("<II")
+LENGTH = Struct("<I")
+
+# persistent id kind of an out-of-band buffer
+BYTES = 0
+BYTEARRAY = 1
+MEMORYVIEW = 2
+
+BYTES_LIKE = {bytes: BYTES, bytearray: BYTEARRAY, memoryview: MEMORYVIEW}
+
+
+class Codec(object):
+    """A codec that serializes values with ``dumps`` and restores them
+    with ``loads`` callables (it is passed a memoryview). ``code`` is a
+    byte stored ahead of encoded value so a value is decoded by the
+    codec that encoded it.
+
+    User codecs use ``code`` 16 and above.
+
+    >>> import json
+    >>> c = Codec(16, lambda v: json.dumps(v).encode(),
+    ...           lambda data: json.loads(bytes(data)))
+    >>> c.encode([1, 2])
+    b'\\x10[1, 2]'
+    >>> c.decode(memoryview(c.encode([1, 2])))
+    [1, 2]
+    """
+
+    code = None
+
+    def __init__(self, code=None, dumps=None, loads=None):
+        if code is not None:
+            self.code = code
+        if dumps is not None:
+            self.dumps = dumps
+        if loads is not None:
+            self.loads = loads
+
+    def encode(self, value):
+        """Returns ``value`` serialized, prefixed by ``code``."""
+        return bytes((self.code,)) + self.dumps(value)
+
+    def decode(self, data):
+        """Restores a value from ``data`` memoryview returned by
+        ``encode``.
+        """
+        return self.loads(data[1:])
+
+    def dumps(self, value):  # pragma: nocover
+        raise NotImplementedError()
+
+    def loads(self, data):  # pragma: nocover
+        raise NotImplementedError()
+
+
+class BytesCodec(Codec):
+    """Stores ``bytes`` values as is.
+
+    >>> c = BytesCodec()
+    >>> c.decode(memoryview(c.encode(b'abc')))
+    b'abc'
+    """
+
+    code = 1
+    dumps = bytes
+    loads = bytes
+
+
+class MarshalCodec(Codec):
+    """Serializes values with ``marshal``, fast for values built of
+    builtin types only (numbers, strings, bytes, tuples, lists, dicts,
+    sets). Other values fail with ``ValueError``.
+
+    >>> c = MarshalCodec()
+    >>> c.decode(memoryview(c.encode({'a': [1, 2.5, 'x']})))
+    {'a': [1, 2.5, 'x']}
+    """
+
+    code = 2
+    dumps = staticmethod(marshal.dumps)
+    loads = staticmethod(marshal.loads)
+
+
+class PickleCodec(Codec):
+    """Serializes values with pickle protocol 5.
+
+    ``bytes``, ``bytearray`` and ``memoryview`` objects of at least
+    ``threshold`` bytes, that are the value itself or an item of a
+    dict, list or tuple value, are written out-of-band: next to the
+    pickle rather than copied into it, the same way as objects that
+    support ``pickle.PickleBuffer`` (e.g. numpy arrays). So are
+    ``memoryview`` objects of any size, decoded ones refer to the cached
+    value with no copy.
+
+    >>> c = PickleCodec(threshold=4)
+    >>> data = c.encode({'blob': b'abcdef', 'n': 1})
+    >>> sorted(c.decode(memoryview(data)).items())
+    [('blob', b'abcdef'), ('n', 1)]
+    >>> bytes(c.decode(memoryview(c.encode(memoryview(b'abcdef')))))
+    b'abcdef'
+    """
+
+    code = 3
+
+    def __init__(self, threshold=65536):
+        self.threshold = threshold
+        self.header = bytes((self.code,)) + COUNTS.pack(0, 0)
+
+    def encode(self, value):
+        buffers = []
+        if not self.out_of_band(value):
+            pickled = dumps(value, 5, buffer_callback=buffers.append)
+            if not buffers:
+                return self.header + pickled
+            refs = []
+        else:
+            refs = []
+            f = BytesIO()
+            pickler = Pickler(f, 5, buffer_callback=buffers.append)
+            pickler.persistent_id = self.persistent_id(refs)
+            pickler.dump(value)
+            pickled = f.getbuffer()
+        chunks = refs + [b.raw() for b in buffers]
+        return b"".join(
+            [
+                bytes((self.code,)),
+                COUNTS.pack(len(refs), len(buffers)),
+                Struct("<%dI" % len(chunks)).pack(*[len(c) for c in chunks]),
+            ]
+            + chunks
+            + [pickled]
+        )
+
+    def decode(self, data):
+        nrefs, nbuffers = COUNTS.unpack_from(data, 1)
+        offset = 1 + COUNTS.size
+        if not nrefs and not nbuffers:
+            return loads(data[offset:])
+        lengths = Struct("<%dI" % (nrefs + nbuffers)).unpack_from(data, offset)
+        offset += LENGTH.size * len(lengths)
+        chunks = []
+        for length in lengths:
+            end = offset + length
+            chunks.append(data[offset:end])
+            offset = end
+        pickled = data[offset:]
+        refs = chunks[:nrefs]
+        buffers = chunks[nrefs:]
+        if not refs:
+            return loads(pickled, buffers=buffers)
+        unpickler = Unpickler(BytesIO(pickled), buffers=buffers)
+        unpickler.persistent_load = self.persistent_load(refs)
+        return unpickler.load()
+
+    # region: internal details
+
+    def out_of_band(self, value):
+        """Checks if ``value`` has bytes-like objects to be written
+        out-of-band.
+
+        >>> c = PickleCodec(threshold=4)
+        >>> c.out_of_band(b'abc'), c.out_of_band([1, bytearray(4)])
+        (False, True)
+        >>> c.out_of_band({'a': {'b': bytes(4)}})
+        False
+        """
+        cls = value.__class__
+        if cls in BYTES_LIKE:
+            items = (value,)
+        elif cls is dict:
+            items = value.values()
+        elif cls is list or cls is tuple:
+            items = value
+        else:
+            return False
+        if BYTES_LIKE.keys().isdisjoint(map(type, items)):
+            return False
+        threshold = self.threshold
+        for item in items:
+            cls = item.__class__
+            if cls is memoryview or (
+                cls in BYTES_LIKE and len(item) >= threshold
+            ):
+                return True
+        return False
+
+    def persistent_id(self, refs):
+        threshold = self.threshold
+
+        def persistent_id(obj):
+            kind = BYTES_LIKE.get(obj.__class__)
+            if kind is None:
+                return None
+            view = memoryview(obj)
+            if view.nbytes < threshold and kind != MEMORYVIEW:
+                return None
+            if not view.c_contiguous:
+                view = memoryview(view.tobytes())
+            refs.append(view.cast("B"))
+            return kind, len(refs) - 1
+
+        return persistent_id
+
+    def persistent_load(self, refs):
+        def persistent_load(pid):
+            kind, index = pid
+            view = refs[index]
+            if kind == BYTES:
+                return bytes(view)
+            elif kind == BYTEARRAY:
+                return bytearray(view)
+            return view
+
+        return persistent_load
+
+
+class Codecs(object):
+    """Encodes values with a codec chosen per namespace
+    (``namespaces`` mapping) or ``default`` codec (``PickleCodec`` by
+    default). A value is decoded by a codec that encoded it, any of
+    the above or in ``codecs`` list, so values survive a change of
+    codec for a namespace.
+
+    ``int`` values are not encoded, so counters work with ``incr``
+    and ``decr``. Values other than bytes are returned as is by
+    ``decode``, a value of unknown codec is a miss.
+
+    >>> c = Codecs(namespaces={'raw': BytesCodec()})
+    >>> c.encode(b'abc', 'raw')
+    b'\\x01abc'
+    >>> c.decode(c.encode(b'abc', 'raw')), c.decode(c.encode(b'abc'))
+    (b'abc', b'abc')
+    >>> c.encode(1), c.decode(1), c.decode(b'\\xffabc')
+    (1, 1, None)
+    """
+
+    def __init__(self, default=None, namespaces=None, codecs=None):
+        self.default = default or PickleCodec()
+        self.namespaces = namespaces or {}
+        self.decoders = {}
+        for codec in (
+            [self.default] + list(self.namespaces.values()) + (codecs or [])
+        ):
+            registered = self.decoders.setdefault(codec.code, codec)
+            if registered is not codec and (
+                registered.__class__ is not codec.__class__
+            ):
+                raise ValueError("codec code %d is in use" % codec.code)
+
+    def encode(self, value, namespace=None):
+        """Returns ``value`` encoded with a codec of ``namespace``."""
+        if value.__class__ is int:
+            return value
+        return self.namespaces.get(namespace, self.default).encode(value)
+
+    def encode_multi(self, mapping, namespace=None):
+        """Returns a copy of ``mapping`` with values encoded."""
+        codec = self.namespaces.get(namespace, self.default)
+        return dict(
+            (key, value if value.__class__ is int else codec.encode(value))
+            for key, value in mapping.items()
+        )
+
+    def decode(self, data):
+        """Restores a value from ``data`` returned by ``encode``."""
+        if data.__class__ is not bytes or not data:
+            return data
+        codec = self.decoders.get(data[0])
+        if codec is None:
+            return None
+        return codec.decode(memoryview(data))
+
+    def decode_multi(self, mapping):
+        """Decodes values of ``mapping``, dropping values of unknown
+        codec.
+        """
+        decode = self.decode
+        results = {}
+        for key, data in mapping.items():
+            value = decode(data)
+            if value is not None:
+                results[key] = value
+        return results
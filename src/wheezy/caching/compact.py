@@ -0,0 +1,441 @@
+from _thread import allocate_lock
+from array import array
+from time import time as unixtime
+
+from wheezy.caching.memory import expires
+
+
+class CompactMemoryCache(object):
+    """In-memory cache that keeps entries in parallel arrays: a key to
+    slot index, a list of keys, a list of values and an array of
+    expiry times, plus a list of free slots. There is no per-entry
+    object, so it takes roughly half the memory of ``MemoryCache``
+    for a large number of small entries.
+
+    Expired entries are removed by a sweep over the array of expiry
+    times: every ``bucket_interval`` seconds a store operation scans
+    the next ``1 / buckets`` part of it.
+
+    >>> c = CompactMemoryCache()
+    >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+    []
+    >>> c.get('k1'), c.slots['k1']
+    (1, 0)
+    >>> c.delete('k1')
+    True
+    >>> c.free
+    [0]
+    """
+
+    def __init__(self, buckets=60, bucket_interval=15, clock=None):
+        self.buckets = buckets
+        self.interval = bucket_interval
+        self.clock = clock
+        self.lock = allocate_lock()
+        self.slots = {}
+        self.keys = []
+        self.values = []
+        self.expires = array("l")
+        self.free = []
+        self.cursor = 0
+        self.next_sweep = 0
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+
+        >>> c = CompactMemoryCache()
+        >>> c.set('k', 'v', 100)
+        True
+        """
+        return self.store(key, value, time, 0)
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once.
+
+        >>> c = CompactMemoryCache()
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+        []
+        """
+        return self.store_multi(mapping, time, 0)
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+
+        >>> c = CompactMemoryCache()
+        >>> c.add('k', 'v', 100)
+        True
+        >>> c.add('k', 'v', 100)
+        False
+        """
+        return self.store(key, value, time, 1)
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+
+        >>> c = CompactMemoryCache()
+        >>> c.add_multi({'k': 'v'}, 100)
+        []
+        >>> c.add_multi({'k': 'v'}, 100)
+        ['k']
+        """
+        return self.store_multi(mapping, time, 1)
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already.
+
+        >>> c = CompactMemoryCache()
+        >>> c.replace('k', 'v', 100)
+        False
+        >>> c.add('k', 'v', 100)
+        True
+        >>> c.replace('k', 'v', 100)
+        True
+        """
+        return self.store(key, value, time, 2)
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+
+        >>> c = CompactMemoryCache()
+        >>> c.replace_multi({'k': 'v'}, 100)
+        ['k']
+        >>> c.add_multi({'k': 'v'}, 100)
+        []
+        >>> c.replace_multi({'k': 'v'}, 100)
+        []
+        """
+        return self.store_multi(mapping, time, 2)
+
+    def get(self, key, namespace=None):
+        """Looks up a single key.
+
+        >>> c = CompactMemoryCache()
+        >>> c.get('k')
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.get('k')
+        'v'
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        self.lock.acquire(1)
+        try:
+            slot = self.slots.get(key)
+            if slot is None:
+                return None
+            if self.expires[slot] < now:
+                self.release(slot)
+                return None
+            return self.values[slot]
+        finally:
+            self.lock.release()
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+
+        >>> c = CompactMemoryCache()
+        >>> c.get_multi(('k1', 'k2', 'k3'))
+        {}
+        >>> c.set_multi({'k1': 'v1', 'k2': 'v2'}, 100)
+        []
+        >>> sorted(c.get_multi(('k1', 'k2')).items())
+        [('k1', 'v1'), ('k2', 'v2')]
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        results = {}
+        slots = self.slots
+        expires = self.expires
+        values = self.values
+        self.lock.acquire(1)
+        try:
+            for key in keys:
+                slot = slots.get(key)
+                if slot is None:
+                    continue
+                if expires[slot] < now:
+                    self.release(slot)
+                else:
+                    results[key] = values[slot]
+        finally:
+            self.lock.release()
+        return results
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+
+        >>> c = CompactMemoryCache()
+        >>> c.touch('k', 100)
+        False
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.touch('k', 200)
+        True
+        """
+        return not self.touch_multi((key,), time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+
+        >>> from wheezy.caching.clock import FakeClock
+        >>> clock = FakeClock(1000)
+        >>> c = CompactMemoryCache(clock=clock)
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 10)
+        []
+        >>> c.touch_multi(['k1', 'k3'], 100)
+        ['k3']
+        >>> clock.advance(50)
+        >>> c.get_multi(['k1', 'k2'])
+        {'k1': 1}
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        failed = []
+        slots = self.slots
+        expires_ = self.expires
+        self.lock.acquire(1)
+        try:
+            for key in keys:
+                slot = slots.get(key)
+                if slot is None or expires_[slot] < now:
+                    failed.append(key)
+                else:
+                    expires_[slot] = time
+        finally:
+            self.lock.release()
+        return failed
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+
+        >>> c = CompactMemoryCache()
+        >>> c.get_and_touch('k', 100)
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.get_and_touch('k', 200)
+        'v'
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        self.lock.acquire(1)
+        try:
+            slot = self.slots.get(key)
+            if slot is None or self.expires[slot] < now:
+                return None
+            self.expires[slot] = time
+            return self.values[slot]
+        finally:
+            self.lock.release()
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache.
+
+        >>> c = CompactMemoryCache()
+        >>> c.delete('k')
+        False
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.delete('k')
+        True
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        self.lock.acquire(1)
+        try:
+            slot = self.slots.get(key)
+            if slot is None:
+                return False
+            expired = self.expires[slot] < now
+            self.release(slot)
+            return not expired
+        finally:
+            self.lock.release()
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once.
+
+        >>> c = CompactMemoryCache()
+        >>> c.delete_multi(('k1', 'k2'))
+        True
+        """
+        slots = self.slots
+        self.lock.acquire(1)
+        try:
+            for key in keys:
+                slot = slots.get(key)
+                if slot is not None:
+                    self.release(slot)
+        finally:
+            self.lock.release()
+        return True
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value.
+
+        >>> c = CompactMemoryCache()
+        >>> c.incr('k')
+        >>> c.incr('k', initial_value=0)
+        1
+        >>> c.incr('k')
+        2
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        self.lock.acquire(1)
+        try:
+            slot = self.slots.get(key)
+            if slot is not None and self.expires[slot] < now:
+                self.release(slot)
+                slot = None
+            if slot is None:
+                if initial_value is None:
+                    return None
+                slot = self.allocate(key, initial_value, expires(now, 0))
+            values = self.values
+            value = values[slot] = values[slot] + delta
+            return value
+        finally:
+            self.lock.release()
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value.
+
+        >>> c = CompactMemoryCache()
+        >>> c.decr('k', initial_value=10)
+        9
+        """
+        return self.incr(key, -delta, namespace, initial_value)
+
+    def store(self, key, value, time=0, op=0):
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        self.lock.acquire(1)
+        try:
+            slot = self.slots.get(key)
+            if slot is None:
+                if op == 2:  # replace
+                    return False
+                self.allocate(key, value, time)
+            elif op == 1 and self.expires[slot] >= now:  # add
+                return False
+            else:
+                self.values[slot] = value
+                self.expires[slot] = time
+            if now >= self.next_sweep:
+                self.sweep(now)
+        finally:
+            self.lock.release()
+        return True
+
+    def store_multi(self, mapping, time=0, op=0):
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        keys_failed = []
+        slots = self.slots
+        values = self.values
+        expires_ = self.expires
+        self.lock.acquire(1)
+        try:
+            for key, value in mapping.items():
+                slot = slots.get(key)
+                if slot is None:
+                    if op == 2:  # replace
+                        keys_failed.append(key)
+                        continue
+                    self.allocate(key, value, time)
+                elif op == 1 and expires_[slot] >= now:  # add
+                    keys_failed.append(key)
+                else:
+                    values[slot] = value
+                    expires_[slot] = time
+            if now >= self.next_sweep:
+                self.sweep(now)
+        finally:
+            self.lock.release()
+        return keys_failed
+
+    def flush_all(self):
+        """Deletes everything in cache.
+
+        >>> c = CompactMemoryCache()
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+        []
+        >>> c.flush_all()
+        True
+        >>> c.keys
+        []
+        """
+        self.lock.acquire(1)
+        try:
+            self.slots.clear()
+            self.keys = []
+            self.values = []
+            self.expires = array("l")
+            self.free = []
+            self.cursor = 0
+        finally:
+            self.lock.release()
+        return True
+
+    # region: internal details
+
+    def allocate(self, key, value, time):
+        """Places an entry in a free slot or appends a new one."""
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = key
+            self.values[slot] = value
+            self.expires[slot] = time
+        else:
+            slot = len(self.keys)
+            self.keys.append(key)
+            self.values.append(value)
+            self.expires.append(time)
+        self.slots[key] = slot
+        return slot
+
+    def release(self, slot):
+        """Removes an entry and marks its slot free (expires 0)."""
+        keys = self.keys
+        del self.slots[keys[slot]]
+        keys[slot] = None
+        self.values[slot] = None
+        self.expires[slot] = 0
+        self.free.append(slot)
+
+    def sweep(self, now):
+        """Removes expired entries in the next part of slots. Returns a
+        number of entries removed.
+
+        >>> c = CompactMemoryCache(buckets=2)
+        >>> c.set_multi(dict((i, i) for i in range(10)), 100)
+        []
+        >>> c.expires[3] = c.expires[8] = 1
+        >>> c.sweep(100), c.sweep(100), sorted(c.free)
+        (1, 1, [3, 8])
+        """
+        self.next_sweep = now + self.interval
+        expires = self.expires
+        n = len(expires)
+        start = self.cursor
+        stop = min(start + n // self.buckets + 1, n)
+        self.cursor = stop < n and stop or 0
+        removed = 0
+        for slot in range(start, stop):
+            e = expires[slot]
+            if e and e < now:
+                self.release(slot)
+                removed += 1
+        return removed
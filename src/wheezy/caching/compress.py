@@ -0,0 +1,214 @@
+"""``compress`` module provides a cache wrapper that compresses large
+values before they are sent to a cache (e.g. memcached).
+"""
+
+import lzma
+import zlib
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+
+try:
+    from compression import zstd
+except ImportError:  # pragma: nocover
+    zstd = None
+
+# header byte of a stored value
+PICKLED = 0
+ZLIB = 1
+LZMA = 2
+ZSTD = 3
+
+COMPRESSORS = {
+    "zlib": (ZLIB, zlib.compress),
+    "lzma": (LZMA, lzma.compress),
+}
+DECOMPRESSORS = {
+    ZLIB: zlib.decompress,
+    LZMA: lzma.decompress,
+}
+if zstd is not None:  # pragma: nocover
+    COMPRESSORS["zstd"] = (ZSTD, zstd.compress)
+    DECOMPRESSORS[ZSTD] = zstd.decompress
+
+
+class CompressingCache(object):
+    """Wraps ``cache`` so values are pickled and, if longer than
+    ``threshold`` bytes, compressed with ``codec``: ``zlib``, ``lzma``
+    or ``zstd`` (Python 3.14+, the default if available, otherwise
+    ``zlib``). The first byte of a stored value marks the codec, so
+    values compressed by any codec are read back.
+
+    ``int`` values are not encoded, so counters work with ``incr`` and
+    ``decr``. Values other than bytes read from ``cache`` are returned
+    as is.
+
+    >>> from wheezy.caching.memory import MemoryCache
+    >>> c = CompressingCache(MemoryCache(), threshold=100, codec='zlib')
+    >>> c.set_multi({'small': 'x', 'large': 'x' * 1000}, 100)
+    []
+    >>> c.cache.get('small')[0], c.cache.get('large')[0]
+    (0, 1)
+    >>> len(c.cache.get('large')) < 100
+    True
+    >>> c.get('large') == 'x' * 1000
+    True
+    """
+
+    def __init__(self, cache, threshold=1024, codec=None):
+        self.cache = cache
+        self.threshold = threshold
+        if codec is None:
+            codec = zstd is not None and "zstd" or "zlib"
+        if codec not in COMPRESSORS:
+            raise ValueError("unknown codec: %s" % codec)
+        self.code, self.compress = COMPRESSORS[codec]
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+        """
+        return self.cache.set(key, self.encode(value), time, namespace)
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once."""
+        return self.cache.set_multi(
+            self.encode_multi(mapping), time, namespace
+        )
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+        """
+        return self.cache.add(key, self.encode(value), time, namespace)
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+        """
+        return self.cache.add_multi(
+            self.encode_multi(mapping), time, namespace
+        )
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already."""
+        return self.cache.replace(key, self.encode(value), time, namespace)
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+        """
+        return self.cache.replace_multi(
+            self.encode_multi(mapping), time, namespace
+        )
+
+    def get(self, key, namespace=None):
+        """Looks up a single key."""
+        return self.decode(self.cache.get(key, namespace))
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+        """
+        decode = self.decode
+        return dict(
+            (key, decode(value))
+            for key, value in self.cache.get_multi(keys, namespace).items()
+        )
+
+    def gets(self, key, namespace=None):
+        """Looks up a single key, returns a tuple of value and cas
+        token.
+        """
+        value, token = self.cache.gets(key, namespace)
+        return self.decode(value), token
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys, returns a dict of found keys to a
+        tuple of value and cas token.
+        """
+        decode = self.decode
+        return dict(
+            (key, (decode(value), token))
+            for key, (value, token) in self.cache.gets_multi(
+                keys, namespace
+            ).items()
+        )
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``.
+        """
+        return self.cache.cas(key, self.encode(value), token, time, namespace)
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        return self.cache.touch(key, time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        return self.cache.touch_multi(keys, time, namespace)
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+        """
+        return self.decode(self.cache.get_and_touch(key, time, namespace))
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache."""
+        return self.cache.delete(key, seconds, namespace)
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once."""
+        return self.cache.delete_multi(keys, seconds, namespace)
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value. The value is not
+        encoded.
+        """
+        return self.cache.incr(key, delta, namespace, initial_value)
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value. The value is not
+        encoded.
+        """
+        return self.cache.decr(key, delta, namespace, initial_value)
+
+    def flush_all(self):
+        """Deletes everything in cache."""
+        return self.cache.flush_all()
+
+    # region: internal details
+
+    def encode(self, value):
+        if value.__class__ is int:
+            return value
+        data = dumps(value, HIGHEST_PROTOCOL)
+        if len(data) > self.threshold:
+            compressed = self.compress(data)
+            if len(compressed) < len(data):
+                return bytes((self.code,)) + compressed
+        return bytes((PICKLED,)) + data
+
+    def encode_multi(self, mapping):
+        encode = self.encode
+        return dict((key, encode(value)) for key, value in mapping.items())
+
+    def decode(self, data):
+        """Restores a value from ``data`` stored by ``encode``.
+
+        >>> c = CompressingCache(None, threshold=10, codec='lzma')
+        >>> c.decode(c.encode('x' * 100)) == 'x' * 100
+        True
+        >>> c.decode(None), c.decode(1)
+        (None, 1)
+        """
+        if data.__class__ is not bytes:
+            return data
+        code = data[0]
+        if code == PICKLED:
+            return loads(memoryview(data)[1:])
+        return loads(DECOMPRESSORS[code](memoryview(data)[1:]))
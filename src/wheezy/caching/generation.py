@@ -0,0 +1,260 @@
+"""``generation`` module provides a cache wrapper that invalidates a
+namespace at once by bumping its generation number.
+"""
+
+from time import time as unixtime
+
+
+class GenerationCache(object):
+    """Wraps ``cache`` so keys are prefixed by namespace and its
+    generation number. ``invalidate_namespace`` increments the generation,
+    so all keys of namespace are missed at once; items of the previous
+    generation are left to expire or be evicted.
+
+    A generation is kept in ``cache`` under ``key_prefix`` + namespace
+    key and is read back at most once per ``time`` seconds, so other
+    processes see a namespace invalidated within that time. A missing
+    generation starts from the current unix time, so one evicted from
+    ``cache`` never goes back to a number used before.
+
+    >>> from wheezy.caching.clock import FakeClock
+    >>> from wheezy.caching.memory import MemoryCache
+    >>> c = GenerationCache(MemoryCache(), clock=FakeClock(1000))
+    >>> c.set('k', 'v', 100, 'users')
+    True
+    >>> sorted(c.cache.items)
+    ['gen:users', 'users:1000:k']
+    >>> c.invalidate_namespace('users')
+    1001
+    >>> c.get('k', 'users')
+    """
+
+    def __init__(self, cache, time=1, key_prefix="gen:", clock=None):
+        self.cache = cache
+        self.time = time
+        self.key_prefix = key_prefix
+        self.clock = clock
+        self.prefixes = {}
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+        """
+        return self.cache.set(
+            self.prefix(namespace) + key, value, time, namespace
+        )
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once."""
+        prefix = self.prefix(namespace)
+        return self.strip(
+            prefix,
+            self.cache.set_multi(
+                self.prefix_mapping(prefix, mapping), time, namespace
+            ),
+        )
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+        """
+        return self.cache.add(
+            self.prefix(namespace) + key, value, time, namespace
+        )
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+        """
+        prefix = self.prefix(namespace)
+        return self.strip(
+            prefix,
+            self.cache.add_multi(
+                self.prefix_mapping(prefix, mapping), time, namespace
+            ),
+        )
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already."""
+        return self.cache.replace(
+            self.prefix(namespace) + key, value, time, namespace
+        )
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+        """
+        prefix = self.prefix(namespace)
+        return self.strip(
+            prefix,
+            self.cache.replace_multi(
+                self.prefix_mapping(prefix, mapping), time, namespace
+            ),
+        )
+
+    def get(self, key, namespace=None):
+        """Looks up a single key."""
+        return self.cache.get(self.prefix(namespace) + key, namespace)
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+        """
+        prefix = self.prefix(namespace)
+        start = len(prefix)
+        return dict(
+            (key[start:], value)
+            for key, value in self.cache.get_multi(
+                [prefix + key for key in keys], namespace
+            ).items()
+        )
+
+    def gets(self, key, namespace=None):
+        """Looks up a single key, returns a tuple of value and cas
+        token.
+        """
+        return self.cache.gets(self.prefix(namespace) + key, namespace)
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys, returns a dict of found keys to a
+        tuple of value and cas token.
+        """
+        prefix = self.prefix(namespace)
+        start = len(prefix)
+        return dict(
+            (key[start:], result)
+            for key, result in self.cache.gets_multi(
+                [prefix + key for key in keys], namespace
+            ).items()
+        )
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``.
+        """
+        return self.cache.cas(
+            self.prefix(namespace) + key, value, token, time, namespace
+        )
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        return self.cache.touch(self.prefix(namespace) + key, time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        prefix = self.prefix(namespace)
+        return self.strip(
+            prefix,
+            self.cache.touch_multi(
+                [prefix + key for key in keys], time, namespace
+            ),
+        )
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+        """
+        return self.cache.get_and_touch(
+            self.prefix(namespace) + key, time, namespace
+        )
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache."""
+        return self.cache.delete(
+            self.prefix(namespace) + key, seconds, namespace
+        )
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once."""
+        prefix = self.prefix(namespace)
+        return self.cache.delete_multi(
+            [prefix + key for key in keys], seconds, namespace
+        )
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value."""
+        return self.cache.incr(
+            self.prefix(namespace) + key, delta, namespace, initial_value
+        )
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value."""
+        return self.cache.decr(
+            self.prefix(namespace) + key, delta, namespace, initial_value
+        )
+
+    def flush_all(self):
+        """Deletes everything in cache."""
+        self.prefixes = {}
+        return self.cache.flush_all()
+
+    def invalidate_namespace(self, namespace=None):
+        """Drops all keys of ``namespace`` with a single ``incr`` of its
+        generation. Returns the new generation.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        generation = self.cache.incr(
+            self.key_prefix + (namespace or ""), 1, namespace, now
+        )
+        self.prefixes[namespace] = (
+            "%s:%d:" % (namespace or "", generation),
+            now + self.time,
+        )
+        return generation
+
+    # region: internal details
+
+    def prefix(self, namespace):
+        """Returns a key prefix of the current generation of
+        ``namespace``, read from cache once per ``time`` seconds.
+
+        >>> from wheezy.caching.clock import FakeClock
+        >>> from wheezy.caching.memory import MemoryCache
+        >>> clock = FakeClock(1000)
+        >>> c = GenerationCache(MemoryCache(), time=5, clock=clock)
+        >>> c.prefix('ns')
+        'ns:1000:'
+        >>> c.cache.incr('gen:ns', 1, 'ns')
+        1001
+        >>> clock.advance(4)
+        >>> c.prefix('ns')
+        'ns:1000:'
+        >>> clock.advance(1)
+        >>> c.prefix('ns')
+        'ns:1001:'
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        try:
+            prefix, expires = self.prefixes[namespace]
+            if now < expires:
+                return prefix
+        except KeyError:
+            pass
+        key = self.key_prefix + (namespace or "")
+        generation = self.cache.get(key, namespace)
+        if generation is None:
+            self.cache.add(key, now, 0, namespace)
+            generation = self.cache.get(key, namespace) or now
+        prefix = "%s:%d:" % (namespace or "", generation)
+        self.prefixes[namespace] = (prefix, now + self.time)
+        return prefix
+
+    def prefix_mapping(self, prefix, mapping):
+        return dict((prefix + key, value) for key, value in mapping.items())
+
+    def strip(self, prefix, keys):
+        """Returns ``keys`` with ``prefix`` removed.
+
+        >>> GenerationCache(None).strip('1:', ['1:a', '1:b'])
+        ['a', 'b']
+        """
+        if not keys:
+            return keys
+        start = len(prefix)
+        return [key[start:] for key in keys]
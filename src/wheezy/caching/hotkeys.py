@@ -0,0 +1,206 @@
+"""``hotkeys`` module provides a sampler of cache reads that finds the
+most read keys with bounded memory.
+"""
+
+from _thread import allocate_lock
+from heapq import nlargest
+from math import log
+from operator import itemgetter
+from random import random
+
+
+class SpaceSaving(object):
+    """Space-Saving heavy hitters sketch: counts at most ``capacity``
+    keys. A key not counted yet takes a place of a key with the least
+    count and inherits that count as an over-estimation ``error``, so
+    a key read more often than ``total / capacity`` times is never
+    missed.
+
+    Keys are grouped into buckets by count, so ``add`` takes constant
+    time.
+
+    >>> s = SpaceSaving(2)
+    >>> for key in 'aaabbc':
+    ...     s.add(key)
+    >>> s.top(2)
+    [('a', 3, 0), ('c', 3, 2)]
+    >>> s.total
+    6
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self.buckets = {}
+        self.min = 0
+
+    def add(self, key):
+        """Counts a single occurrence of ``key``."""
+        self.total += 1
+        counts = self.counts
+        buckets = self.buckets
+        count = counts.get(key)
+        if count is None:
+            if len(counts) < self.capacity:
+                count = 0
+                self.errors[key] = 0
+                self.min = 0
+            else:
+                count = self.min
+                bucket = buckets[count]
+                victim = next(iter(bucket))
+                del bucket[victim]
+                del counts[victim]
+                del self.errors[victim]
+                self.errors[key] = count
+                if not bucket:
+                    del buckets[count]
+                    self.min = count + 1
+        else:
+            bucket = buckets[count]
+            del bucket[key]
+            if not bucket:
+                del buckets[count]
+                if self.min == count:
+                    self.min = count + 1
+        count += 1
+        counts[key] = count
+        try:
+            buckets[count][key] = None
+        except KeyError:
+            buckets[count] = {key: None}
+        if self.min == 0:
+            self.min = 1
+
+    def top(self, n):
+        """Returns a list of at most ``n`` (key, count, error) tuples
+        with the largest counts.
+        """
+        errors = self.errors
+        return [
+            (key, count, errors[key])
+            for key, count in nlargest(
+                n, self.counts.items(), key=itemgetter(1)
+            )
+        ]
+
+
+class HotKeys(object):
+    """Samples cache reads at ``rate`` and counts sampled keys per
+    namespace in a ``SpaceSaving`` sketch of ``capacity`` keys.
+
+    Reads to skip between samples are drawn at random (geometric
+    distribution), so periodic access patterns do not bias the
+    sample, and a read not sampled costs a decrement only. The skip
+    counter is not locked, a decrement lost to a race only shifts the
+    next sample.
+
+    >>> h = HotKeys(rate=1)
+    >>> h.sample_multi(['a', 'b', 'a'], 'ns')
+    >>> h.sample('a', 'ns')
+    >>> h.top(1, 'ns')
+    [('a', 3, 0.75)]
+    >>> h.namespaces()
+    ['ns']
+    """
+
+    def __init__(self, rate=0.01, capacity=100):
+        assert 0 < rate <= 1
+        self.rate = rate
+        self.capacity = capacity
+        self.scale = rate < 1 and 1.0 / log(1.0 - rate) or 0.0
+        self.sketches = {}
+        self.lock = allocate_lock()
+        self.skip = self.next_skip()
+
+    def sample(self, key, namespace=None):
+        """Counts a read of ``key`` if it is sampled."""
+        skip = self.skip
+        if skip > 0:
+            self.skip = skip - 1
+            return
+        self.skip = self.next_skip()
+        self.lock.acquire(1)
+        try:
+            self.sketch(namespace).add(key)
+        finally:
+            self.lock.release()
+
+    def sample_multi(self, keys, namespace=None):
+        """Counts reads of ``keys`` that are sampled.
+
+        >>> h = HotKeys(rate=1)
+        >>> h.sample_multi({'a': 1, 'b': 2}.keys())
+        >>> sorted(key for key, reads, share in h.top())
+        ['a', 'b']
+        """
+        if not isinstance(keys, (list, tuple)):
+            keys = list(keys)
+        n = len(keys)
+        i = max(self.skip, 0)
+        if i >= n:
+            self.skip = i - n
+            return
+        self.lock.acquire(1)
+        try:
+            sketch = self.sketch(namespace)
+            while i < n:
+                sketch.add(keys[i])
+                i += 1 + self.next_skip()
+        finally:
+            self.lock.release()
+        self.skip = i - n
+
+    def top(self, n=10, namespace=None):
+        """Returns a list of at most ``n`` hottest keys of
+        ``namespace`` as (key, estimated reads, share of reads) tuples.
+        """
+        self.lock.acquire(1)
+        try:
+            sketch = self.sketches.get(namespace)
+            if sketch is None:
+                return []
+            total = float(sketch.total)
+            rate = self.rate
+            return [
+                (key, int(count / rate), count / total)
+                for key, count, error in sketch.top(n)
+            ]
+        finally:
+            self.lock.release()
+
+    def namespaces(self):
+        """Returns a list of namespaces sampled."""
+        return list(self.sketches)
+
+    def clear(self):
+        """Forgets all samples."""
+        self.lock.acquire(1)
+        try:
+            self.sketches = {}
+        finally:
+            self.lock.release()
+
+    # region: internal details
+
+    def next_skip(self):
+        """Returns a number of reads to skip before the next sample.
+
+        >>> HotKeys(rate=1).next_skip()
+        0
+        >>> h = HotKeys(rate=0.1)
+        >>> 5 < sum(h.next_skip() for i in range(1000)) / 1000.0 < 15
+        True
+        """
+        if not self.scale:
+            return 0
+        return int(log(1.0 - random()) * self.scale)
+
+    def sketch(self, namespace):
+        try:
+            return self.sketches[namespace]
+        except KeyError:
+            sketch = self.sketches[namespace] = SpaceSaving(self.capacity)
+            return sketch
@@ -0,0 +1,267 @@
+"""``invalidation`` module provides a bus that broadcasts invalidated
+keys to near caches (see :py:class:`~wheezy.caching.tiered.TieredCache`)
+of other processes on a host.
+"""
+
+import json
+import os
+import socket
+from _thread import allocate_lock
+from queue import Empty, Queue
+from threading import Event, Thread, current_thread
+
+MAX_MESSAGE_SIZE = 60000
+
+
+def encode_messages(channel, keys):
+    """Encodes ``keys`` of ``channel`` into a list of messages, each
+    at most ``MAX_MESSAGE_SIZE`` bytes long (unless a single key is
+    longer).
+
+    >>> encode_messages('c', ['k1', 'k2'])
+    [b'["c", ["k1", "k2"]]']
+    >>> len(encode_messages('c', ['x' * 1000] * 100))
+    2
+
+    Non-ASCII characters are escaped, so are sized as encoded.
+
+    >>> len(encode_messages('c', ['\u00e9' * 1000] * 20))
+    3
+    """
+    messages = []
+    batch = []
+    # '["channel", []]' and ', ' between keys
+    base = len(json.dumps(channel)) + 6
+    size = base
+    dumps = json.dumps
+    for key in keys:
+        n = len(dumps(key)) + 2
+        if batch and size + n > MAX_MESSAGE_SIZE:
+            messages.append(json.dumps([channel, batch]).encode("UTF-8"))
+            batch = []
+            size = base
+        batch.append(key)
+        size += n
+    if batch:
+        messages.append(json.dumps([channel, batch]).encode("UTF-8"))
+    return messages
+
+
+class InvalidationBus(object):
+    """Publishes invalidated keys over ``transport`` and drops keys
+    published by other processes from subscribed caches.
+
+    Once started, a daemon thread sends published keys in batches
+    every ``interval`` seconds and receives messages. A lost message
+    leaves a stale copy for up to near cache time to live.
+
+    >>> peers = []
+    >>> b1 = InvalidationBus(LocalTransport(peers))
+    >>> b2 = InvalidationBus(LocalTransport(peers))
+    >>> from wheezy.caching.memory import MemoryCache
+    >>> l1 = MemoryCache()
+    >>> l1.set('k', 1)
+    True
+    >>> b2.subscribe('near', l1)
+    >>> b1.publish('near', ['k'])
+    >>> b1.flush()
+    >>> b2.receive(1.0)
+    1
+    >>> l1.get('k')
+    >>> b1.close()
+    >>> b2.close()
+    """
+
+    def __init__(self, transport, interval=0.01):
+        self.transport = transport
+        self.interval = interval
+        self.subscribers = {}
+        self.pending = {}
+        self.lock = allocate_lock()
+        self.stopped = Event()
+        self.thread = None
+
+    def subscribe(self, channel, cache):
+        """Drops keys published to ``channel`` from ``cache`` (by
+        ``delete_multi``).
+        """
+        self.subscribers.setdefault(channel, []).append(cache)
+
+    def publish(self, channel, keys):
+        """Queues ``keys`` of ``channel`` to be sent to other
+        processes. Raises TypeError if a key is not a string.
+        """
+        keys = list(keys)
+        for key in keys:
+            if not isinstance(key, str):
+                raise TypeError("Expecting type str for key")
+        self.lock.acquire(1)
+        try:
+            try:
+                self.pending[channel].extend(keys)
+            except KeyError:
+                self.pending[channel] = keys
+        finally:
+            self.lock.release()
+
+    def start(self):
+        """Starts the bus thread."""
+        if self.thread is None:
+            self.thread = Thread(
+                target=self.run, name="wheezy.caching.invalidation"
+            )
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        stopped = self.stopped
+        while not stopped.is_set():
+            self.receive(self.interval)
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Sends queued keys."""
+        self.lock.acquire(1)
+        try:
+            pending = self.pending
+            self.pending = {}
+        finally:
+            self.lock.release()
+        send = self.transport.send
+        for channel, keys in pending.items():
+            for message in encode_messages(channel, keys):
+                send(message)
+
+    def receive(self, timeout):
+        """Waits up to ``timeout`` seconds for messages and drops
+        received keys from subscribed caches. Returns a number of
+        messages received.
+        """
+        messages = self.transport.receive(timeout)
+        subscribers = self.subscribers
+        for message in messages:
+            try:
+                channel, keys = json.loads(message.decode("UTF-8"))
+            except ValueError:
+                continue
+            for cache in subscribers.get(channel, ()):
+                cache.delete_multi(keys)
+        return len(messages)
+
+    def close(self):
+        """Sends queued keys, stops the bus thread and closes the
+        transport.
+        """
+        self.stopped.set()
+        thread = self.thread
+        if thread is None:
+            self.flush()
+        elif thread is not current_thread():
+            thread.join()
+        self.transport.close()
+
+
+class LocalTransport(object):
+    """Delivers messages to other transports sharing ``peers`` list
+    within a process, intended for tests.
+    """
+
+    def __init__(self, peers):
+        self.peers = peers
+        self.queue = Queue()
+        peers.append(self)
+
+    def send(self, message):
+        for peer in self.peers:
+            if peer is not self:
+                peer.queue.put(message)
+
+    def receive(self, timeout):
+        """Returns a list of messages received within ``timeout``
+        seconds.
+        """
+        queue = self.queue
+        try:
+            messages = [queue.get(timeout=timeout)]
+        except Empty:
+            return []
+        try:
+            while True:
+                messages.append(queue.get_nowait())
+        except Empty:
+            pass
+        return messages
+
+    def close(self):
+        if self in self.peers:
+            self.peers.remove(self)
+
+
+class UnixDatagramTransport(object):
+    """Delivers messages to all processes that have a transport bound
+    to a socket in ``directory``.
+
+    Each process binds a datagram socket named after its pid (unless
+    ``name`` is set), so a transport is created in worker processes,
+    after fork. A message is
+    sent to every other socket in the directory, sockets of exited
+    processes are removed. A message is dropped if a receiver is too
+    slow to keep up.
+    """
+
+    def __init__(self, directory, name=None):
+        self.directory = directory
+        self.address = os.path.join(
+            directory, "%s.sock" % (name or os.getpid())
+        )
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        self.out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.out.setblocking(False)
+
+    def send(self, message):
+        directory = self.directory
+        for name in os.listdir(directory):
+            if not name.endswith(".sock"):
+                continue
+            address = os.path.join(directory, name)
+            if address == self.address:
+                continue
+            try:
+                self.out.sendto(message, address)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(address)
+                except OSError:  # pragma: nocover
+                    pass
+            except OSError:  # pragma: nocover
+                pass
+
+    def receive(self, timeout):
+        """Returns a list of messages received within ``timeout``
+        seconds.
+        """
+        sock = self.sock
+        sock.settimeout(timeout)
+        try:
+            messages = [sock.recv(65536)]
+        except (socket.timeout, OSError):
+            return []
+        sock.setblocking(False)
+        try:
+            while True:
+                messages.append(sock.recv(65536))
+        except OSError:
+            pass
+        return messages
+
+    def close(self):
+        self.sock.close()
+        self.out.close()
+        try:
+            os.unlink(self.address)
+        except OSError:  # pragma: nocover
+            pass
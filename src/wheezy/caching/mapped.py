@@ -0,0 +1,543 @@
+"""``mapped`` module provides a persistent cache that keeps items in a
+memory mapped file, so it survives restarts and is shared by processes
+that open the same file.
+"""
+
+import os
+from _thread import allocate_lock
+from mmap import mmap
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from struct import Struct
+from time import time as unixtime
+from zlib import crc32
+
+from wheezy.caching.encoding import string_encode
+from wheezy.caching.memory import expires
+
+try:
+    from fcntl import LOCK_EX, LOCK_UN, flock
+except ImportError:  # pragma: nocover
+    flock = None
+
+MAGIC = b"WZCACHE1"
+# magic, capacity, tail of data log, count
+HEADER = Struct("<8sqqq")
+# hash, expires, offset (0 - empty), key length, value length, pickled
+SLOT = Struct("<IqqIIB")
+
+
+class MappedFileCache(object):
+    """A cache in a memory mapped file at ``path`` of ``size`` bytes.
+
+    The file starts with a fixed size open addressing hash table
+    (linear probing) of ``capacity`` slots that hold key hash, expiry
+    time and location of a record, followed by an append-only log of
+    records (key and value bytes). Values other than ``bytes`` are
+    pickled. An overwritten record stays in the log until the log is
+    full and compacted: expired items are removed and live records are
+    moved to the start of the log. If there is still not enough room,
+    the oldest records are evicted.
+
+    An existing file is opened with its own layout, so ``size`` and
+    ``capacity`` apply to a new file only. Operations are serialized
+    with a thread lock and ``flock`` on the file (where available), so
+    several processes can use the same file.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'cache')
+    >>> c = MappedFileCache(path, size=1 << 20)
+    >>> c.set_multi({'k1': 1, 'k2': b'2'}, 100)
+    []
+    >>> c.close()
+    >>> c = MappedFileCache(path)
+    >>> sorted(c.get_multi(['k1', 'k2', 'k3']).items())
+    [('k1', 1), ('k2', b'2')]
+    >>> c.close()
+    """
+
+    def __init__(self, path, size=64 << 20, capacity=None, clock=None):
+        self.clock = clock
+        self.lock = allocate_lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.acquire()
+        try:
+            if os.fstat(self.fd).st_size < HEADER.size:
+                capacity = capacity or size // 512
+                if HEADER.size + capacity * SLOT.size >= size:
+                    raise ValueError("size is too small")
+                os.ftruncate(self.fd, size)
+                self.mm = mmap(self.fd, size)
+                HEADER.pack_into(self.mm, 0, MAGIC, capacity, 0, 0)
+            else:
+                self.mm = mmap(self.fd, 0)
+                magic, capacity = HEADER.unpack_from(self.mm, 0)[:2]
+                if magic != MAGIC:
+                    raise ValueError("not a cache file")
+        except Exception:
+            self.release()
+            os.close(self.fd)
+            raise
+        self.release()
+        self.capacity = capacity
+        self.max_count = capacity * 7 // 8
+        self.data_offset = HEADER.size + capacity * SLOT.size
+        self.end = len(self.mm)
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+        """
+        return self.store_multi({key: value}, time, 0) == []
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once."""
+        return self.store_multi(mapping, time, 0)
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+        """
+        return self.store_multi({key: value}, time, 1) == []
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+        """
+        return self.store_multi(mapping, time, 1)
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already."""
+        return self.store_multi({key: value}, time, 2) == []
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+        """
+        return self.store_multi(mapping, time, 2)
+
+    def get(self, key, namespace=None):
+        """Looks up a single key. A ``bytes`` value is copied while the
+        file is locked.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        kb = string_encode(key)
+        self.acquire()
+        try:
+            value = self.read(crc32(kb), kb, now)
+            if value.__class__ is memoryview:
+                return value.tobytes()
+            return value
+        finally:
+            self.release()
+
+    def get_view(self, key, namespace=None):
+        """Looks up a single key. A ``bytes`` value is returned as a
+        ``memoryview`` of the mapping with no copy. The view is read
+        past the lock: a write by another thread or process can
+        overwrite or move the record at any time, so use it right away
+        (e.g. write it to a socket), use ``get`` if a consistent copy is
+        required, and release the view (or use it as a context
+        manager), since the cache can not be closed while views exist.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'cache')
+        >>> c = MappedFileCache(path, size=1 << 20)
+        >>> c.set('k', b'value', 100)
+        True
+        >>> with c.get_view('k') as view:
+        ...     bytes(view[:2])
+        b'va'
+        >>> c.close()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        kb = string_encode(key)
+        self.acquire()
+        try:
+            return self.read(crc32(kb), kb, now)
+        finally:
+            self.release()
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        results = {}
+        self.acquire()
+        try:
+            for key in keys:
+                kb = string_encode(key)
+                value = self.read(crc32(kb), kb, now)
+                if value is None:
+                    continue
+                if value.__class__ is memoryview:
+                    value = value.tobytes()
+                results[key] = value
+        finally:
+            self.release()
+        return results
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        return not self.touch_multi((key,), time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found. Records are not moved.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        e = expires(now, time)
+        failed = []
+        self.acquire()
+        try:
+            for key in keys:
+                kb = string_encode(key)
+                if self.renew(crc32(kb), kb, e, now) is None:
+                    failed.append(key)
+        finally:
+            self.release()
+        return failed
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'cache')
+        >>> c = MappedFileCache(path, size=1 << 20)
+        >>> c.get_and_touch('k', 100)
+        >>> c.set('k', b'v', 100)
+        True
+        >>> c.get_and_touch('k', 200)
+        b'v'
+        >>> c.close()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        e = expires(now, time)
+        kb = string_encode(key)
+        self.acquire()
+        try:
+            i = self.renew(crc32(kb), kb, e, now)
+            if i is None:
+                return None
+            mm = self.mm
+            offset, klen, vlen, pickled = SLOT.unpack_from(mm, i)[2:]
+            start = offset + klen
+            end = start + vlen
+            if pickled:
+                return loads(mm[start:end])
+            return mm[start:end]
+        finally:
+            self.release()
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache."""
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        kb = string_encode(key)
+        self.acquire()
+        try:
+            i = self.find(crc32(kb), kb)
+            if i is None:
+                return False
+            expired = SLOT.unpack_from(self.mm, i)[1] < now
+            self.remove(i)
+            return not expired
+        finally:
+            self.release()
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once."""
+        self.acquire()
+        try:
+            for key in keys:
+                kb = string_encode(key)
+                i = self.find(crc32(kb), kb)
+                if i is not None:
+                    self.remove(i)
+        finally:
+            self.release()
+        return True
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'cache')
+        >>> c = MappedFileCache(path, size=1 << 20)
+        >>> c.incr('k')
+        >>> c.incr('k', initial_value=0)
+        1
+        >>> c.incr('k')
+        2
+        >>> c.close()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        kb = string_encode(key)
+        h = crc32(kb)
+        self.acquire()
+        try:
+            i = self.find(h, kb)
+            if i is not None:
+                e = SLOT.unpack_from(self.mm, i)[1]
+                if e >= now:
+                    value = self.read(h, kb, now) + delta
+                    if not self.write(h, kb, value, e, now):
+                        return None
+                    return value
+                self.remove(i)
+            if initial_value is None:
+                return None
+            value = initial_value + delta
+            if not self.write(h, kb, value, expires(now, 0), now):
+                return None
+            return value
+        finally:
+            self.release()
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value."""
+        return self.incr(key, -delta, namespace, initial_value)
+
+    def flush_all(self):
+        """Deletes everything in cache."""
+        self.acquire()
+        try:
+            start = HEADER.size
+            end = self.data_offset
+            self.mm[start:end] = bytes(end - start)
+            HEADER.pack_into(self.mm, 0, MAGIC, self.capacity, 0, 0)
+        finally:
+            self.release()
+        return True
+
+    def close(self):
+        """Unmaps and closes the file."""
+        self.mm.close()
+        os.close(self.fd)
+
+    # region: internal details
+
+    def acquire(self):
+        self.lock.acquire(1)
+        if flock is not None:
+            flock(self.fd, LOCK_EX)
+
+    def release(self):
+        if flock is not None:
+            flock(self.fd, LOCK_UN)
+        self.lock.release()
+
+    def store_multi(self, mapping, time, op):
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        e = expires(now, time)
+        keys_failed = []
+        mm = self.mm
+        self.acquire()
+        try:
+            for key, value in mapping.items():
+                kb = string_encode(key)
+                h = crc32(kb)
+                i = self.find(h, kb)
+                if i is None:
+                    if op == 2:  # replace
+                        keys_failed.append(key)
+                        continue
+                elif op == 1 and SLOT.unpack_from(mm, i)[1] >= now:  # add
+                    keys_failed.append(key)
+                    continue
+                if not self.write(h, kb, value, e, now):
+                    keys_failed.append(key)
+        finally:
+            self.release()
+        return keys_failed
+
+    def read(self, h, kb, now):
+        i = self.find(h, kb)
+        if i is None:
+            return None
+        mm = self.mm
+        e, offset, klen, vlen, pickled = SLOT.unpack_from(mm, i)[1:]
+        if e < now:
+            self.remove(i)
+            return None
+        start = offset + klen
+        end = start + vlen
+        if pickled:
+            return loads(mm[start:end])
+        return memoryview(mm)[start:end]
+
+    def renew(self, h, kb, e, now):
+        """Sets expires ``e`` of a key that is not expired. Returns an
+        offset of its table slot or None.
+        """
+        i = self.find(h, kb)
+        if i is None:
+            return None
+        mm = self.mm
+        slot = SLOT.unpack_from(mm, i)
+        if slot[1] < now:
+            self.remove(i)
+            return None
+        SLOT.pack_into(mm, i, slot[0], e, *slot[2:])
+        return i
+
+    def find(self, h, kb):
+        """Returns an offset of table slot that holds ``kb`` key or
+        None.
+        """
+        mm = self.mm
+        capacity = self.capacity
+        i = HEADER.size + h % capacity * SLOT.size
+        klen = len(kb)
+        for n in range(capacity):
+            sh, e, offset, sklen = SLOT.unpack_from(mm, i)[:4]
+            if not offset:
+                return None
+            if sh == h and sklen == klen:
+                end = offset + klen
+                if mm[offset:end] == kb:
+                    return i
+            i += SLOT.size
+            if i == self.data_offset:
+                i = HEADER.size
+        return None
+
+    def write(self, h, kb, value, e, now):
+        """Appends a record to the log and points the slot of ``kb``
+        to it. Returns False if there is no room for it.
+        """
+        if value.__class__ is bytes:
+            vb = value
+            pickled = 0
+        else:
+            vb = dumps(value, HIGHEST_PROTOCOL)
+            pickled = 1
+        klen = len(kb)
+        size = klen + len(vb)
+        mm = self.mm
+        magic, capacity, tail, count = HEADER.unpack_from(mm, 0)
+        offset = self.data_offset + tail
+        i = self.find(h, kb)
+        if offset + size > self.end or i is None and count >= self.max_count:
+            if i is not None:
+                self.remove(i)
+            if not self.compact(now, size):
+                return False
+            magic, capacity, tail, count = HEADER.unpack_from(mm, 0)
+            offset = self.data_offset + tail
+            i = None
+        if i is None:
+            i = HEADER.size + h % capacity * SLOT.size
+            while SLOT.unpack_from(mm, i)[2]:
+                i += SLOT.size
+                if i == self.data_offset:
+                    i = HEADER.size
+            count += 1
+        start = offset + klen
+        end = offset + size
+        mm[offset:start] = kb
+        mm[start:end] = vb
+        SLOT.pack_into(mm, i, h, e, offset, klen, len(vb), pickled)
+        HEADER.pack_into(mm, 0, magic, capacity, tail + size, count)
+        return True
+
+    def remove(self, i):
+        """Empties slot at ``i`` and closes the gap in probe sequence
+        by moving following slots back (no tombstones). The record
+        stays in the log until compaction.
+        """
+        mm = self.mm
+        capacity = self.capacity
+        first = HEADER.size
+        end = self.data_offset
+        j = i
+        while True:
+            j += SLOT.size
+            if j == end:
+                j = first
+            slot = SLOT.unpack_from(mm, j)
+            if not slot[2]:
+                break
+            k = first + slot[0] % capacity * SLOT.size
+            if i <= j:
+                if i < k <= j:
+                    continue
+            elif i < k or k <= j:
+                continue
+            SLOT.pack_into(mm, i, *slot)
+            i = j
+        SLOT.pack_into(mm, i, 0, 0, 0, 0, 0, 0)
+        magic, capacity, tail, count = HEADER.unpack_from(mm, 0)
+        HEADER.pack_into(mm, 0, magic, capacity, tail, count - 1)
+
+    def compact(self, now, size):
+        """Removes expired items and moves live records to the start
+        of the log. Evicts the oldest records until there is room for
+        a record of ``size`` bytes plus 1/8 of the log and a free slot.
+        Returns False if the record can not fit at all.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'cache')
+        >>> c = MappedFileCache(path, size=1 << 16, capacity=16)
+        >>> keys = ['k%d' % i for i in range(12)]
+        >>> [c.set(key, b'x' * 8000) for key in keys].count(False)
+        0
+        >>> sorted(c.get_multi(keys), key=len)
+        ['k4', 'k5', 'k6', 'k7', 'k8', 'k9', 'k10', 'k11']
+        >>> c.close()
+        """
+        mm = self.mm
+        capacity = self.capacity
+        room = self.end - self.data_offset
+        if size > room:
+            return False
+        # remove moves slots back, so slots are collected first
+        records = []
+        expired = []
+        for i in range(HEADER.size, self.data_offset, SLOT.size):
+            h, e, offset, klen, vlen, pickled = SLOT.unpack_from(mm, i)
+            if not offset:
+                continue
+            if e < now:
+                end = offset + klen
+                expired.append((h, mm[offset:end]))
+            else:
+                records.append((offset, h, klen, vlen))
+        for h, kb in expired:
+            self.remove(self.find(h, kb))
+        records.sort()
+        live = sum(klen + vlen for offset, h, klen, vlen in records)
+        evicted = 0
+        while evicted < len(records) and (
+            live + size + room // 8 > room
+            or len(records) - evicted >= self.max_count
+        ):
+            offset, h, klen, vlen = records[evicted]
+            end = offset + klen
+            self.remove(self.find(h, mm[offset:end]))
+            live -= klen + vlen
+            evicted += 1
+        tail = 0
+        for offset, h, klen, vlen in records[evicted:]:
+            end = offset + klen
+            i = self.find(h, mm[offset:end])
+            dest = self.data_offset + tail
+            if dest != offset:
+                mm.move(dest, offset, klen + vlen)
+                slot = list(SLOT.unpack_from(mm, i))
+                slot[2] = dest
+                SLOT.pack_into(mm, i, *slot)
+            tail += klen + vlen
+        magic, capacity, old_tail, count = HEADER.unpack_from(mm, 0)
+        HEADER.pack_into(mm, 0, magic, capacity, tail, count)
+        return tail + size <= room
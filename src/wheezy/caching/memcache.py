@@ -12,10 +12,16 @@ except ImportError:  # pragma: nocover
 class MemcachedClient(object):
     """A wrapper around python-memcache Client in order to adapt
     cache contract.
+
+    If ``codecs`` (see :py:class:`~wheezy.caching.codec.Codecs`) is
+    set, values are serialized by a codec of namespace rather than
+    pickled by the client.
     """
 
     def __init__(self, *args, **kwargs):
         self.key_encode = kwargs.pop("key_encode", string_encode)
+        self.codecs = kwargs.pop("codecs", None)
+        kwargs.setdefault("cache_cas", True)
         if Client is None:  # pragma: nocover
             raise ImportError("No module named 'memcache'")
         self.client = Client(*args, **kwargs)
@@ -24,10 +30,14 @@ class MemcachedClient(object):
         """Sets a key's value, regardless of previous contents
         in cache.
         """
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
         return self.client.set(self.key_encode(key), value, time)
 
     def set_multi(self, mapping, time=0, namespace=None):
         """Set multiple keys' values at once."""
+        if self.codecs is not None:
+            mapping = self.codecs.encode_multi(mapping, namespace)
         key_encode = self.key_encode
         keys, mapping = encode_keys(mapping, key_encode)
         failed = self.client.set_multi(mapping, time)
@@ -37,12 +47,16 @@ class MemcachedClient(object):
         """Sets a key's value, if and only if the item is not
         already.
         """
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
         return self.client.add(self.key_encode(key), value, time)
 
     def add_multi(self, mapping, time=0, namespace=None):
         """Adds multiple values at once, with no effect for keys
         already in cache.
         """
+        if self.codecs is not None:
+            mapping = self.codecs.encode_multi(mapping, namespace)
         failed = []
         key_encode = self.key_encode
         client = self.client
@@ -53,12 +67,16 @@ class MemcachedClient(object):
 
     def replace(self, key, value, time=0, namespace=None):
         """Replaces a key's value, failing if item isn't already."""
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
         return self.client.replace(self.key_encode(key), value, time)
 
     def replace_multi(self, mapping, time=0, namespace=None):
         """Replaces multiple values at once, with no effect for
         keys not in cache.
         """
+        if self.codecs is not None:
+            mapping = self.codecs.encode_multi(mapping, namespace)
         failed = []
         key_encode = self.key_encode
         client = self.client
@@ -69,7 +87,10 @@ class MemcachedClient(object):
 
     def get(self, key, namespace=None):
         """Looks up a single key."""
-        return self.client.get(self.key_encode(key))
+        value = self.client.get(self.key_encode(key))
+        if self.codecs is not None:
+            return self.codecs.decode(value)
+        return value
 
     def get_multi(self, keys, namespace=None):
         """Looks up multiple keys from cache in one operation.
@@ -78,11 +99,83 @@ class MemcachedClient(object):
         key_encode = self.key_encode
         encoded_keys = list(map(key_encode, keys))
         mapping = self.client.get_multi(encoded_keys)
+        if mapping and self.codecs is not None:
+            mapping = self.codecs.decode_multi(mapping)
         if mapping:
             key_mapping = dict(zip(encoded_keys, keys))
             return dict([(key_mapping[key], mapping[key]) for key in mapping])
         return mapping
 
+    def gets(self, key, namespace=None):
+        """Looks up a single key, returns a tuple of value and cas
+        token.
+        """
+        key = self.key_encode(key)
+        client = self.client
+        value = client.gets(key)
+        token = client.cas_ids.pop(key, None)
+        if value is None:
+            return None, None
+        if self.codecs is not None:
+            value = self.codecs.decode(value)
+            if value is None:
+                return None, None
+        return value, token
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys, returns a dict of found keys to a
+        tuple of value and cas token.
+        """
+        results = {}
+        for key in keys:
+            value, token = self.gets(key, namespace)
+            if value is not None:
+                results[key] = value, token
+        return results
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``. A ``None`` token adds the
+        key.
+        """
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
+        key = self.key_encode(key)
+        client = self.client
+        if token is None:
+            return client.add(key, value, time)
+        client.cas_ids[key] = token
+        try:
+            return client.cas(key, value, time)
+        finally:
+            client.cas_ids.pop(key, None)
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        return self.client.touch(self.key_encode(key), time) == 1
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        key_encode = self.key_encode
+        client = self.client
+        return [
+            key for key in keys if client.touch(key_encode(key), time) != 1
+        ]
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``. The client has no ``gat`` command, so this is a
+        ``get`` followed by ``touch``.
+        """
+        value = self.get(key, namespace)
+        if value is not None:
+            self.client.touch(self.key_encode(key), time)
+        return value
+
     def delete(self, key, seconds=0, namespace=None):
         """Deletes a key from cache."""
         return self.client.delete(self.key_encode(key), seconds) == 1
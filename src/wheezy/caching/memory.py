@@ -1,5 +1,40 @@
+import os
 from _thread import allocate_lock
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from struct import Struct
+from sys import getsizeof
+from threading import Event, Thread, current_thread, local
 from time import time as unixtime
+from weakref import ref
+
+from wheezy.caching.policy import LRUPolicy, TinyLFUPolicy
+
+POLICIES = {"lru": LRUPolicy, "tinylfu": TinyLFUPolicy}
+
+# magic, time of dump
+SNAPSHOT = Struct("<8sq")
+SNAPSHOT_MAGIC = b"WZMCDMP1"
+# size of pickled batch of (key, value, remaining ttl) tuples
+BATCH = Struct("<I")
+BATCH_SIZE = 10000
+
+# counters reported by MemoryCache.stats
+STATS = (
+    "get_hits",
+    "get_misses",
+    "get_expired",
+    "cmd_set",
+    "add_failures",
+    "replace_failures",
+    "reclaimed",
+)
+GET_HITS = 0
+GET_MISSES = 1
+GET_EXPIRED = 2
+CMD_SET = 3
+ADD_FAILURES = 4
+REPLACE_FAILURES = 5
+RECLAIMED = 6
 
 
 def expires(now, time):
@@ -30,38 +65,41 @@ def expires(now, time):
         return 0x7FFFFFFF
 
 
-def find_expired(bucket_items, now):
-    """
-    If there are no expired items in the bucket returns
-    empty list
-
-    >>> bucket_items = [('k1', 1), ('k2', 2), ('k3', 3)]
-    >>> find_expired(bucket_items, 0)
-    []
-    >>> bucket_items
-    [('k1', 1), ('k2', 2), ('k3', 3)]
+def estimate_size(value):
+    """Estimates a number of bytes occupied by ``value``. Containers
+    are measured together with their content, any other object by
+    ``sys.getsizeof``.
 
-    Expired items are returned in the list and deleted from
-    the bucket
-
-    >>> find_expired(bucket_items, 2)
-    ['k1']
-    >>> bucket_items
-    [('k2', 2), ('k3', 3)]
+    >>> estimate_size(b'x' * 100) > 100
+    True
+    >>> estimate_size(['x' * 100]) > estimate_size('x' * 100)
+    True
+    >>> estimate_size({'k': 'x' * 100}) > estimate_size('x' * 100)
+    True
     """
-    expired_keys = []
-    for i in range(len(bucket_items) - 1, -1, -1):
-        key, expires = bucket_items[i]
-        if expires < now:
-            expired_keys.append(key)
-            del bucket_items[i]
-    return expired_keys
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return getsizeof(value) + sum(map(estimate_size, value))
+    elif isinstance(value, dict):
+        return getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    else:
+        return getsizeof(value)
 
 
 class CacheItem(object):
     """A single cache item stored in cache."""
 
-    __slots__ = ("key", "value", "expires")
+    __slots__ = (
+        "key",
+        "value",
+        "expires",
+        "size",
+        "segment",
+        "cas",
+        "prev",
+        "next",
+    )
 
     def __init__(self, key, value, expires):
         self.key = key
@@ -70,17 +108,116 @@ class CacheItem(object):
 
 
 class MemoryCache(object):
-    """Effectively implements in-memory cache."""
+    """Effectively implements in-memory cache.
+
+    If ``max_items`` is set, the cache holds at most that number of
+    items and evicts the least recently used one on store.
+
+    >>> c = MemoryCache(max_items=2)
+    >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+    []
+    >>> c.get('k1')
+    1
+    >>> c.set('k3', 3, 100)
+    True
+    >>> sorted(c.items), c.evictions
+    (['k1', 'k3'], 1)
+
+    If ``max_bytes`` is set, the estimated size of keys and values
+    held is kept below that budget. The size of an item is estimated
+    by ``sizeof`` callable (defaults to ``estimate_size``).
+
+    >>> c = MemoryCache(max_bytes=1000, sizeof=len)
+    >>> c.set_multi({'k1': 'x' * 400, 'k2': 'x' * 400}, 100)
+    []
+    >>> c.set('k3', 'x' * 400, 100)
+    True
+    >>> sorted(c.items), c.size
+    (['k2', 'k3'], 804)
+
+    An item that doesn't fit the budget is not stored.
+
+    >>> c.set('k4', 'x' * 1000, 100)
+    False
+
+    The ``policy`` decides which item is evicted: ``lru`` (default)
+    or ``tinylfu`` (see ``wheezy.caching.policy.TinyLFUPolicy``) that
+    prefers to keep frequently used items.
 
-    def __init__(self, buckets=60, bucket_interval=15):
+    >>> c = MemoryCache(max_items=100, policy='tinylfu')
+    >>> for i in range(10):
+    ...     c.set_multi({'hot': 1, 'k%d' % i: i}, 100)
+    ...     c.get('hot')
+    []
+    1
+    ...
+    >>> for i in range(1000):
+    ...     c.add('scan%d' % i, i, 100)
+    True
+    ...
+    >>> c.get('hot')
+    1
+
+    Expired items are removed by a two level timing wheel. The first
+    level is a ring of ``buckets`` buckets, each covers
+    ``bucket_interval`` seconds. Items that expire past the ring are
+    kept in coarse buckets (one per ring period) and moved into the
+    ring once its period comes. Passed buckets are cleared on store.
+
+    If ``reaper`` is set, passed buckets are cleared by a background
+    thread every ``reap_interval`` seconds instead, so store operations
+    never pay for expiry. Call ``close`` to stop it.
+
+    The current time is read from ``clock`` (see
+    ``wheezy.caching.clock``) if set, otherwise from system time.
+
+    If ``stats`` is set, operations are counted per thread (see
+    ``stats`` method).
+
+    If ``hot_keys`` is set (see ``wheezy.caching.hotkeys.HotKeys``),
+    reads are sampled to find the most read keys.
+    """
+
+    def __init__(
+        self,
+        buckets=60,
+        bucket_interval=15,
+        max_items=0,
+        max_bytes=0,
+        sizeof=None,
+        policy="lru",
+        reaper=False,
+        reap_interval=1,
+        clock=None,
+        stats=False,
+        hot_keys=None,
+    ):
+        self.buckets = buckets
         self.period = buckets * bucket_interval
         self.interval = bucket_interval
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or estimate_size
+        self.bounded = bool(max_items or max_bytes)
+        if self.bounded:
+            self.policy = POLICIES[policy](
+                max_bytes or max_items, bool(max_bytes)
+            )
+        self.size = 0
+        self.evictions = 0
+        self.counters = stats and Counters(len(STATS)) or None
+        self.thread_counters = stats and self.counters.local or None
+        self.hot_keys = hot_keys
+        self.cas_counter = 0
         self.items = {}
         self.lock = allocate_lock()
-        self.expire_buckets = [
-            (allocate_lock(), []) for i in range(0, buckets)
-        ]
-        self.last_expire_bucket_id = -1
+        self.expire_buckets = [{} for i in range(buckets)]
+        self.expire_rounds = {}
+        self.clock = clock
+        now = int(unixtime()) if clock is None else clock.now
+        self.tick = now // bucket_interval
+        self.round = self.tick // buckets
+        self.reaper = reaper and Reaper([self], reap_interval) or None
 
     def set(self, key, value, time=0, namespace=None):
         """Sets a key's value, regardless of previous contents
@@ -171,18 +308,54 @@ class MemoryCache(object):
 
         >>> c.items['k'] = CacheItem('k', 'v', 1)
         >>> c.get('k')
+        >>> 'k' in c.items
+        False
+
+        Unless the cache is bounded, a hit or a miss is served without
+        lock; the lock is taken only to remove an expired item.
         """
-        now = int(unixtime())
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
         items = self.items
+        counters = self.thread_counters
+        hot_keys = self.hot_keys
+        if hot_keys is not None:
+            if hot_keys.skip > 0:
+                hot_keys.skip -= 1
+            else:
+                hot_keys.sample(key, namespace)
+        if not self.bounded:
+            entry = items.get(key)
+            if entry is None:
+                if counters is not None:
+                    counters.stripe[GET_MISSES] += 1
+                return None
+            if entry.expires >= now:
+                if counters is not None:
+                    counters.stripe[GET_HITS] += 1
+                return entry.value
         self.lock.acquire(1)
         try:
             try:
                 entry = items[key]
                 if entry.expires < now:
                     del items[key]
+                    self.discard(entry)
+                    if counters is not None:
+                        stripe = counters.stripe
+                        stripe[GET_EXPIRED] += 1
+                        stripe[GET_MISSES] += 1
                     return None
+                if self.bounded:
+                    self.policy.access(entry)
+                if counters is not None:
+                    counters.stripe[GET_HITS] += 1
                 return entry.value
             except KeyError:
+                if self.bounded:
+                    self.policy.miss(key)
+                if counters is not None:
+                    counters.stripe[GET_MISSES] += 1
                 return None
         finally:
             self.lock.release()
@@ -206,10 +379,58 @@ class MemoryCache(object):
         >>> c.items['k'] = CacheItem('k', 'v', 1)
         >>> c.get_multi(('k', ))
         {}
+        >>> 'k' in c.items
+        False
+
+        The same for bounded cache
+
+        >>> from wheezy.caching.clock import FakeClock
+        >>> clock = FakeClock(1000)
+        >>> c = MemoryCache(max_items=10, clock=clock)
+        >>> c.set('k', 'v', 10)
+        True
+        >>> clock.advance(20)
+        >>> c.get_multi(('k', 'x'))
+        {}
+        >>> 'k' in c.items
+        False
         """
-        now = int(unixtime())
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
         results = {}
         items = self.items
+        bounded = self.bounded
+        counters = self.thread_counters
+        if self.hot_keys is not None:
+            keys = list(keys)
+            self.hot_keys.sample_multi(keys, namespace)
+        if not bounded:
+            expired = []
+            misses = 0
+            for key in keys:
+                entry = items.get(key)
+                if entry is None:
+                    misses += 1
+                elif entry.expires < now:
+                    expired.append(entry)
+                else:
+                    results[key] = entry.value
+            if counters is not None:
+                stripe = counters.stripe
+                stripe[GET_HITS] += len(results)
+                stripe[GET_MISSES] += misses + len(expired)
+                stripe[GET_EXPIRED] += len(expired)
+            if expired:
+                self.lock.acquire(1)
+                try:
+                    for entry in expired:
+                        if items.get(entry.key) is entry:
+                            del items[entry.key]
+                            self.discard(entry)
+                finally:
+                    self.lock.release()
+            return results
+        misses = expired = 0
         self.lock.acquire(1)
         try:
             for key in keys:
@@ -217,14 +438,213 @@ class MemoryCache(object):
                     entry = items[key]
                     if entry.expires < now:
                         del items[key]
+                        self.discard(entry)
+                        expired += 1
                     else:
                         results[key] = entry.value
+                        if bounded:
+                            self.policy.access(entry)
                 except KeyError:
-                    pass
+                    if bounded:
+                        self.policy.miss(key)
+                    misses += 1
+        finally:
+            self.lock.release()
+        if counters is not None:
+            stripe = counters.stripe
+            stripe[GET_HITS] += len(results)
+            stripe[GET_MISSES] += misses + expired
+            stripe[GET_EXPIRED] += expired
+        return results
+
+    def gets(self, key, namespace=None):
+        """Looks up a single key. Returns a tuple of value and cas
+        token, or (None, None) if ``key`` is not found.
+
+        >>> c = MemoryCache()
+        >>> c.gets('k')
+        (None, None)
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.gets('k')
+        ('v', 1)
+        """
+        return self.gets_multi((key,), namespace).get(key, (None, None))
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys. Returns a dict of found keys to a
+        tuple of value and cas token.
+
+        The token is a version of an item, assigned once the item is
+        looked up this way. A store makes a new item, so the token of
+        an item replaced does not match.
+
+        >>> c = MemoryCache()
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+        []
+        >>> sorted(c.gets_multi(['k1', 'k2', 'k3']).items())
+        [('k1', (1, 1)), ('k2', (2, 2))]
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        results = {}
+        items = self.items
+        bounded = self.bounded
+        misses = 0
+        self.lock.acquire(1)
+        try:
+            for key in keys:
+                entry = items.get(key)
+                if entry is None or entry.expires < now:
+                    misses += 1
+                    continue
+                if bounded:
+                    self.policy.access(entry)
+                try:
+                    token = entry.cas
+                except AttributeError:
+                    self.cas_counter += 1
+                    token = entry.cas = self.cas_counter
+                results[key] = (entry.value, token)
         finally:
             self.lock.release()
+        counters = self.thread_counters
+        if counters is not None:
+            stripe = counters.stripe
+            stripe[GET_HITS] += len(results)
+            stripe[GET_MISSES] += misses
         return results
 
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets`` that returned ``token``. If
+        ``token`` is None, the value is added.
+
+        >>> c = MemoryCache()
+        >>> c.cas('k', 1, None, 100)
+        True
+        >>> value, token = c.gets('k')
+        >>> c.cas('k', value + 1, token, 100)
+        True
+        >>> c.cas('k', value + 1, token, 100)
+        False
+        >>> c.get('k')
+        2
+        """
+        if token is None:
+            return self.store(key, value, time, 1)
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        items = self.items
+        counters = self.thread_counters
+        if counters is not None:
+            counters.stripe[CMD_SET] += 1
+        self.lock.acquire(1)
+        try:
+            entry = items.get(key)
+            if (
+                entry is None
+                or entry.expires < now
+                or getattr(entry, "cas", None) != token
+            ):
+                return False
+            self.discard(entry)
+            entry = items[key] = CacheItem(key, value, time)
+            if self.bounded and not self.admit(entry):
+                return False
+            if time < 0x7FFFFFFF:
+                self.schedule(entry)
+        finally:
+            self.lock.release()
+        return True
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+
+        >>> c = MemoryCache()
+        >>> c.touch('k', 100)
+        False
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.touch('k', 200)
+        True
+        """
+        return not self.touch_multi((key,), time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+
+        Only the expire index is updated, an item is neither copied
+        nor counted as a read by eviction policy.
+
+        >>> from wheezy.caching.clock import FakeClock
+        >>> clock = FakeClock(1000)
+        >>> c = MemoryCache(clock=clock)
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 10)
+        []
+        >>> c.touch_multi(['k1', 'k3'], 100)
+        ['k3']
+        >>> clock.advance(50)
+        >>> c.get_multi(['k1', 'k2'])
+        {'k1': 1}
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        items = self.items
+        failed = []
+        self.lock.acquire(1)
+        try:
+            for key in keys:
+                entry = items.get(key)
+                if entry is None or entry.expires < now:
+                    failed.append(key)
+                    continue
+                self.unschedule(entry)
+                entry.expires = time
+                if time < 0x7FFFFFFF:
+                    self.schedule(entry)
+        finally:
+            self.lock.release()
+        return failed
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+
+        >>> c = MemoryCache()
+        >>> c.get_and_touch('k', 100)
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.get_and_touch('k', 200)
+        'v'
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        counters = self.thread_counters
+        self.lock.acquire(1)
+        try:
+            entry = self.items.get(key)
+            if entry is None or entry.expires < now:
+                if counters is not None:
+                    counters.stripe[GET_MISSES] += 1
+                return None
+            if self.bounded:
+                self.policy.access(entry)
+            self.unschedule(entry)
+            entry.expires = time
+            if time < 0x7FFFFFFF:
+                self.schedule(entry)
+        finally:
+            self.lock.release()
+        if counters is not None:
+            counters.stripe[GET_HITS] += 1
+        return entry.value
+
     def delete(self, key, seconds=0, namespace=None):
         """Deletes a key from cache.
 
@@ -244,13 +664,15 @@ class MemoryCache(object):
         >>> c.delete('k')
         False
         """
-        now = int(unixtime())
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
         items = self.items
         self.lock.acquire(1)
         try:
             try:
                 entry = items[key]
                 del items[key]
+                self.discard(entry)
                 if entry.expires < now:
                     return False
                 return True
@@ -277,13 +699,15 @@ class MemoryCache(object):
         {}
         """
         items = self.items
+        discard = self.discard
         self.lock.acquire(1)
         try:
             for key in keys:
                 try:
-                    del items[key]
+                    entry = items.pop(key)
                 except KeyError:
-                    pass
+                    continue
+                discard(entry)
         finally:
             self.lock.release()
         return True
@@ -310,7 +734,8 @@ class MemoryCache(object):
         >>> c.items['k'] = CacheItem('k', 1, 1)
         >>> c.incr('k')
         """
-        now = int(unixtime())
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
         items = self.items
         self.lock.acquire(1)
         try:
@@ -318,7 +743,10 @@ class MemoryCache(object):
                 entry = items[key]
                 if entry.expires < now:
                     del items[key]
+                    self.discard(entry)
                     entry = None
+                elif self.bounded:
+                    self.detach(entry)
             except KeyError:
                 entry = None
             if entry is None:
@@ -329,6 +757,11 @@ class MemoryCache(object):
                         key, initial_value, expires(now, 0)
                     )
             value = entry.value = entry.value + delta
+            self.cas_counter += 1
+            entry.cas = self.cas_counter
+            if self.bounded:
+                self.attach(entry)
+                self.evict()
             return value
         finally:
             self.lock.release()
@@ -361,18 +794,20 @@ class MemoryCache(object):
         >>> c.store('k', 'v', 100)
         True
 
-        There is item in expire_buckets that expired
+        Overwritten item is rescheduled, not duplicated
 
-        >>> c = MemoryCache()
-        >>> i = int((int(unixtime()) % c.period)
-        ...         / c.interval) - 1
-        >>> c.expire_buckets[i] = (allocate_lock(), [('x', 10)])
-        >>> c.store('k', 'v', 100)
+        >>> c.store('k', 'v', 200)
         True
+        >>> sum(map(len, c.expire_buckets + list(c.expire_rounds.values())))
+        1
         """
-        now = int(unixtime())
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
         time = expires(now, time)
         items = self.items
+        counters = self.thread_counters
+        if counters is not None:
+            counters.stripe[CMD_SET] += 1
         self.lock.acquire(1)
         try:
             try:
@@ -380,27 +815,24 @@ class MemoryCache(object):
                 if entry.expires < now:
                     del items[key]
                 elif op == 1:  # add
+                    if counters is not None:
+                        counters.stripe[ADD_FAILURES] += 1
                     return False
+                self.discard(entry)
             except KeyError:
                 if op == 2:  # replace
+                    if counters is not None:
+                        counters.stripe[REPLACE_FAILURES] += 1
                     return False
-            items[key] = CacheItem(key, value, time)
+            entry = items[key] = CacheItem(key, value, time)
+            if self.bounded and not self.admit(entry):
+                return False
+            if time < 0x7FFFFFFF:
+                self.schedule(entry)
+            if self.reaper is None and now // self.interval > self.tick:
+                self.expire(now)
         finally:
             self.lock.release()
-        if time < 0x7FFFFFFF:
-            expired_keys = None
-            bucket_id = int((now % self.period) / self.interval)
-            bucket_lock, bucket_items = self.expire_buckets[bucket_id - 1]
-            bucket_lock.acquire(1)
-            try:
-                if self.last_expire_bucket_id != bucket_id:
-                    self.last_expire_bucket_id = bucket_id
-                    expired_keys = find_expired(bucket_items, now)
-                bucket_items.append((key, time))
-            finally:
-                bucket_lock.release()
-            if expired_keys:
-                self.delete_multi(expired_keys)
         return True
 
     def store_multi(self, mapping, time=0, op=0):
@@ -412,20 +844,24 @@ class MemoryCache(object):
         >>> c.store_multi({'k': 'v'}, 100)
         []
 
-        There is item in expire_buckets that expired
+        Items expiring past the ring are kept in coarse buckets
 
-        >>> c = MemoryCache()
-        >>> i = int((int(unixtime()) % c.period)
-        ...         / c.interval) - 1
-        >>> c.expire_buckets[i] = (allocate_lock(), [('x', 10)])
-        >>> c.store_multi({'k': 'v'}, 100)
+        >>> c.store_multi({'k1': 1, 'k2': 2}, 2000)
         []
+        >>> sorted(c.expire_rounds[c.items['k1'].expires // c.period])
+        ['k1', 'k2']
         """
-        now = int(unixtime())
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
         time = expires(now, time)
         items = self.items
         keys_failed = []
-        succeeded = []
+        bounded = self.bounded
+        discard = self.discard
+        schedule = time < 0x7FFFFFFF and self.schedule
+        counters = self.thread_counters
+        if counters is not None:
+            counters.stripe[CMD_SET] += len(mapping)
         self.lock.acquire(1)
         try:
             for key, value in mapping.items():
@@ -435,29 +871,26 @@ class MemoryCache(object):
                         del items[key]
                     elif op == 1:  # add
                         keys_failed.append(key)
+                        if counters is not None:
+                            counters.stripe[ADD_FAILURES] += 1
                         continue
+                    discard(entry)
                 except KeyError:
                     if op == 2:  # replace
                         keys_failed.append(key)
+                        if counters is not None:
+                            counters.stripe[REPLACE_FAILURES] += 1
                         continue
-                items[key] = CacheItem(key, value, time)
-                succeeded.append((key, time))
+                entry = items[key] = CacheItem(key, value, time)
+                if bounded and not self.admit(entry):
+                    keys_failed.append(key)
+                    continue
+                if schedule:
+                    schedule(entry)
+            if self.reaper is None and now // self.interval > self.tick:
+                self.expire(now)
         finally:
             self.lock.release()
-        if time < 0x7FFFFFFF and succeeded:
-            expired_keys = None
-            bucket_id = int((now % self.period) / self.interval)
-            bucket_lock, bucket_items = self.expire_buckets[bucket_id - 1]
-            bucket_lock.acquire(1)
-            try:
-                if self.last_expire_bucket_id != bucket_id:
-                    self.last_expire_bucket_id = bucket_id
-                    expired_keys = find_expired(bucket_items, now)
-                bucket_items.extend(succeeded)
-            finally:
-                bucket_lock.release()
-            if expired_keys:
-                self.delete_multi(expired_keys)
         return keys_failed
 
     def flush_all(self):
@@ -472,16 +905,425 @@ class MemoryCache(object):
         self.lock.acquire(1)
         try:
             self.items.clear()
-            for bucket_lock, bucket_items in self.expire_buckets:
-                bucket_lock.acquire(1)
+            if self.bounded:
+                self.policy.clear()
+            self.size = 0
+            for bucket in self.expire_buckets:
+                bucket.clear()
+            self.expire_rounds.clear()
+        finally:
+            self.lock.release()
+        return True
+
+    def stats(self):
+        """Returns a snapshot of counters: ``cmd_get`` (keys looked
+        up), ``get_hits``, ``get_misses``, ``get_expired`` (misses of
+        items expired but not yet removed), ``cmd_set`` (keys stored
+        by set, add and replace), ``add_failures``,
+        ``replace_failures``, ``evictions``, ``reclaimed`` (expired
+        items removed by expiry buckets), ``curr_items`` and ``bytes``
+        (estimated size of items if ``max_bytes`` is set). Counters of
+        operations are zero unless the cache counts them (``stats``).
+
+        >>> c = MemoryCache(stats=True)
+        >>> c.add_multi({'k1': 1, 'k2': 2}, 100)
+        []
+        >>> c.add('k1', 1, 100)
+        False
+        >>> c.get_multi(['k1', 'k3'])
+        {'k1': 1}
+        >>> s = c.stats()
+        >>> s['cmd_get'], s['get_hits'], s['get_misses']
+        (2, 1, 1)
+        >>> s['cmd_set'], s['add_failures'], s['curr_items']
+        (3, 1, 2)
+        """
+        counters = self.counters
+        totals = counters and counters.totals() or [0] * len(STATS)
+        stats = dict(zip(STATS, totals))
+        stats["cmd_get"] = stats["get_hits"] + stats["get_misses"]
+        stats["evictions"] = self.evictions
+        stats["curr_items"] = len(self.items)
+        stats["bytes"] = self.size
+        return stats
+
+    def dump(self, path):
+        """Writes a snapshot of items to a file at ``path``. Returns a
+        number of items written.
+
+        The lock is held only to take a list of items, the items are
+        written in pickled batches of (key, value, remaining ttl)
+        tuples. The file is replaced once it is written completely.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'snapshot')
+        >>> c = MemoryCache()
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+        []
+        >>> c.dump(path)
+        2
+        >>> c = MemoryCache()
+        >>> c.load(path)
+        2
+        >>> sorted(c.get_multi(['k1', 'k2']).items())
+        [('k1', 1), ('k2', 2)]
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        self.lock.acquire(1)
+        try:
+            entries = list(self.items.values())
+        finally:
+            self.lock.release()
+        count = 0
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(SNAPSHOT.pack(SNAPSHOT_MAGIC, now))
+            for start in range(0, len(entries), BATCH_SIZE):
+                stop = start + BATCH_SIZE
+                batch = []
+                for entry in entries[start:stop]:
+                    e = entry.expires
+                    if e == 0x7FFFFFFF:
+                        batch.append((entry.key, entry.value, 0))
+                    elif e >= now:
+                        batch.append((entry.key, entry.value, e - now + 1))
+                data = dumps(batch, HIGHEST_PROTOCOL)
+                f.write(BATCH.pack(len(data)))
+                f.write(data)
+                count += len(batch)
+        os.replace(tmp, path)
+        return count
+
+    def load(self, path):
+        """Loads items from a snapshot written by ``dump``. Items that
+        expired since the snapshot was taken are skipped, items already
+        in cache are kept. Returns a number of items loaded.
+
+        The lock is taken once per batch of items.
+
+        >>> import os, tempfile
+        >>> from wheezy.caching.clock import FakeClock
+        >>> path = os.path.join(tempfile.mkdtemp(), 'snapshot')
+        >>> clock = FakeClock()
+        >>> c = MemoryCache(clock=clock)
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 10)
+        []
+        >>> c.set('k3', 3)
+        True
+        >>> c.dump(path)
+        3
+        >>> clock.advance(10)
+        >>> c = MemoryCache(clock=clock)
+        >>> c.set('k3', 30)
+        True
+        >>> c.load(path)
+        2
+        >>> sorted(c.get_multi(['k1', 'k2', 'k3']).items())
+        [('k1', 1), ('k2', 2), ('k3', 30)]
+        >>> clock.advance(1)
+        >>> c.get('k1')
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        count = 0
+        items = self.items
+        bounded = self.bounded
+        discard = self.discard
+        period = self.period
+        interval = self.interval
+        expire_buckets = self.expire_buckets
+        expire_rounds = self.expire_rounds
+        n = self.buckets
+        with open(path, "rb") as f:
+            magic, dumped = SNAPSHOT.unpack(f.read(SNAPSHOT.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("not a cache snapshot")
+            elapsed = now - dumped
+            while True:
+                header = f.read(BATCH.size)
+                if not header:
+                    break
+                batch = loads(f.read(BATCH.unpack(header)[0]))
+                self.lock.acquire(1)
                 try:
-                    del bucket_items[:]
+                    current = self.round
+                    for key, value, ttl in batch:
+                        if ttl:
+                            if ttl <= elapsed:
+                                continue
+                            e = dumped + ttl - 1
+                        else:
+                            e = 0x7FFFFFFF
+                        entry = items.get(key)
+                        if entry is not None:
+                            if entry.expires >= now:
+                                continue
+                            del items[key]
+                            discard(entry)
+                        items[key] = entry = CacheItem(key, value, e)
+                        if bounded and not self.admit(entry):
+                            continue
+                        count += 1
+                        if e == 0x7FFFFFFF:
+                            continue
+                        # inlined schedule(entry)
+                        r = e // period
+                        if r > current:
+                            bucket = expire_rounds.get(r)
+                            if bucket is None:
+                                expire_rounds[r] = bucket = {}
+                            bucket[key] = entry
+                        else:
+                            expire_buckets[e // interval % n][key] = entry
                 finally:
-                    bucket_lock.release()
+                    self.lock.release()
+        return count
+
+    def close(self):
+        """Stops background reaper if any."""
+        if self.reaper is not None:
+            self.reaper.stop()
+
+    # region: internal details
+
+    def schedule(self, entry):
+        """Puts ``entry`` into expire bucket."""
+        expires = entry.expires
+        r = expires // self.period
+        if r > self.round:
+            try:
+                self.expire_rounds[r][entry.key] = entry
+            except KeyError:
+                self.expire_rounds[r] = {entry.key: entry}
+        else:
+            bucket_id = (expires // self.interval) % self.buckets
+            self.expire_buckets[bucket_id][entry.key] = entry
+
+    def discard(self, entry):
+        """Removes ``entry`` from expire bucket and eviction policy."""
+        self.unschedule(entry)
+        if self.bounded:
+            self.detach(entry)
+
+    def unschedule(self, entry):
+        """Removes ``entry`` from expire bucket. An entry of the
+        current round is either in the ring or still in the round
+        bucket, if ``expire`` stopped at ``limit`` before moving it.
+        """
+        expires = entry.expires
+        if expires < 0x7FFFFFFF:
+            r = expires // self.period
+            if r >= self.round:
+                bucket = self.expire_rounds.get(r)
+                if bucket:
+                    bucket.pop(entry.key, None)
+                    if not bucket:
+                        del self.expire_rounds[r]
+            if r <= self.round:
+                bucket_id = (expires // self.interval) % self.buckets
+                self.expire_buckets[bucket_id].pop(entry.key, None)
+
+    def expire(self, now, limit=0):
+        """Removes items from buckets passed by ``now``. If ``limit``
+        is set, stops once that number of items is processed. Returns
+        True if there are no passed buckets left.
+        """
+        target = now // self.interval
+        items = self.items
+        buckets = self.expire_buckets
+        n = self.buckets
+        bounded = self.bounded
+        count = 0
+        reclaimed = 0
+        try:
+            while True:
+                pending = self.expire_rounds.get(self.round)
+                if pending is not None:
+                    while pending:
+                        if limit and count >= limit:
+                            return False
+                        key, entry = pending.popitem()
+                        count += 1
+                        if (
+                            items.get(key) is entry
+                            and entry.expires < 0x7FFFFFFF
+                        ):
+                            self.schedule(entry)
+                    del self.expire_rounds[self.round]
+                if self.tick >= target:
+                    return True
+                bucket = buckets[self.tick % n]
+                while bucket:
+                    if limit and count >= limit:
+                        return False
+                    key, entry = bucket.popitem()
+                    count += 1
+                    if items.get(key) is not entry:
+                        continue
+                    if entry.expires < now:
+                        del items[key]
+                        reclaimed += 1
+                        if bounded:
+                            self.detach(entry)
+                    elif entry.expires < 0x7FFFFFFF:
+                        self.schedule(entry)
+                self.tick += 1
+                if self.tick % n == 0:
+                    self.round += 1
         finally:
-            self.lock.release()
+            if reclaimed and self.thread_counters is not None:
+                self.thread_counters.stripe[RECLAIMED] += reclaimed
+
+    def admit(self, entry):
+        """Attaches a just stored ``entry`` and evicts items over the
+        limits. Returns False if ``entry`` doesn't fit the budget.
+        """
+        self.attach(entry)
+        if self.max_bytes and entry.size > self.max_bytes:
+            del self.items[entry.key]
+            self.detach(entry)
+            return False
+        self.evict()
         return True
 
+    def attach(self, entry):
+        if self.max_bytes:
+            sizeof = self.sizeof
+            entry.size = size = sizeof(entry.key) + sizeof(entry.value)
+            self.size += size
+        self.policy.add(entry)
+
+    def detach(self, entry):
+        self.policy.remove(entry)
+        if self.max_bytes:
+            self.size -= entry.size
+
+    def evict(self):
+        items = self.items
+        victim = self.policy.victim
+        max_items = self.max_items
+        max_bytes = self.max_bytes
+        while (max_items and len(items) > max_items) or (
+            max_bytes and self.size > max_bytes
+        ):
+            entry = victim()
+            del items[entry.key]
+            self.discard(entry)
+            self.evictions += 1
+
+
+class Counters(object):
+    """A set of ``n`` counters accumulated per thread, so counting
+    takes no lock and loses no updates made by other threads.
+    Counters of finished threads are folded into common totals.
+
+    >>> c = Counters(2)
+    >>> c.local.stripe[1] += 1
+    >>> c.totals()
+    [0, 1]
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.folded = [0] * n
+        self.stripes = []
+        self.lock = allocate_lock()
+        self.local = CountersLocal(self)
+
+    def register(self, stripe):
+        """Registers ``stripe`` of counters of the current thread."""
+        self.lock.acquire(1)
+        try:
+            self.fold()
+            self.stripes.append((ref(current_thread()), stripe))
+        finally:
+            self.lock.release()
+
+    def totals(self):
+        """Returns a list of counters summed over all threads."""
+        self.lock.acquire(1)
+        try:
+            self.fold()
+            totals = list(self.folded)
+            for thread, stripe in self.stripes:
+                for i, value in enumerate(stripe):
+                    totals[i] += value
+        finally:
+            self.lock.release()
+        return totals
+
+    # region: internal details
+
+    def fold(self):
+        """Adds counters of finished threads to ``folded`` totals."""
+        alive = []
+        folded = self.folded
+        for thread, stripe in self.stripes:
+            t = thread()
+            if t is not None and t.is_alive():
+                alive.append((thread, stripe))
+                continue
+            for i, value in enumerate(stripe):
+                folded[i] += value
+        self.stripes = alive
+
+
+class CountersLocal(local):
+    """Holds a ``stripe`` of counters per thread."""
+
+    def __init__(self, counters):
+        self.stripe = [0] * counters.n
+        counters.register(self.stripe)
+
+
+class Reaper(object):
+    """A daemon thread that removes expired items of ``caches`` every
+    ``interval`` seconds. The cache lock is released after each
+    ``limit`` items processed, so requests are not blocked for long.
+
+    The caches are referenced weakly; the thread exits once any of
+    them is garbage collected.
+    """
+
+    def __init__(self, caches, interval=1, limit=1000):
+        self.caches = [ref(cache) for cache in caches]
+        self.interval = interval
+        self.limit = limit
+        self.stopped = Event()
+        self.thread = Thread(
+            target=self.run, name="wheezy.caching.reaper", daemon=True
+        )
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for cache_ref in self.caches:
+                cache = cache_ref()
+                if cache is None:
+                    return
+                self.reap(cache)
+                cache = None
+
+    def reap(self, cache):
+        """Removes expired items of ``cache`` slice by slice."""
+        lock = cache.lock
+        done = False
+        while not done and not self.stopped.is_set():
+            clock = cache.clock
+            now = int(unixtime()) if clock is None else clock.now
+            lock.acquire(1)
+            try:
+                done = cache.expire(now, self.limit)
+            finally:
+                lock.release()
+
+    def stop(self):
+        """Signals the thread to stop and waits for it."""
+        self.stopped.set()
+        if self.thread is not current_thread():
+            self.thread.join()
+
 
 if __name__ == "__main__":  # pragma: nocover
     import doctest
@@ -80,6 +80,63 @@ class NullCache(object):
         """
         return {}
 
+    def gets(self, key, namespace=None):
+        """Looks up a single key, returns a tuple of value and cas
+        token.
+
+        >>> c = NullCache()
+        >>> c.gets('k')
+        (None, None)
+        """
+        return None, None
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys, returns a dict of found keys to a
+        tuple of value and cas token.
+
+        >>> c = NullCache()
+        >>> c.gets_multi([])
+        {}
+        """
+        return {}
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``.
+
+        >>> c = NullCache()
+        >>> c.cas('k', 'v', None)
+        True
+        """
+        return True
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+
+        >>> c = NullCache()
+        >>> c.touch('k')
+        False
+        """
+        return False
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+
+        >>> c = NullCache()
+        >>> c.touch_multi(['k'])
+        ['k']
+        """
+        return list(keys)
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+
+        >>> c = NullCache()
+        >>> c.get_and_touch('k')
+        """
+        return None
+
     def delete(self, key, seconds=0, namespace=None):
         """Deletes a key from cache.
 
@@ -2,12 +2,68 @@ from inspect import getfullargspec
 from time import sleep, time
 
 from wheezy.caching.dependency import CacheDependency
-from wheezy.caching.utils import total_seconds
+from wheezy.caching.utils import jitter_multi, jitter_time, total_seconds
+
+
+class NoneValue(object):
+    """A marker stored in cache for a ``None`` result of a factory.
+    It is pickled by reference, so it is restored as ``NONE``.
+
+    >>> from pickle import dumps, loads
+    >>> loads(dumps(NONE)) is NONE
+    True
+    """
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return "NONE"
+
+
+NONE = NoneValue()
+
+
+class StaleValue(object):
+    """A value stored by ``get_or_create`` in stale-while-revalidate
+    mode, along with the time it ``expires`` softly at.
+
+    >>> from pickle import dumps, loads
+    >>> loads(dumps(StaleValue('v', 100))).value
+    'v'
+    """
+
+    __slots__ = ("value", "expires")
+
+    def __init__(self, value, expires):
+        self.value = value
+        self.expires = expires
+
+    def __reduce__(self):
+        return StaleValue, (self.value, self.expires)
 
 
 class Cached(object):
     """Specializes access to cache by using a number of common settings
     for various cache operations and patterns.
+
+    If ``sliding`` is set, items are read with ``get_and_touch`` (and
+    ``touch_multi`` for keys found by ``get_multi``), so an item expires
+    ``time`` after it is last read rather than stored.
+
+    If ``jitter`` is set (e.g. 0.1), ``time`` of each write is shortened
+    at random by up to that fraction, so items written together (e.g.
+    by ``set_multi``) do not expire at once.
+
+    If ``none_time`` is set, a ``None`` result of a factory used by
+    cache patterns is cached too (as ``NONE`` marker) for that time,
+    so the factory is not called again until it expires. ``get`` and
+    ``get_multi`` read the marker as not found.
+
+    If ``stale_time`` is set, ``get_or_create`` keeps items for that
+    long past ``time``. An item read past ``time`` is returned as is
+    (stale) while a single caller, that enters one pass, refreshes it:
+    in place or, if ``executor`` (e.g.
+    ``concurrent.futures.ThreadPoolExecutor``) is set, in background.
     """
 
     def __init__(
@@ -18,6 +74,12 @@ class Cached(object):
         namespace=None,
         timeout=10,
         key_prefix="one_pass:",
+        clock=None,
+        sliding=False,
+        jitter=0,
+        none_time=None,
+        stale_time=None,
+        executor=None,
     ):
         self.cache = cache
         self.key_builder = key_builder
@@ -25,26 +87,33 @@ class Cached(object):
         self.namespace = namespace
         self.timeout = total_seconds(timeout)
         self.key_prefix = key_prefix
+        self.clock = clock
+        self.sliding = sliding
+        assert 0 <= jitter < 1
+        self.jitter = jitter
+        self.none_time = none_time
+        self.stale_time = stale_time
+        self.executor = executor
         self.dependency = CacheDependency(cache, time, namespace)
 
     def set(self, key, value, dependency_key=None):
         """Sets a key's value, regardless of previous contents
         in cache.
         """
-        succeed = self.cache.set(key, value, self.time, self.namespace)
+        succeed = self.cache.set(key, value, self.ttl(), self.namespace)
         if dependency_key:
             self.dependency.add(dependency_key, key)
         return succeed
 
     def set_multi(self, mapping):
         """Set multiple keys' values at once."""
-        return self.cache.set_multi(mapping, self.time, self.namespace)
+        return self.store_multi(self.cache.set_multi, mapping)
 
     def add(self, key, value, dependency_key=None):
         """Sets a key's value, if and only if the item is not
         already.
         """
-        succeed = self.cache.add(key, value, self.time, self.namespace)
+        succeed = self.cache.add(key, value, self.ttl(), self.namespace)
         if succeed and dependency_key:
             self.dependency.add(dependency_key, key)
         return succeed
@@ -53,27 +122,43 @@ class Cached(object):
         """Adds multiple values at once, with no effect for keys
         already in cache.
         """
-        return self.cache.add_multi(mapping, self.time, self.namespace)
+        return self.store_multi(self.cache.add_multi, mapping)
 
     def replace(self, key, value):
         """Replaces a key's value, failing if item isn't already."""
-        return self.cache.replace(key, value, self.time, self.namespace)
+        return self.cache.replace(key, value, self.ttl(), self.namespace)
 
     def replace_multi(self, mapping):
         """Replaces multiple values at once, with no effect for
         keys not in cache.
         """
-        return self.cache.replace_multi(mapping, self.time, self.namespace)
+        return self.store_multi(self.cache.replace_multi, mapping)
 
     def get(self, key):
         """Looks up a single key."""
-        return self.cache.get(key, self.namespace)
+        result = self.lookup(key)
+        return None if result is NONE else result
 
     def get_multi(self, keys):
         """Looks up multiple keys from cache in one operation.
         This is the recommended way to do bulk loads.
         """
-        return self.cache.get_multi(keys, self.namespace)
+        results = self.lookup_multi(keys)
+        if self.none_time is not None and results:
+            return dict(
+                (key, value)
+                for key, value in results.items()
+                if value is not NONE
+            )
+        return results
+
+    def touch(self, key):
+        """Sets a new expiration time of a key."""
+        return self.cache.touch(key, self.ttl(), self.namespace)
+
+    def touch_multi(self, keys):
+        """Sets a new expiration time of multiple keys at once."""
+        return self.cache.touch_multi(keys, self.ttl(), self.namespace)
 
     def delete(self, key, seconds=0):
         """Deletes a key from cache."""
@@ -98,14 +183,13 @@ class Cached(object):
         result and if operation succeed use *dependency_key_factory*
         to get an instance of `dependency_key` to link with *key*.
         """
-        result = self.cache.get(key, self.namespace)
+        result = self.lookup(key)
         if result is not None:
-            return result
+            return None if result is NONE else result
         result = create_factory()
-        if result is not None:
-            succeed = self.cache.add(key, result, self.time, self.namespace)
-            if succeed and dependency_key_factory is not None:
-                self.dependency.add(dependency_key_factory(), key)
+        succeed = self.store(self.cache.add, key, result)
+        if succeed and dependency_key_factory is not None:
+            self.dependency.add(dependency_key_factory(), key)
         return result
 
     def wraps_get_or_add(self, wrapped=None, make_key=None):
@@ -127,12 +211,11 @@ class Cached(object):
 
             def get_or_add_wrapper(*args, **kwargs):
                 key = mk(*args, **kwargs)
-                result = self.cache.get(key, self.namespace)
+                result = self.lookup(key)
                 if result is not None:
-                    return result
+                    return None if result is NONE else result
                 result = func(*args, **kwargs)
-                if result is not None:
-                    self.cache.add(key, result, self.time, self.namespace)
+                self.store(self.cache.add, key, result)
                 return result
 
             return get_or_add_wrapper
@@ -149,14 +232,13 @@ class Cached(object):
         result and use *dependency_key_factory* to get an instance
         of `dependency_key` to link with *key*.
         """
-        result = self.cache.get(key, self.namespace)
+        result = self.lookup(key)
         if result is not None:
-            return result
+            return None if result is NONE else result
         result = create_factory()
-        if result is not None:
-            self.cache.set(key, result, self.time, self.namespace)
-            if dependency_key_factory is not None:
-                self.dependency.add(dependency_key_factory(), key)
+        succeed = self.store(self.cache.set, key, result)
+        if succeed and dependency_key_factory is not None:
+            self.dependency.add(dependency_key_factory(), key)
         return result
 
     def __call__(self, wrapped=None, make_key=None):
@@ -182,12 +264,11 @@ class Cached(object):
 
             def get_or_set_wrapper(*args, **kwargs):
                 key = mk(*args, **kwargs)
-                result = self.cache.get(key, self.namespace)
+                result = self.lookup(key)
                 if result is not None:
-                    return result
+                    return None if result is NONE else result
                 result = func(*args, **kwargs)
-                if result is not None:
-                    self.cache.set(key, result, self.time, self.namespace)
+                self.store(self.cache.set, key, result)
                 return result
 
             return get_or_set_wrapper
@@ -205,7 +286,7 @@ class Cached(object):
         return cached items if any.
         """
         key_map = dict((make_key(a), a) for a in args)
-        cache_result = self.get_multi(key_map.keys())
+        cache_result = self.lookup_multi(key_map.keys())
         if not cache_result:
             data_result = create_factory(args)
         elif len(cache_result) != len(key_map):
@@ -214,12 +295,29 @@ class Cached(object):
             )
         else:
             return dict(
-                [(key_map[key], cache_result[key]) for key in cache_result]
+                [
+                    (key_map[key], value)
+                    for key, value in cache_result.items()
+                    if value is not NONE
+                ]
             )
 
+        if self.none_time is not None:
+            found = data_result or ()
+            missing = dict(
+                (key, NONE)
+                for key, k in key_map.items()
+                if key not in cache_result and k not in found
+            )
+            if missing:
+                self.cache.set_multi(missing, self.none_time, self.namespace)
         if not data_result:
             return dict(
-                [(key_map[key], cache_result[key]) for key in cache_result]
+                [
+                    (key_map[key], value)
+                    for key, value in cache_result.items()
+                    if value is not NONE
+                ]
             )
         self.set_multi(
             dict(
@@ -231,7 +329,11 @@ class Cached(object):
             )
         )
         data_result.update(
-            [(key_map[key], cache_result[key]) for key in cache_result]
+            [
+                (key_map[key], value)
+                for key, value in cache_result.items()
+                if value is not NONE
+            ]
         )
         return data_result
 
@@ -284,18 +386,20 @@ class Cached(object):
         """
         result = None
         one_pass = OnePass(
-            self.cache, self.key_prefix + key, self.timeout, self.namespace
+            self.cache,
+            self.key_prefix + key,
+            self.timeout,
+            self.namespace,
+            self.clock,
         )
         try:
             one_pass.__enter__()
             if one_pass.acquired:
-                result = create_factory()
-                if result is not None:
-                    self.cache.set(key, result, self.time, self.namespace)
-                    if dependency_key_factory is not None:
-                        self.dependency.add(dependency_key_factory(), key)
+                result = self.create(
+                    key, create_factory, dependency_key_factory
+                )
             elif one_pass.wait():
-                result = self.cache.get(key, self.namespace)
+                result = self.get(key)
         finally:
             one_pass.__exit__(None, None, None)
         return result
@@ -304,9 +408,13 @@ class Cached(object):
         """Cache Pattern: get an item by *key* from *cache* and
         if it is not available see `one_pass_create`.
         """
-        result = self.cache.get(key, self.namespace)
+        result = self.lookup(key, True)
         if result is not None:
-            return result
+            if result.__class__ is StaleValue:
+                return self.revalidate(
+                    key, result, create_factory, dependency_key_factory
+                )
+            return None if result is NONE else result
         return self.one_pass_create(
             key, create_factory, dependency_key_factory
         )
@@ -330,9 +438,13 @@ class Cached(object):
 
             def get_or_create_wrapper(*args, **kwargs):
                 key = mk(*args, **kwargs)
-                result = self.cache.get(key, self.namespace)
+                result = self.lookup(key, True)
                 if result is not None:
-                    return result
+                    if result.__class__ is StaleValue:
+                        return self.revalidate(
+                            key, result, lambda: func(*args, **kwargs)
+                        )
+                    return None if result is NONE else result
                 return self.one_pass_create(key, lambda: func(*args, **kwargs))
 
             return get_or_create_wrapper
@@ -344,6 +456,129 @@ class Cached(object):
 
     # region: internal details
 
+    def lookup(self, key, stale=False):
+        """Looks up a single key, ``NONE`` marker is returned as is.
+        A value of ``StaleValue`` is unwrapped unless ``stale`` is set.
+        """
+        if self.sliding:
+            result = self.cache.get_and_touch(key, self.ttl(), self.namespace)
+        else:
+            result = self.cache.get(key, self.namespace)
+        if (
+            not stale
+            and self.stale_time is not None
+            and result.__class__ is StaleValue
+        ):
+            return result.value
+        return result
+
+    def lookup_multi(self, keys):
+        """Looks up multiple keys, ``NONE`` marker is returned as is,
+        a value of ``StaleValue`` is unwrapped.
+        """
+        results = self.cache.get_multi(keys, self.namespace)
+        if self.sliding and results:
+            self.cache.touch_multi(list(results), self.ttl(), self.namespace)
+        if self.stale_time is not None and results:
+            return dict(
+                (
+                    key,
+                    value.value if value.__class__ is StaleValue else value,
+                )
+                for key, value in results.items()
+            )
+        return results
+
+    def store(self, store, key, value):
+        """Stores ``value`` with ``store`` operation of cache (``set``
+        or ``add``); ``None`` is stored as ``NONE`` marker for
+        ``none_time`` if set.
+        """
+        if value is not None:
+            return store(key, value, self.ttl(), self.namespace)
+        if self.none_time is not None:
+            return store(key, NONE, self.none_time, self.namespace)
+        return False
+
+    def create(self, key, create_factory, dependency_key_factory=None):
+        """Stores a result of *create_factory* by *key*, with a soft
+        expiration time if ``stale_time`` is set.
+        """
+        result = create_factory()
+        if result is not None and self.stale_time is not None:
+            clock = self.clock
+            now = int(time()) if clock is None else clock.now
+            t = self.ttl()
+            succeed = self.cache.set(
+                key,
+                StaleValue(result, now + t),
+                t + self.stale_time,
+                self.namespace,
+            )
+        else:
+            succeed = self.store(self.cache.set, key, result)
+        if succeed and dependency_key_factory is not None:
+            self.dependency.add(dependency_key_factory(), key)
+        return result
+
+    def revalidate(
+        self, key, stale, create_factory, dependency_key_factory=None
+    ):
+        """Returns a value of *stale* item, refreshed by a caller that
+        enters one pass once the item expires softly.
+        """
+        clock = self.clock
+        now = int(time()) if clock is None else clock.now
+        if now <= stale.expires:
+            return stale.value
+        one_pass = OnePass(
+            self.cache,
+            self.key_prefix + key,
+            self.timeout,
+            self.namespace,
+            self.clock,
+        )
+        one_pass.__enter__()
+        if not one_pass.acquired:
+            return stale.value
+        if self.executor is not None:
+            try:
+                self.executor.submit(
+                    self.refresh,
+                    one_pass,
+                    key,
+                    create_factory,
+                    dependency_key_factory,
+                )
+            except Exception:
+                one_pass.__exit__(None, None, None)
+                raise
+            return stale.value
+        return self.refresh(
+            one_pass, key, create_factory, dependency_key_factory
+        )
+
+    def refresh(self, one_pass, key, create_factory, dependency_key_factory):
+        try:
+            return self.create(key, create_factory, dependency_key_factory)
+        finally:
+            one_pass.__exit__(None, None, None)
+
+    def ttl(self):
+        """Returns ``time`` of a write, shortened by ``jitter`` if
+        set.
+        """
+        if self.jitter:
+            return jitter_time(self.time, self.jitter)
+        return self.time
+
+    def store_multi(self, store_multi, mapping):
+        if self.jitter:
+            return jitter_multi(
+                store_multi, mapping, self.time, self.jitter, self.namespace
+            )
+        return store_multi(mapping, self.time, self.namespace)
+
     def adapt(self, func, make_key=None):
         if make_key:
             argnames = getfullargspec(func)[0]
@@ -373,17 +608,19 @@ class OnePass(object):
                 # timeout
     """
 
-    __slots__ = ("cache", "key", "time", "namespace", "acquired")
+    __slots__ = ("cache", "key", "time", "namespace", "clock", "acquired")
 
-    def __init__(self, cache, key, time=10, namespace=None):
+    def __init__(self, cache, key, time=10, namespace=None, clock=None):
         self.cache = cache
         self.key = key
         self.time = total_seconds(time)
         self.namespace = namespace
+        self.clock = clock
         self.acquired = False
 
     def __enter__(self):
-        marker = int(time())
+        clock = self.clock
+        marker = int(time()) if clock is None else clock.now
         self.acquired = self.cache.add(
             self.key, marker, self.time, self.namespace
         )
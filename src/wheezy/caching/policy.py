@@ -0,0 +1,246 @@
+"""``policy`` module provides eviction policies for a bounded
+:py:class:`~wheezy.caching.memory.MemoryCache`.
+
+A policy keeps cache entries in intrusive circular doubly linked
+lists (``prev`` and ``next`` slots of an entry) and decides which
+entry is evicted next.
+"""
+
+WINDOW = 1
+PROBATION = 2
+PROTECTED = 3
+
+HALVE = bytes(i >> 1 for i in range(256))
+
+
+class Sentinel(object):
+    """The root of circular doubly linked list."""
+
+    __slots__ = ("prev", "next")
+
+    def __init__(self):
+        self.prev = self.next = self
+
+
+def link(root, entry):
+    """Links ``entry`` next to ``root`` of the circular doubly linked
+    list, so it becomes the most recently used one.
+
+    >>> from wheezy.caching.memory import CacheItem
+    >>> root = Sentinel()
+    >>> a = CacheItem('a', 1, 0)
+    >>> b = CacheItem('b', 2, 0)
+    >>> link(root, a)
+    >>> link(root, b)
+    >>> root.next.key, root.prev.key
+    ('b', 'a')
+    """
+    head = root.next
+    entry.prev = root
+    entry.next = head
+    head.prev = root.next = entry
+
+
+def unlink(entry):
+    """Removes ``entry`` from the circular doubly linked list.
+
+    >>> from wheezy.caching.memory import CacheItem
+    >>> root = Sentinel()
+    >>> a = CacheItem('a', 1, 0)
+    >>> link(root, a)
+    >>> unlink(a)
+    >>> root.next is root
+    True
+    """
+    prev = entry.prev
+    following = entry.next
+    prev.next = following
+    following.prev = prev
+
+
+class LRUPolicy(object):
+    """Least recently used entry is evicted first."""
+
+    def __init__(self, capacity, weighted=False):
+        self.root = Sentinel()
+
+    def add(self, entry):
+        link(self.root, entry)
+
+    def remove(self, entry):
+        unlink(entry)
+
+    def access(self, entry):
+        unlink(entry)
+        link(self.root, entry)
+
+    def miss(self, key):
+        pass
+
+    def victim(self):
+        return self.root.prev
+
+    def clear(self):
+        self.root = Sentinel()
+
+
+class CountMinSketch(object):
+    """A count-min sketch of 4 rows with counters saturated at 15.
+    Once a number of increments reaches a sample size, all counters
+    are halved so the sketch follows changes in popularity.
+
+    >>> s = CountMinSketch(64)
+    >>> for i in range(5):
+    ...     s.increment('a')
+    >>> s.frequency('a'), s.frequency('b')
+    (5, 0)
+    >>> s.reset()
+    >>> s.frequency('a')
+    2
+    """
+
+    def __init__(self, width, sample_size=None):
+        n = 16
+        while n < width:
+            n <<= 1
+        self.width = n
+        self.mask = n - 1
+        self.table = bytearray(n * 4)
+        self.sample_size = sample_size or n * 10
+        self.additions = 0
+
+    def indexes(self, key):
+        h = hash(key) * 0x9E3779B97F4A7C15
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) & 0xFFFFFFFF | 1
+        mask = self.mask
+        width = self.width
+        return (
+            h1 & mask,
+            width + ((h1 + h2) & mask),
+            2 * width + ((h1 + 2 * h2) & mask),
+            3 * width + ((h1 + 3 * h2) & mask),
+        )
+
+    def frequency(self, key):
+        table = self.table
+        return min([table[i] for i in self.indexes(key)])
+
+    def increment(self, key):
+        table = self.table
+        for i in self.indexes(key):
+            if table[i] < 15:
+                table[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.reset()
+
+    def reset(self):
+        self.table = self.table.translate(HALVE)
+        self.additions >>= 1
+
+
+class TinyLFUPolicy(object):
+    """Window TinyLFU: a small admission window LRU (1% of capacity)
+    in front of a segmented LRU main space (80% protected, 20%
+    probation). An entry that leaves the window is admitted to the main
+    space only if it is estimated (by count-min sketch) to be used more
+    often than the one it displaces.
+
+    ``capacity`` is a maximum number of entries or, if ``weighted``, a
+    sum of entry sizes.
+    """
+
+    def __init__(self, capacity, weighted=False):
+        self.weighted = weighted
+        self.window_max = max(1, capacity // 100)
+        self.protected_max = (capacity - self.window_max) * 4 // 5
+        self.capacity = capacity
+        self.sketch = CountMinSketch(weighted and capacity // 512 or capacity)
+        self.clear()
+
+    def clear(self):
+        self.window = Sentinel()
+        self.probation = Sentinel()
+        self.protected = Sentinel()
+        self.window_weight = 0
+        self.protected_weight = 0
+        self.weight = 0
+        self.candidates = []
+
+    def add(self, entry):
+        self.sketch.increment(entry.key)
+        w = self.weighted and entry.size or 1
+        entry.segment = WINDOW
+        link(self.window, entry)
+        self.window_weight += w
+        self.weight += w
+        if self.window_weight <= self.window_max:
+            return
+        window = self.window
+        probation = self.probation
+        over = self.weight > self.capacity
+        if not over:
+            del self.candidates[:]
+        while self.window_weight > self.window_max:
+            candidate = window.prev
+            unlink(candidate)
+            self.window_weight -= self.weighted and candidate.size or 1
+            candidate.segment = PROBATION
+            link(probation, candidate)
+            if over:
+                self.candidates.append(candidate)
+
+    def remove(self, entry):
+        unlink(entry)
+        w = self.weighted and entry.size or 1
+        segment = entry.segment
+        if segment == WINDOW:
+            self.window_weight -= w
+        elif segment == PROTECTED:
+            self.protected_weight -= w
+        entry.segment = 0
+        self.weight -= w
+
+    def access(self, entry):
+        self.sketch.increment(entry.key)
+        segment = entry.segment
+        unlink(entry)
+        if segment == WINDOW:
+            link(self.window, entry)
+        elif segment == PROTECTED:
+            link(self.protected, entry)
+        else:
+            entry.segment = PROTECTED
+            link(self.protected, entry)
+            self.protected_weight += self.weighted and entry.size or 1
+            protected = self.protected
+            probation = self.probation
+            while self.protected_weight > self.protected_max:
+                demoted = protected.prev
+                unlink(demoted)
+                demoted.segment = PROBATION
+                link(probation, demoted)
+                self.protected_weight -= self.weighted and demoted.size or 1
+
+    def miss(self, key):
+        self.sketch.increment(key)
+
+    def victim(self):
+        probation = self.probation
+        victim = probation.prev
+        if victim is probation:
+            victim = self.protected.prev
+            if victim is self.protected:
+                return self.window.prev
+            return victim
+        candidates = self.candidates
+        while candidates:
+            candidate = candidates.pop()
+            if candidate.segment != PROBATION or candidate is victim:
+                continue
+            frequency = self.sketch.frequency
+            if frequency(candidate.key) > frequency(victim.key):
+                return victim
+            return candidate
+        return victim
@@ -9,6 +9,7 @@ try:
         behaviors = kwargs.setdefault("behaviors", {})
         behaviors.setdefault("tcp_nodelay", True)
         behaviors.setdefault("ketama", True)
+        behaviors.setdefault("cas", True)
         return Client(*args, **kwargs)
 
 except ImportError:  # pragma: nocover
@@ -18,19 +19,27 @@ except ImportError:  # pragma: nocover
 
 
 class MemcachedClient(object):
-    """A wrapper around pylibmc Client in order to adapt cache contract."""
+    """A wrapper around pylibmc Client in order to adapt cache contract.
 
-    def __init__(self, pool, key_encode=None):
+    If ``codecs`` (see :py:class:`~wheezy.caching.codec.Codecs`) is
+    set, values are serialized by a codec of namespace rather than
+    pickled by the client.
+    """
+
+    def __init__(self, pool, key_encode=None, codecs=None):
         assert hasattr(pool, "acquire")
         assert hasattr(pool, "get_back")
         self.pool = pool
         self.key_encode = key_encode or string_encode
+        self.codecs = codecs
 
     def set(self, key, value, time=0, namespace=None):
         """Sets a key's value, regardless of previous contents
         in cache.
         """
         key = self.key_encode(key)
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
         try:
             client = self.pool.acquire()
             return client.set(key, value, time)
@@ -39,6 +48,8 @@ class MemcachedClient(object):
 
     def set_multi(self, mapping, time=0, namespace=None):
         """Set multiple keys' values at once."""
+        if self.codecs is not None:
+            mapping = self.codecs.encode_multi(mapping, namespace)
         key_encode = self.key_encode
         keys, mapping = encode_keys(mapping, key_encode)
         try:
@@ -53,6 +64,8 @@ class MemcachedClient(object):
         already.
         """
         key = self.key_encode(key)
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
         try:
             client = self.pool.acquire()
             return client.add(key, value, time)
@@ -63,6 +76,8 @@ class MemcachedClient(object):
         """Adds multiple values at once, with no effect for keys
         already in cache.
         """
+        if self.codecs is not None:
+            mapping = self.codecs.encode_multi(mapping, namespace)
         key_encode = self.key_encode
         keys, mapping = encode_keys(mapping, key_encode)
         try:
@@ -75,6 +90,8 @@ class MemcachedClient(object):
     def replace(self, key, value, time=0, namespace=None):
         """Replaces a key's value, failing if item isn't already."""
         key = self.key_encode(key)
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
         try:
             try:
                 client = self.pool.acquire()
@@ -88,6 +105,8 @@ class MemcachedClient(object):
         """Replaces multiple values at once, with no effect for
         keys not in cache.
         """
+        if self.codecs is not None:
+            mapping = self.codecs.encode_multi(mapping, namespace)
         key_encode = self.key_encode
         failed = []
         mapping = [(key, key_encode(key), mapping[key]) for key in mapping]
@@ -107,9 +126,12 @@ class MemcachedClient(object):
         key = self.key_encode(key)
         try:
             client = self.pool.acquire()
-            return client.get(key)
+            value = client.get(key)
         finally:
             self.pool.get_back(client)
+        if self.codecs is not None:
+            return self.codecs.decode(value)
+        return value
 
     def get_multi(self, keys, namespace=None):
         """Looks up multiple keys from cache in one operation.
@@ -122,11 +144,102 @@ class MemcachedClient(object):
             mapping = client.get_multi(encoded_keys)
         finally:
             self.pool.get_back(client)
+        if mapping and self.codecs is not None:
+            mapping = self.codecs.decode_multi(mapping)
         if mapping:
             key_mapping = dict(zip(encoded_keys, keys))
             return dict([(key_mapping[key], mapping[key]) for key in mapping])
         return mapping
 
+    def gets(self, key, namespace=None):
+        """Looks up a single key, returns a tuple of value and cas
+        token.
+        """
+        key = self.key_encode(key)
+        try:
+            client = self.pool.acquire()
+            value, token = client.gets(key)
+        finally:
+            self.pool.get_back(client)
+        if value is None:
+            return None, None
+        if self.codecs is not None:
+            value = self.codecs.decode(value)
+            if value is None:
+                return None, None
+        return value, token
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys, returns a dict of found keys to a
+        tuple of value and cas token.
+        """
+        results = {}
+        for key in keys:
+            value, token = self.gets(key, namespace)
+            if value is not None:
+                results[key] = value, token
+        return results
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``. A ``None`` token adds the
+        key.
+        """
+        key = self.key_encode(key)
+        if self.codecs is not None:
+            value = self.codecs.encode(value, namespace)
+        try:
+            try:
+                client = self.pool.acquire()
+                if token is None:
+                    return client.add(key, value, time)
+                return client.cas(key, value, token, time)
+            except NotFound:
+                return False
+        finally:
+            self.pool.get_back(client)
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        key = self.key_encode(key)
+        try:
+            client = self.pool.acquire()
+            return client.touch(key, time)
+        finally:
+            self.pool.get_back(client)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        key_encode = self.key_encode
+        try:
+            client = self.pool.acquire()
+            return [
+                key for key in keys if not client.touch(key_encode(key), time)
+            ]
+        finally:
+            self.pool.get_back(client)
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``. The client has no ``gat`` command, so this is a
+        ``get`` followed by ``touch`` with the same connection.
+        """
+        key = self.key_encode(key)
+        try:
+            client = self.pool.acquire()
+            value = client.get(key)
+            if value is not None:
+                client.touch(key, time)
+        finally:
+            self.pool.get_back(client)
+        if self.codecs is not None:
+            return self.codecs.decode(value)
+        return value
+
     def delete(self, key, seconds=0, namespace=None):
         """Deletes a key from cache."""
         key = self.key_encode(key)
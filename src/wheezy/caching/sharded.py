@@ -0,0 +1,220 @@
+from wheezy.caching.memory import MemoryCache, Reaper
+
+
+class ShardedMemoryCache(object):
+    """Partitions keys by hash over a number of independent
+    ``MemoryCache`` shards. Each shard has own items, lock and expiry
+    buckets, so operations on keys from different shards do not
+    contend for a lock.
+
+    Keyword arguments are passed to each shard, ``max_items`` and
+    ``max_bytes`` are divided between shards. If ``reaper`` is set, a
+    single background thread removes expired items of all shards.
+
+    >>> c = ShardedMemoryCache(shards=4, max_items=100)
+    >>> len(c.shards), c.shards[0].max_items
+    (4, 25)
+    >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+    []
+    >>> sorted(c.get_multi(['k1', 'k2', 'k3']).items())
+    [('k1', 1), ('k2', 2)]
+    """
+
+    def __init__(self, shards=16, reaper=False, reap_interval=1, **kwargs):
+        for name in ("max_items", "max_bytes"):
+            if kwargs.get(name):
+                kwargs[name] = -(-kwargs[name] // shards)
+        self.shards = [MemoryCache(**kwargs) for i in range(shards)]
+        self.reaper = None
+        if reaper:
+            self.reaper = Reaper(self.shards, reap_interval)
+            for shard in self.shards:
+                shard.reaper = self.reaper
+
+    def shard(self, key):
+        """Returns a shard for ``key``."""
+        shards = self.shards
+        return shards[hash(key) % len(shards)]
+
+    def group(self, keys):
+        """Splits ``keys`` into a list of (shard, keys) pairs.
+
+        >>> c = ShardedMemoryCache(shards=2)
+        >>> sorted(sum([keys for shard, keys in c.group(range(4))], []))
+        [0, 1, 2, 3]
+        """
+        shards = self.shards
+        n = len(shards)
+        groups = {}
+        for key in keys:
+            i = hash(key) % n
+            try:
+                groups[i].append(key)
+            except KeyError:
+                groups[i] = [key]
+        return [(shards[i], keys) for i, keys in groups.items()]
+
+    def group_mapping(self, mapping):
+        """Splits ``mapping`` into a list of (shard, mapping) pairs."""
+        shards = self.shards
+        n = len(shards)
+        groups = {}
+        for key, value in mapping.items():
+            i = hash(key) % n
+            try:
+                groups[i][key] = value
+            except KeyError:
+                groups[i] = {key: value}
+        return [(shards[i], mapping) for i, mapping in groups.items()]
+
+    @property
+    def size(self):
+        """Estimated size of items held by all shards."""
+        return sum(shard.size for shard in self.shards)
+
+    @property
+    def evictions(self):
+        """A number of items evicted by all shards."""
+        return sum(shard.evictions for shard in self.shards)
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+        """
+        return self.shard(key).set(key, value, time, namespace)
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once."""
+        keys_failed = []
+        for shard, mapping in self.group_mapping(mapping):
+            keys_failed.extend(shard.set_multi(mapping, time, namespace))
+        return keys_failed
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+        """
+        return self.shard(key).add(key, value, time, namespace)
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+        """
+        keys_failed = []
+        for shard, mapping in self.group_mapping(mapping):
+            keys_failed.extend(shard.add_multi(mapping, time, namespace))
+        return keys_failed
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already."""
+        return self.shard(key).replace(key, value, time, namespace)
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+        """
+        keys_failed = []
+        for shard, mapping in self.group_mapping(mapping):
+            keys_failed.extend(shard.replace_multi(mapping, time, namespace))
+        return keys_failed
+
+    def get(self, key, namespace=None):
+        """Looks up a single key."""
+        return self.shard(key).get(key, namespace)
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+        """
+        results = {}
+        for shard, keys in self.group(keys):
+            results.update(shard.get_multi(keys, namespace))
+        return results
+
+    def gets(self, key, namespace=None):
+        """Looks up a single key, returns a tuple of value and cas
+        token.
+        """
+        return self.shard(key).gets(key, namespace)
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys, returns a dict of found keys to a
+        tuple of value and cas token.
+        """
+        results = {}
+        for shard, keys in self.group(keys):
+            results.update(shard.gets_multi(keys, namespace))
+        return results
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``.
+        """
+        return self.shard(key).cas(key, value, token, time, namespace)
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        return self.shard(key).touch(key, time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        failed = []
+        for shard, keys in self.group(keys):
+            failed.extend(shard.touch_multi(keys, time, namespace))
+        return failed
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+        """
+        return self.shard(key).get_and_touch(key, time, namespace)
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache."""
+        return self.shard(key).delete(key, seconds, namespace)
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once."""
+        for shard, keys in self.group(keys):
+            shard.delete_multi(keys, seconds, namespace)
+        return True
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value."""
+        return self.shard(key).incr(key, delta, namespace, initial_value)
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value."""
+        return self.shard(key).decr(key, delta, namespace, initial_value)
+
+    def flush_all(self):
+        """Deletes everything in cache."""
+        for shard in self.shards:
+            shard.flush_all()
+        return True
+
+    def stats(self):
+        """Returns counters of all shards summed (see
+        ``MemoryCache.stats``).
+
+        >>> c = ShardedMemoryCache(shards=4, stats=True)
+        >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+        []
+        >>> s = c.stats()
+        >>> s['cmd_set'], s['curr_items']
+        (2, 2)
+        """
+        totals = {}
+        for shard in self.shards:
+            for name, value in shard.stats().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def close(self):
+        """Stops background reaper if any."""
+        if self.reaper is not None:
+            self.reaper.stop()
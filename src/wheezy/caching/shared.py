@@ -0,0 +1,638 @@
+"""``shared`` module provides a cache that lives in a
+``multiprocessing.shared_memory`` segment, so pre-forked worker
+processes of one host share a single copy of cached items.
+"""
+
+from multiprocessing import Lock
+from multiprocessing.shared_memory import SharedMemory
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from struct import Struct
+from time import time as unixtime
+from zlib import crc32
+
+from wheezy.caching.memory import expires
+
+# hash, expires, offset (0 - empty), key length, value length
+SLOT = Struct("<IqqII")
+WORD = Struct("<q")
+MIN_CHUNK = 64
+# stripe header fields, followed by free chunk list per chunk class
+COUNT = 0
+HAND = 1
+EVICTIONS = 2
+RECLAIMED = 3
+FREE = 4
+
+
+def encode_key(key):
+    if isinstance(key, str):
+        return key.encode("UTF-8")
+    return key
+
+
+class SharedMemoryCache(object):
+    """A cache in a shared memory segment of ``size`` bytes.
+
+    Keys are placed in a fixed size open addressing hash table (linear
+    probing) of ``capacity`` slots. The table is split into ``stripes``
+    regions, each guarded by own process shared lock, a key never
+    leaves the region chosen by its hash. Pickled values are kept in
+    slab chunks (powers of two from 64 bytes up to ``page_size``) carved
+    out of pages that stripes take from a common pool. A key with its
+    value must fit into ``page_size``. Once taken, a page stays with the
+    stripe and chunk size, so keep ``size`` well above ``stripes *
+    page_size``.
+
+    When a stripe runs out of slots or chunks, it removes expired
+    items first and then evicts items of the required chunk size in
+    round robin order.
+
+    The cache must be created before workers are forked, so they
+    inherit both the segment and the locks. The process that created it
+    calls ``unlink`` at exit.
+
+    >>> c = SharedMemoryCache(size=1 << 20, stripes=2)
+    >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+    []
+    >>> sorted(c.get_multi(['k1', 'k2', 'k3']).items())
+    [('k1', 1), ('k2', 2)]
+    >>> c.close()
+    >>> c.unlink()
+    """
+
+    def __init__(
+        self,
+        size=64 << 20,
+        capacity=None,
+        stripes=16,
+        page_size=64 << 10,
+        clock=None,
+    ):
+        capacity = capacity or size // 512
+        self.stripes = stripes
+        self.region = region = -(-capacity // stripes)
+        self.max_count = region * 7 // 8
+        self.page_size = page_size
+        self.clock = clock
+        chunks = []
+        chunk = MIN_CHUNK
+        while chunk < page_size:
+            chunks.append(chunk)
+            chunk <<= 1
+        chunks.append(page_size)
+        self.chunks = chunks
+        # the first word is a number of pages used from the pool
+        self.header_size = (FREE + len(chunks)) * WORD.size
+        self.table_offset = WORD.size + stripes * self.header_size
+        data_offset = self.table_offset + stripes * region * SLOT.size
+        self.data_offset = -(-data_offset // 64) * 64
+        self.pages = (size - self.data_offset) // page_size
+        if self.pages < 1:
+            raise ValueError("size is too small")
+        self.shm = SharedMemory(create=True, size=size)
+        self.buf = self.shm.buf
+        self.locks = [Lock() for i in range(stripes)]
+        self.pool_lock = Lock()
+        self.buf[: self.data_offset] = bytes(self.data_offset)
+
+    @property
+    def name(self):
+        """The name of shared memory segment."""
+        return self.shm.name
+
+    @property
+    def evictions(self):
+        """A number of items evicted by all stripes."""
+        return sum(self.header(s, EVICTIONS) for s in range(self.stripes))
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+        """
+        return self.store(key, value, time, 0)
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once."""
+        return self.store_multi(mapping, time, 0)
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+        """
+        return self.store(key, value, time, 1)
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+        """
+        return self.store_multi(mapping, time, 1)
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already."""
+        return self.store(key, value, time, 2)
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+        """
+        return self.store_multi(mapping, time, 2)
+
+    def get(self, key, namespace=None):
+        """Looks up a single key.
+
+        >>> c = SharedMemoryCache(size=1 << 20)
+        >>> c.get('k')
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.get('k')
+        'v'
+        >>> c.close()
+        >>> c.unlink()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        kb = encode_key(key)
+        h = crc32(kb)
+        s = h % self.stripes
+        lock = self.locks[s]
+        lock.acquire()
+        try:
+            data = self.read(s, h, kb, now)
+        finally:
+            lock.release()
+        if data is None:
+            return None
+        return loads(data)
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        found = {}
+        for s, group in self.group(keys):
+            lock = self.locks[s]
+            lock.acquire()
+            try:
+                for key, kb, h in group:
+                    data = self.read(s, h, kb, now)
+                    if data is not None:
+                        found[key] = data
+            finally:
+                lock.release()
+        return dict((key, loads(data)) for key, data in found.items())
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+
+        >>> c = SharedMemoryCache(size=1 << 20)
+        >>> c.touch('k', 100)
+        False
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.touch('k', 200)
+        True
+        >>> c.close()
+        >>> c.unlink()
+        """
+        return not self.touch_multi((key,), time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        e = expires(now, time)
+        failed = []
+        for s, group in self.group(keys):
+            lock = self.locks[s]
+            lock.acquire()
+            try:
+                for key, kb, h in group:
+                    if self.renew(s, h, kb, e, now) is None:
+                        failed.append(key)
+            finally:
+                lock.release()
+        return failed
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+
+        >>> c = SharedMemoryCache(size=1 << 20)
+        >>> c.get_and_touch('k', 100)
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.get_and_touch('k', 200)
+        'v'
+        >>> c.close()
+        >>> c.unlink()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        e = expires(now, time)
+        kb = encode_key(key)
+        h = crc32(kb)
+        s = h % self.stripes
+        lock = self.locks[s]
+        lock.acquire()
+        try:
+            i = self.renew(s, h, kb, e, now)
+            if i is None:
+                return None
+            offset, klen, vlen = SLOT.unpack_from(self.buf, i)[2:]
+            start = offset + klen
+            end = start + vlen
+            data = bytes(self.buf[start:end])
+        finally:
+            lock.release()
+        return loads(data)
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache.
+
+        >>> c = SharedMemoryCache(size=1 << 20)
+        >>> c.delete('k')
+        False
+        >>> c.set('k', 'v', 100)
+        True
+        >>> c.delete('k')
+        True
+        >>> c.close()
+        >>> c.unlink()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        kb = encode_key(key)
+        h = crc32(kb)
+        s = h % self.stripes
+        lock = self.locks[s]
+        lock.acquire()
+        try:
+            i = self.find(s, h, kb)
+            if i is None:
+                return False
+            expired = SLOT.unpack_from(self.buf, i)[1] < now
+            self.remove(s, i)
+            return not expired
+        finally:
+            lock.release()
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once."""
+        for s, group in self.group(keys):
+            lock = self.locks[s]
+            lock.acquire()
+            try:
+                for key, kb, h in group:
+                    i = self.find(s, h, kb)
+                    if i is not None:
+                        self.remove(s, i)
+            finally:
+                lock.release()
+        return True
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value.
+
+        >>> c = SharedMemoryCache(size=1 << 20)
+        >>> c.incr('k')
+        >>> c.incr('k', initial_value=0)
+        1
+        >>> c.incr('k')
+        2
+        >>> c.close()
+        >>> c.unlink()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        kb = encode_key(key)
+        h = crc32(kb)
+        s = h % self.stripes
+        lock = self.locks[s]
+        lock.acquire()
+        try:
+            i = self.find(s, h, kb)
+            if i is not None:
+                e, offset, klen, vlen = SLOT.unpack_from(self.buf, i)[1:]
+                start = offset + klen
+                end = start + vlen
+                value = loads(self.buf[start:end])
+                self.remove(s, i)
+                if e >= now:
+                    value += delta
+                    if not self.put(s, h, kb, dumps(value), e, now):
+                        return None
+                    return value
+            if initial_value is None:
+                return None
+            value = initial_value + delta
+            if not self.put(s, h, kb, dumps(value), expires(now, 0), now):
+                return None
+            return value
+        finally:
+            lock.release()
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value."""
+        return self.incr(key, -delta, namespace, initial_value)
+
+    def flush_all(self):
+        """Deletes everything in cache."""
+        locks = self.locks + [self.pool_lock]
+        for lock in locks:
+            lock.acquire()
+        try:
+            self.buf[: self.data_offset] = bytes(self.data_offset)
+        finally:
+            for lock in locks:
+                lock.release()
+        return True
+
+    def close(self):
+        """Closes access to the shared memory segment from this
+        process.
+        """
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        """Destroys the shared memory segment. Called once by the
+        process that created the cache.
+        """
+        self.shm.unlink()
+
+    # region: internal details
+
+    def store(self, key, value, time, op):
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        e = expires(now, time)
+        kb = encode_key(key)
+        vb = dumps(value, HIGHEST_PROTOCOL)
+        h = crc32(kb)
+        s = h % self.stripes
+        lock = self.locks[s]
+        lock.acquire()
+        try:
+            return self.replace_or_put(s, h, kb, vb, e, now, op)
+        finally:
+            lock.release()
+
+    def store_multi(self, mapping, time, op):
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        e = expires(now, time)
+        keys_failed = []
+        for s, group in self.group(mapping):
+            lock = self.locks[s]
+            lock.acquire()
+            try:
+                for key, kb, h in group:
+                    vb = dumps(mapping[key], HIGHEST_PROTOCOL)
+                    if not self.replace_or_put(s, h, kb, vb, e, now, op):
+                        keys_failed.append(key)
+            finally:
+                lock.release()
+        return keys_failed
+
+    def group(self, keys):
+        """Splits ``keys`` into a list of (stripe, [(key, encoded key,
+        hash)]) pairs.
+        """
+        stripes = self.stripes
+        groups = {}
+        for key in keys:
+            kb = encode_key(key)
+            h = crc32(kb)
+            s = h % stripes
+            try:
+                groups[s].append((key, kb, h))
+            except KeyError:
+                groups[s] = [(key, kb, h)]
+        return groups.items()
+
+    def replace_or_put(self, s, h, kb, vb, e, now, op):
+        i = self.find(s, h, kb)
+        if i is not None:
+            if op == 1 and SLOT.unpack_from(self.buf, i)[1] >= now:
+                return False
+            self.remove(s, i)
+        elif op == 2:
+            return False
+        return self.put(s, h, kb, vb, e, now)
+
+    def read(self, s, h, kb, now):
+        """Returns a copy of pickled value or None."""
+        i = self.find(s, h, kb)
+        if i is None:
+            return None
+        buf = self.buf
+        e, offset, klen, vlen = SLOT.unpack_from(buf, i)[1:]
+        if e < now:
+            self.remove(s, i)
+            return None
+        start = offset + klen
+        end = start + vlen
+        return bytes(buf[start:end])
+
+    def renew(self, s, h, kb, e, now):
+        """Sets expires ``e`` of a key that is not expired. Returns an
+        offset of its table slot or None.
+        """
+        i = self.find(s, h, kb)
+        if i is None:
+            return None
+        buf = self.buf
+        slot = SLOT.unpack_from(buf, i)
+        if slot[1] < now:
+            self.remove(s, i)
+            return None
+        SLOT.pack_into(buf, i, slot[0], e, *slot[2:])
+        return i
+
+    def find(self, s, h, kb):
+        """Returns an offset of table slot that holds ``kb`` key or
+        None.
+        """
+        buf = self.buf
+        region = self.region
+        first = self.table_offset + s * region * SLOT.size
+        end = first + region * SLOT.size
+        i = first + (h // self.stripes) % region * SLOT.size
+        klen = len(kb)
+        for n in range(region):
+            sh, e, offset, sklen, vlen = SLOT.unpack_from(buf, i)
+            if not offset:
+                return None
+            if sh == h and sklen == klen:
+                stop = offset + klen
+                if buf[offset:stop] == kb:
+                    return i
+            i += SLOT.size
+            if i == end:
+                i = first
+        return None
+
+    def put(self, s, h, kb, vb, e, now):
+        """Inserts a key that is not in the table. Returns False if
+        there is no room for it.
+        """
+        size = len(kb) + len(vb)
+        offset = self.allocate(s, size, now)
+        if not offset:
+            return False
+        buf = self.buf
+        region = self.region
+        first = self.table_offset + s * region * SLOT.size
+        end = first + region * SLOT.size
+        i = first + (h // self.stripes) % region * SLOT.size
+        while SLOT.unpack_from(buf, i)[2]:
+            i += SLOT.size
+            if i == end:
+                i = first
+        klen = len(kb)
+        start = offset + klen
+        end = offset + size
+        buf[offset:start] = kb
+        buf[start:end] = vb
+        SLOT.pack_into(buf, i, h, e, offset, klen, len(vb))
+        self.set_header(s, COUNT, self.header(s, COUNT) + 1)
+        return True
+
+    def remove(self, s, i):
+        """Frees the chunk of slot at ``i`` and closes the gap in
+        probe sequence by moving following slots back (no tombstones).
+        """
+        buf = self.buf
+        region = self.region
+        stripes = self.stripes
+        first = self.table_offset + s * region * SLOT.size
+        end = first + region * SLOT.size
+        h, e, offset, klen, vlen = SLOT.unpack_from(buf, i)
+        self.free(s, offset, klen + vlen)
+        j = i
+        while True:
+            j += SLOT.size
+            if j == end:
+                j = first
+            slot = SLOT.unpack_from(buf, j)
+            if not slot[2]:
+                break
+            k = first + (slot[0] // stripes) % region * SLOT.size
+            if i <= j:
+                if i < k <= j:
+                    continue
+            elif i < k or k <= j:
+                continue
+            SLOT.pack_into(buf, i, *slot)
+            i = j
+        SLOT.pack_into(buf, i, 0, 0, 0, 0, 0)
+        self.set_header(s, COUNT, self.header(s, COUNT) - 1)
+
+    def chunk_class(self, size):
+        for c, chunk in enumerate(self.chunks):
+            if size <= chunk:
+                return c
+        return None
+
+    def allocate(self, s, size, now):
+        """Returns an offset of a free chunk that fits ``size`` or 0."""
+        c = self.chunk_class(size)
+        if c is None:
+            return 0
+        while self.header(s, COUNT) >= self.max_count:
+            if not self.reclaim(s, now) and not self.evict(s, None):
+                return 0
+        while True:
+            offset = self.header(s, FREE + c)
+            if offset:
+                self.set_header(
+                    s, FREE + c, WORD.unpack_from(self.buf, offset)[0]
+                )
+                return offset
+            if self.grow(s, c):
+                continue
+            if not self.reclaim(s, now) and not self.evict(s, c):
+                return 0
+
+    def free(self, s, offset, size):
+        c = self.chunk_class(size)
+        WORD.pack_into(self.buf, offset, self.header(s, FREE + c))
+        self.set_header(s, FREE + c, offset)
+
+    def grow(self, s, c):
+        """Takes a page from the pool and splits it into chunks of
+        class ``c``.
+        """
+        buf = self.buf
+        lock = self.pool_lock
+        lock.acquire()
+        try:
+            pages = WORD.unpack_from(buf, 0)[0]
+            if pages >= self.pages:
+                return False
+            WORD.pack_into(buf, 0, pages + 1)
+        finally:
+            lock.release()
+        page = self.data_offset + pages * self.page_size
+        chunk = self.chunks[c]
+        head = self.header(s, FREE + c)
+        for offset in range(page, page + self.page_size - chunk + 1, chunk):
+            WORD.pack_into(buf, offset, head)
+            head = offset
+        self.set_header(s, FREE + c, head)
+        return True
+
+    def reclaim(self, s, now):
+        """Removes expired items of stripe, at most once per second.
+        Returns a number of items removed.
+        """
+        if self.header(s, RECLAIMED) >= now:
+            return 0
+        self.set_header(s, RECLAIMED, now)
+        buf = self.buf
+        region = self.region
+        i = self.table_offset + s * region * SLOT.size
+        end = i + region * SLOT.size
+        removed = 0
+        while i < end:
+            slot = SLOT.unpack_from(buf, i)
+            if slot[2] and slot[1] < now:
+                self.remove(s, i)
+                removed += 1
+            else:
+                i += SLOT.size
+        return removed
+
+    def evict(self, s, c):
+        """Evicts the next item (of chunk class ``c`` if set) in round
+        robin order. Returns False if there is none.
+        """
+        buf = self.buf
+        region = self.region
+        first = self.table_offset + s * region * SLOT.size
+        hand = self.header(s, HAND)
+        for n in range(region):
+            i = first + (hand + n) % region * SLOT.size
+            slot = SLOT.unpack_from(buf, i)
+            if not slot[2]:
+                continue
+            if c is not None and self.chunk_class(slot[3] + slot[4]) != c:
+                continue
+            self.remove(s, i)
+            self.set_header(s, HAND, (hand + n + 1) % region)
+            self.set_header(s, EVICTIONS, self.header(s, EVICTIONS) + 1)
+            return True
+        return False
+
+    def header(self, s, field):
+        offset = WORD.size + s * self.header_size + field * WORD.size
+        return WORD.unpack_from(self.buf, offset)[0]
+
+    def set_header(self, s, field, value):
+        offset = WORD.size + s * self.header_size + field * WORD.size
+        WORD.pack_into(self.buf, offset, value)
@@ -0,0 +1,345 @@
+"""``sqlite`` module provides a local cache stored in SQLite database,
+so cached items survive restarts and are shared by processes on a host.
+"""
+
+import sqlite3
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from threading import local
+from time import time as unixtime
+
+from wheezy.caching.memory import expires
+
+# max number of parameters in a statement is 999 in old SQLite versions
+BATCH = 300
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache ("
+    "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires INTEGER NOT NULL"
+    ") WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)",
+)
+
+
+def batches(items):
+    """Splits ``items`` sequence into lists of at most ``BATCH`` items.
+
+    >>> [len(b) for b in batches(range(700))]
+    [300, 300, 100]
+    """
+    items = list(items)
+    result = []
+    for start in range(0, len(items), BATCH):
+        stop = start + BATCH
+        result.append(items[start:stop])
+    return result
+
+
+class SQLiteCache(object):
+    """A cache in SQLite database at ``path`` (WAL journal mode).
+
+    Items are kept in a table with an indexed ``expires`` column. Reads
+    ignore expired rows, those are deleted by store operations at most
+    ``prune_limit`` rows every ``prune_interval`` seconds, so the cost of
+    pruning is spread over time. Multiple keys operations are executed
+    as a single statement per batch of keys. Values are pickled.
+
+    Each thread uses its own connection.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+    >>> c = SQLiteCache(path)
+    >>> c.set_multi({'k1': 1, 'k2': 2}, 100)
+    []
+    >>> sorted(c.get_multi(['k1', 'k2', 'k3']).items())
+    [('k1', 1), ('k2', 2)]
+    >>> c.close()
+    """
+
+    def __init__(
+        self,
+        path,
+        timeout=5.0,
+        prune_interval=60,
+        prune_limit=1000,
+        clock=None,
+    ):
+        self.path = path
+        self.timeout = timeout
+        self.prune_interval = prune_interval
+        self.prune_limit = prune_limit
+        self.clock = clock
+        self.next_prune = 0
+        self.local = local()
+        self.connections = []
+        db = self.connection()
+        for sql in SCHEMA:
+            db.execute(sql)
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+        """
+        return self.set_multi({key: value}, time, namespace) == []
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once."""
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        db = self.connection()
+        with db:
+            for batch in batches(mapping.items()):
+                params = []
+                for key, value in batch:
+                    params.extend((key, dumps(value, HIGHEST_PROTOCOL), time))
+                db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires) "
+                    "VALUES " + ", ".join(["(?, ?, ?)"] * len(batch)),
+                    params,
+                )
+            self.prune(db, now)
+        return []
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+        """
+        return self.add_multi({key: value}, time, namespace) == []
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        keys_failed = []
+        db = self.connection()
+        with db:
+            for key, value in mapping.items():
+                cursor = db.execute(
+                    "INSERT INTO cache (key, value, expires) "
+                    "VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                    "value = excluded.value, expires = excluded.expires "
+                    "WHERE cache.expires < ?",
+                    (key, dumps(value, HIGHEST_PROTOCOL), time, now),
+                )
+                if cursor.rowcount != 1:
+                    keys_failed.append(key)
+            self.prune(db, now)
+        return keys_failed
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already."""
+        return self.replace_multi({key: value}, time, namespace) == []
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        keys_failed = []
+        db = self.connection()
+        with db:
+            for key, value in mapping.items():
+                cursor = db.execute(
+                    "UPDATE cache SET value = ?, expires = ? "
+                    "WHERE key = ? AND expires >= ?",
+                    (dumps(value, HIGHEST_PROTOCOL), time, key, now),
+                )
+                if cursor.rowcount != 1:
+                    keys_failed.append(key)
+        return keys_failed
+
+    def get(self, key, namespace=None):
+        """Looks up a single key."""
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        row = (
+            self.connection()
+            .execute(
+                "SELECT value FROM cache WHERE key = ? AND expires >= ?",
+                (key, now),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return loads(row[0])
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        db = self.connection()
+        results = {}
+        for batch in batches(keys):
+            rows = db.execute(
+                "SELECT key, value FROM cache WHERE key IN ("
+                + ", ".join(["?"] * len(batch))
+                + ") AND expires >= ?",
+                batch + [now],
+            )
+            for key, value in rows:
+                results[key] = loads(value)
+        return results
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key, the value is kept.
+        Returns False if ``key`` is not found.
+        """
+        return not self.touch_multi((key,), time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys at once.
+        Returns a list of keys not found.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        time = expires(now, time)
+        db = self.connection()
+        failed = []
+        with db:
+            for key in keys:
+                cursor = db.execute(
+                    "UPDATE cache SET expires = ? WHERE key = ? "
+                    "AND expires >= ?",
+                    (time, key, now),
+                )
+                if cursor.rowcount != 1:
+                    failed.append(key)
+        return failed
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key and sets its new expiration
+        ``time``.
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        db = self.connection()
+        with db:
+            cursor = db.execute(
+                "UPDATE cache SET expires = ? WHERE key = ? AND expires >= ?",
+                (expires(now, time), key, now),
+            )
+            if cursor.rowcount != 1:
+                return None
+            row = db.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return loads(row[0])
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache."""
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        db = self.connection()
+        with db:
+            cursor = db.execute(
+                "DELETE FROM cache WHERE key = ? AND expires >= ?", (key, now)
+            )
+        return cursor.rowcount == 1
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once."""
+        db = self.connection()
+        with db:
+            for batch in batches(keys):
+                db.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    + ", ".join(["?"] * len(batch))
+                    + ")",
+                    batch,
+                )
+        return True
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        >>> c = SQLiteCache(path)
+        >>> c.incr('k')
+        >>> c.incr('k', initial_value=0)
+        1
+        >>> c.incr('k')
+        2
+        >>> c.close()
+        """
+        clock = self.clock
+        now = int(unixtime()) if clock is None else clock.now
+        db = self.connection()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] >= now:
+                value = loads(row[0]) + delta
+                time = row[1]
+            elif initial_value is None:
+                return None
+            else:
+                value = initial_value + delta
+                time = expires(now, 0)
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) "
+                "VALUES (?, ?, ?)",
+                (key, dumps(value, HIGHEST_PROTOCOL), time),
+            )
+        return value
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value."""
+        return self.incr(key, -delta, namespace, initial_value)
+
+    def flush_all(self):
+        """Deletes everything in cache."""
+        db = self.connection()
+        with db:
+            db.execute("DELETE FROM cache")
+        return True
+
+    def close(self):
+        """Closes connections of all threads."""
+        connections = self.connections
+        self.connections = []
+        self.local = local()
+        for db in connections:
+            db.close()
+
+    # region: internal details
+
+    def connection(self):
+        """Returns a connection of the current thread."""
+        try:
+            return self.local.db
+        except AttributeError:
+            db = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level="IMMEDIATE",
+                check_same_thread=False,
+            )
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            self.local.db = db
+            self.connections.append(db)
+            return db
+
+    def prune(self, db, now):
+        """Deletes at most ``prune_limit`` expired rows, once per
+        ``prune_interval`` seconds. Returns a number of rows deleted.
+        """
+        if now < self.next_prune:
+            return 0
+        self.next_prune = now + self.prune_interval
+        return db.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM cache WHERE expires < ? LIMIT ?)",
+            (now, self.prune_limit),
+        ).rowcount
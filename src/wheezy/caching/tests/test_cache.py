@@ -114,3 +114,79 @@ class CacheTestMixin(object):
         mapping = {"s1": 1, "s2": 2}
         assert [] == self.client.set_multi(mapping, namespace=self.namespace)
         assert self.client.flush_all()
+
+
+class CasTestMixin(object):
+    def test_gets_notfound(self):
+        assert (None, None) == self.client.gets("unknown", self.namespace)
+        assert {} == self.client.gets_multi(["unknown"], self.namespace)
+
+    def test_cas(self):
+        assert self.client.set("c", 1, 10, self.namespace)
+        value, token = self.client.gets("c", self.namespace)
+        assert 1 == value
+        assert self.client.cas("c", 2, token, 10, self.namespace)
+        assert 2 == self.client.get("c", self.namespace)
+
+    def test_cas_changed(self):
+        assert self.client.set("c", 1, 10, self.namespace)
+        value, token = self.client.gets("c", self.namespace)
+        assert self.client.set("c", 2, 10, self.namespace)
+        assert not self.client.cas("c", 3, token, 10, self.namespace)
+        assert 2 == self.client.get("c", self.namespace)
+
+    def test_cas_twice(self):
+        assert self.client.set("c", 1, 10, self.namespace)
+        value, token = self.client.gets("c", self.namespace)
+        assert self.client.cas("c", 2, token, 10, self.namespace)
+        assert not self.client.cas("c", 3, token, 10, self.namespace)
+        assert 2 == self.client.get("c", self.namespace)
+
+    def test_cas_deleted(self):
+        assert self.client.set("c", 1, 10, self.namespace)
+        value, token = self.client.gets("c", self.namespace)
+        self.client.delete("c", 0, self.namespace)
+        assert not self.client.cas("c", 2, token, 10, self.namespace)
+        assert self.client.get("c", self.namespace) is None
+
+    def test_cas_add(self):
+        assert self.client.cas("c", 1, None, 10, self.namespace)
+        assert not self.client.cas("c", 2, None, 10, self.namespace)
+        assert 1 == self.client.get("c", self.namespace)
+
+    def test_gets_multi(self):
+        mapping = {"c1": "v1", "c2": "v2"}
+        assert [] == self.client.set_multi(mapping, 10, self.namespace)
+        results = self.client.gets_multi(["c1", "c2", "c3"], self.namespace)
+        assert ["c1", "c2"] == sorted(results)
+        value, token = results["c1"]
+        assert "v1" == value
+        assert self.client.cas("c1", "x", token, 10, self.namespace)
+        value, token = results["c2"]
+        assert "v2" == value
+        assert self.client.cas("c2", "y", token, 10, self.namespace)
+        assert {"c1": "x", "c2": "y"} == self.client.get_multi(
+            ["c1", "c2"], self.namespace
+        )
+
+
+class TouchTestMixin(object):
+    def test_touch(self):
+        assert not self.client.touch("t", 100, self.namespace)
+        assert self.client.set("t", 1, 10, self.namespace)
+        assert self.client.touch("t", 100, self.namespace)
+        assert 1 == self.client.get("t", self.namespace)
+
+    def test_touch_multi(self):
+        mapping = {"t1": 1, "t2": 2}
+        assert [] == self.client.set_multi(mapping, 10, self.namespace)
+        assert ["t3"] == self.client.touch_multi(
+            ["t1", "t2", "t3"], 100, self.namespace
+        )
+        assert mapping == self.client.get_multi(["t1", "t2"], self.namespace)
+
+    def test_get_and_touch(self):
+        assert self.client.get_and_touch("t", 100, self.namespace) is None
+        assert self.client.set("t", "v", 10, self.namespace)
+        assert "v" == self.client.get_and_touch("t", 100, self.namespace)
+        assert "v" == self.client.get("t", self.namespace)
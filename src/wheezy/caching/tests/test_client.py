@@ -2,7 +2,11 @@ from unittest import TestCase
 
 from wheezy.caching.client import CacheClient
 from wheezy.caching.memory import MemoryCache
-from wheezy.caching.tests.test_cache import CacheTestMixin
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
 
 cache1 = MemoryCache()
 cache2 = MemoryCache()
@@ -11,7 +15,9 @@ client = CacheClient(
 )
 
 
-class CacheClientDefaultTestCase(TestCase, CacheTestMixin):
+class CacheClientDefaultTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
     def setUp(self):
         self.client = client
         self.namespace = None
@@ -29,10 +35,49 @@ class CacheClientDefaultByNameTestCase(TestCase, CacheTestMixin):
         self.client.flush_all()
 
 
-class CacheClientByNamespaceTestCase(TestCase, CacheTestMixin):
+class CacheClientByNamespaceTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
     def setUp(self):
         self.client = client
         self.namespace = "cache2"
 
     def tearDown(self):
         self.client.flush_all()
+
+
+class CacheClientJitterTestCase(TestCase):
+    def setUp(self):
+        self.cache = MemoryCache()
+        self.client = CacheClient(
+            {"plain": MemoryCache(), "spread": self.cache},
+            "plain",
+            jitter={"spread": 0.5},
+        )
+
+    def test_set_multi(self):
+        mapping = dict(("k%d" % i, i) for i in range(100))
+        assert [] == self.client.set_multi(mapping, 100, "spread")
+        assert mapping == self.client.get_multi(list(mapping), "spread")
+        times = set(item.expires for item in self.cache.items.values())
+        assert len(times) > 1
+
+    def test_add_multi_failed(self):
+        assert self.client.add("k1", 1, 100, "spread")
+        assert ["k1"] == self.client.add_multi(
+            {"k1": 1, "k2": 2}, 100, "spread"
+        )
+
+    def test_never_expires(self):
+        assert [] == self.client.set_multi({"k1": 1, "k2": 2}, 0, "spread")
+        times = set(item.expires for item in self.cache.items.values())
+        assert {0x7FFFFFFF} == times
+
+    def test_invalid_jitter(self):
+        self.assertRaises(
+            AssertionError,
+            CacheClient,
+            {"a": self.cache},
+            "a",
+            jitter={"a": 1},
+        )
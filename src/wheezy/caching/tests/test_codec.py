@@ -0,0 +1,103 @@
+import pickle
+from unittest import TestCase
+
+from wheezy.caching.codec import (
+    BytesCodec,
+    Codec,
+    Codecs,
+    MarshalCodec,
+    PickleCodec,
+)
+
+
+class PickleCodecTestCase(TestCase):
+    def setUp(self):
+        self.codec = PickleCodec(threshold=1024)
+
+    def roundtrip(self, value):
+        data = self.codec.encode(value)
+        assert 3 == data[0]
+        return self.codec.decode(memoryview(data))
+
+    def test_values(self):
+        for value in (None, 1, "x", [1, 2.5], {"a": (1, "b")}, set([1])):
+            assert value == self.roundtrip(value)
+
+    def test_out_of_band(self):
+        blob = bytes(range(256)) * 64
+        value = {"blob": blob, "ba": bytearray(blob), "n": 1}
+        data = self.codec.encode(value)
+        pickled = pickle.dumps(value, 5)
+        assert len(data) < len(pickled) + 64
+        result = self.codec.decode(memoryview(data))
+        assert value == result
+        assert bytes is result["blob"].__class__
+        assert bytearray is result["ba"].__class__
+
+    def test_memoryview(self):
+        blob = b"x" * 2048
+        result = self.roundtrip([memoryview(blob), memoryview(b"small")])
+        assert memoryview is result[0].__class__
+        assert blob == result[0]
+        assert memoryview is result[1].__class__
+        assert b"small" == result[1]
+
+    def test_non_contiguous_memoryview(self):
+        blob = bytes(range(256)) * 16
+        result = self.roundtrip(memoryview(blob)[::2])
+        assert blob[::2] == result
+
+    def test_pickle_buffer(self):
+        blob = bytearray(b"x" * 2048)
+        result = self.roundtrip(pickle.PickleBuffer(blob))
+        assert blob == result
+
+    def test_nested_in_band(self):
+        value = {"a": {"blob": b"x" * 2048}}
+        assert value == self.roundtrip(value)
+
+
+class CodecTestCase(TestCase):
+    def test_bytes(self):
+        c = BytesCodec()
+        assert b"abc" == c.decode(memoryview(c.encode(bytearray(b"abc"))))
+
+    def test_marshal(self):
+        c = MarshalCodec()
+        value = {"a": [1, 2.5, "x", b"y"], "b": (None, True)}
+        assert value == c.decode(memoryview(c.encode(value)))
+        self.assertRaises(ValueError, c.encode, object())
+
+    def test_user(self):
+        c = Codec(16, lambda v: v.encode("UTF-8"), lambda d: str(d, "UTF-8"))
+        assert b"\x10abc" == c.encode("abc")
+        assert "abc" == c.decode(memoryview(b"\x10abc"))
+
+
+class CodecsTestCase(TestCase):
+    def test_namespaces(self):
+        c = Codecs(namespaces={"m": MarshalCodec(), "b": BytesCodec()})
+        assert 3 == c.encode("x")[0]
+        assert 2 == c.encode("x", "m")[0]
+        assert 1 == c.encode(b"x", "b")[0]
+        for namespace in (None, "m", "b"):
+            assert b"x" == c.decode(c.encode(b"x", namespace))
+
+    def test_encode_multi(self):
+        c = Codecs(MarshalCodec())
+        mapping = c.encode_multi({"a": "x", "n": 1})
+        assert 1 == mapping["n"]
+        assert {"a": "x", "n": 1} == c.decode_multi(mapping)
+
+    def test_decode_other_codec(self):
+        data = Codecs(codecs=[MarshalCodec()]).encode("x")
+        assert "x" == Codecs(MarshalCodec(), codecs=[PickleCodec()]).decode(
+            data
+        )
+
+    def test_unknown_codec(self):
+        c = Codecs(MarshalCodec())
+        assert {} == c.decode_multi({"k": Codecs().encode("x")})
+
+    def test_code_in_use(self):
+        self.assertRaises(ValueError, Codecs, codecs=[Codec(3, bytes, bytes)])
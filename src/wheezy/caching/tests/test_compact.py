@@ -0,0 +1,55 @@
+import tracemalloc
+from unittest import TestCase
+
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.compact import CompactMemoryCache
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.tests.test_cache import CacheTestMixin, TouchTestMixin
+
+
+def allocated(factory, n):
+    mapping = dict(("key%d" % i, 1) for i in range(n))
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        cache = factory()
+        cache.set_multi(mapping, 600)
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+class CompactMemoryCacheTestCase(TestCase, CacheTestMixin, TouchTestMixin):
+    def setUp(self):
+        self.client = CompactMemoryCache()
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+    def test_expired(self):
+        clock = FakeClock(1000000)
+        c = CompactMemoryCache(buckets=1, bucket_interval=10, clock=clock)
+        assert [] == c.set_multi({"k1": 1, "k2": 2}, 5)
+        clock.advance(10)
+        assert c.get("k1") is None
+        assert c.add("k2", 20, 5)
+        assert c.incr("k3") is None
+        assert c.set("k4", 4, 100)
+        assert ["k2", "k4"] == sorted(c.slots)
+        clock.advance(10)
+        assert c.set("k5", 5)
+        assert ["k4", "k5"] == sorted(c.slots)
+        assert 3 == len(c.keys)
+
+    def test_slots_reused(self):
+        c = self.client
+        for i in range(100):
+            assert c.set(i % 10, i, 100)
+            assert c.delete((i + 5) % 10) in (True, False)
+        assert len(c.keys) <= 10
+
+    def test_less_memory_than_memory_cache(self):
+        memory = allocated(MemoryCache, 20000)
+        compact = allocated(CompactMemoryCache, 20000)
+        assert compact < memory * 0.7
@@ -0,0 +1,93 @@
+from unittest import TestCase
+
+from wheezy.caching.compress import COMPRESSORS, CompressingCache
+from wheezy.caching.lockout import Counter, Locker
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
+
+
+class CompressingCacheTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
+    def setUp(self):
+        self.client = CompressingCache(MemoryCache(), threshold=10)
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+
+class CompressingCacheCodecTestCase(TestCase):
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, CompressingCache, None, codec="x")
+
+    def test_codecs(self):
+        value = {"html": "<p>fragment</p>" * 1000, "n": 1}
+        for codec in COMPRESSORS:
+            cache = MemoryCache()
+            c = CompressingCache(cache, threshold=100, codec=codec)
+            assert c.set("k", value)
+            stored = cache.get("k")
+            assert COMPRESSORS[codec][0] == stored[0]
+            assert len(stored) < 1000
+            assert value == c.get("k")
+
+    def test_read_any_codec(self):
+        cache = MemoryCache()
+        CompressingCache(cache, threshold=10, codec="lzma").set("k", "x" * 100)
+        c = CompressingCache(cache, threshold=10, codec="zlib")
+        assert {"k": "x" * 100} == c.get_multi(["k"])
+
+    def test_incompressible_kept_pickled(self):
+        cache = MemoryCache()
+        c = CompressingCache(cache, threshold=10)
+        assert c.set("k", bytes(range(256)))
+        assert 0 == cache.get("k")[0]
+        assert bytes(range(256)) == c.get("k")
+
+    def test_counters_not_encoded(self):
+        cache = MemoryCache()
+        c = CompressingCache(cache)
+        assert 1 == c.incr("n", initial_value=0)
+        assert 1 == cache.get("n")
+        assert 0 == c.decr("n")
+        assert 0 == c.get("n")
+
+    def test_incr_after_add(self):
+        cache = MemoryCache()
+        c = CompressingCache(cache)
+        assert c.add("n", 1)
+        assert 1 == cache.get("n")
+        assert 2 == c.incr("n")
+        assert [] == c.set_multi({"n": 5, "s": "x"})
+        assert 4 == c.decr("n")
+        assert {"n": 4, "s": "x"} == c.get_multi(["n", "s"])
+
+    def test_lockout(self):
+        locker = Locker(
+            CompressingCache(MemoryCache()),
+            forbid_action=lambda ctx: "forbidden",
+            by_id=Counter,
+        )
+        lockout = locker.define(
+            "login",
+            by_id={
+                "key_func": lambda ctx: "u1",
+                "count": 2,
+                "period": 60,
+                "duration": 60,
+            },
+        )
+
+        @lockout.forbid_locked
+        @lockout.guard
+        def login(ctx, succeed):
+            return succeed
+
+        assert not login(None, False)
+        assert not login(None, False)
+        assert "forbidden" == login(None, True)
@@ -0,0 +1,72 @@
+from unittest import TestCase
+
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.generation import GenerationCache
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
+
+
+class GenerationCacheTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
+    def setUp(self):
+        self.client = GenerationCache(MemoryCache())
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+
+class GenerationCacheNamespaceTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
+    def setUp(self):
+        self.client = GenerationCache(MemoryCache())
+        self.namespace = "ns"
+
+    def tearDown(self):
+        self.client.flush_all()
+
+
+class InvalidateNamespaceTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000)
+        self.cache = MemoryCache(clock=self.clock)
+        self.c1 = GenerationCache(self.cache, time=5, clock=self.clock)
+        self.c2 = GenerationCache(self.cache, time=5, clock=self.clock)
+
+    def test_other_namespace_kept(self):
+        assert [] == self.c1.set_multi({"k1": 1, "k2": 2}, 100, "a")
+        assert self.c1.set("k1", 3, 100, "b")
+        assert 1 == self.c1.get("k1", "a")
+        assert 3 == self.c1.get("k1", "b")
+        self.c1.invalidate_namespace("b")
+        assert {"k1": 1, "k2": 2} == self.c1.get_multi(["k1", "k2"], "a")
+        assert self.c1.get("k1", "b") is None
+
+    def test_seen_by_other_process(self):
+        assert self.c1.set("k", 1, 100, "a")
+        assert 1 == self.c2.get("k", "a")
+        self.c1.invalidate_namespace("a")
+        assert self.c1.get("k", "a") is None
+        self.clock.advance(4)
+        assert 1 == self.c2.get("k", "a")
+        self.clock.advance(1)
+        assert self.c2.get("k", "a") is None
+
+    def test_generation_evicted(self):
+        assert self.c1.set("k", 1, 100, "a")
+        self.c1.invalidate_namespace("a")
+        self.cache.delete("gen:a")
+        self.clock.advance(5)
+        assert self.c1.get("k", "a") is None
+        assert "a:1005:" == self.c1.prefix("a")
+
+    def test_failed_keys(self):
+        assert self.c1.add("k1", 1, 100)
+        assert ["k1"] == self.c1.add_multi({"k1": 1, "k2": 2}, 100)
+        assert ["k3"] == self.c1.replace_multi({"k1": 1, "k3": 3}, 100)
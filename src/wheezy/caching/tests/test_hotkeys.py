@@ -0,0 +1,134 @@
+import random
+from collections import Counter
+from threading import Thread
+from unittest import TestCase
+
+from wheezy.caching.client import CacheClient
+from wheezy.caching.hotkeys import HotKeys, SpaceSaving
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.patterns import Cached
+
+
+class SpaceSavingTestCase(TestCase):
+    def test_bounds(self):
+        rnd = random.Random(1)
+        keys = rnd.choices(
+            range(1000), [1.0 / (i + 1) for i in range(1000)], k=20000
+        )
+        s = SpaceSaving(50)
+        for key in keys:
+            s.add(key)
+        actual = Counter(keys)
+        assert 50 == len(s.counts)
+        assert len(keys) == s.total
+        assert sum(s.counts.values()) == s.total
+        for key, count, error in s.top(50):
+            assert count - error <= actual[key] <= count
+        for key, count in actual.items():
+            if count > s.total / 50:
+                assert key in s.counts
+        assert [0, 1, 2] == [key for key, c, e in s.top(3)]
+
+    def test_buckets(self):
+        s = SpaceSaving(3)
+        for key in "abcabdde":
+            s.add(key)
+            assert s.min == min(s.counts.values())
+            assert sum(map(len, s.buckets.values())) == len(s.counts)
+            for count, bucket in s.buckets.items():
+                assert bucket
+                for key in bucket:
+                    assert count == s.counts[key]
+
+
+class HotKeysTestCase(TestCase):
+    def test_rate(self):
+        h = HotKeys(rate=0.1)
+        for i in range(10000):
+            h.sample("hot" if i % 2 else "k%d" % i)
+        h.sample_multi(["hot", "x"] * 5000)
+        key, reads, share = h.top(1)[0]
+        assert "hot" == key
+        assert 7000 < reads < 13000
+        assert 0.4 < share < 0.6
+        assert 1500 < h.sketches[None].total < 2500
+
+    def test_unknown_namespace(self):
+        assert [] == HotKeys().top(namespace="x")
+
+    def test_clear(self):
+        h = HotKeys(rate=1)
+        h.sample("k")
+        h.clear()
+        assert [] == h.top()
+
+    def test_threads(self):
+        h = HotKeys(rate=0.5, capacity=10)
+
+        def worker():
+            for i in range(5000):
+                h.sample("k%d" % (i % 20))
+
+        threads = [Thread(target=worker) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        s = h.sketches[None]
+        assert 10 == len(s.counts)
+        assert sum(s.counts.values()) == s.total
+        assert 0 <= h.skip
+
+
+class HotKeysCacheTestCase(TestCase):
+    def test_client(self):
+        h = HotKeys(rate=1)
+        c = CacheClient(
+            {"a": MemoryCache(), "b": MemoryCache()}, "a", hot_keys=h
+        )
+        c.get("k1")
+        c.get("k1", namespace="b")
+        c.get_multi(["k1", "k2"], namespace="b")
+        assert [("k1", 1, 1.0)] == h.top(namespace="a")
+        assert [("k1", 2, 2 / 3.0), ("k2", 1, 1 / 3.0)] == h.top(namespace="b")
+        assert ["a", "b"] == sorted(h.namespaces())
+
+    def test_memory(self):
+        for max_items in (0, 10):
+            h = HotKeys(rate=1)
+            c = MemoryCache(max_items=max_items, hot_keys=h)
+            c.set("k1", 1)
+            c.get("k1")
+            c.get("k2")
+            c.get_multi(["k1"])
+            assert [("k1", 2, 2 / 3.0), ("k2", 1, 1 / 3.0)] == h.top()
+
+    def test_keys_iterator(self):
+        m = MemoryCache(hot_keys=HotKeys(rate=1))
+        c = CacheClient({"a": m}, "a", hot_keys=HotKeys(rate=1))
+        assert m.set("k", 1)
+        assert {"k": 1} == m.get_multi(key for key in ["k"])
+        assert {"k": 1} == c.get_multi(key for key in ["k"])
+        assert {"k": 1} == dict(
+            (key, value)
+            for key, (value, token) in c.gets_multi(
+                key for key in ["k"]
+            ).items()
+        )
+
+    def test_get_or_set_multi(self):
+        def create_factory(keys):
+            return dict((key, key.upper()) for key in keys)
+
+        for c in (
+            MemoryCache(hot_keys=HotKeys(rate=0.5)),
+            CacheClient({"a": MemoryCache()}, "a", hot_keys=HotKeys(rate=0.5)),
+        ):
+            cached = Cached(c, namespace="a")
+            for i in range(100):
+                assert {"K1": "K1", "K2": "K2"} == cached.get_or_set_multi(
+                    lambda key: key.lower(), create_factory, ["K1", "K2"]
+                )
+            key, reads, share = c.hot_keys.top(1, "a")[0]
+            assert key in ("k1", "k2")
+            assert 0 < reads
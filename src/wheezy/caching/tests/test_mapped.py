@@ -0,0 +1,198 @@
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
+
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.mapped import MappedFileCache
+from wheezy.caching.tests.test_cache import CacheTestMixin, TouchTestMixin
+
+
+class MappedFileCacheTestCase(TestCase, CacheTestMixin, TouchTestMixin):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.client = MappedFileCache(
+            os.path.join(self.path, "cache"), size=1 << 20
+        )
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.path)
+
+
+class MappedFileCacheFileTestCase(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def new(self, **kwargs):
+        c = MappedFileCache(self.path, **kwargs)
+        self.addCleanup(c.close)
+        return c
+
+    def test_too_small(self):
+        self.assertRaises(
+            ValueError, MappedFileCache, self.path, size=1 << 10, capacity=64
+        )
+
+    def test_not_a_cache_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"x" * 1024)
+        self.assertRaises(ValueError, MappedFileCache, self.path)
+
+    def test_touch_expires(self):
+        clock = FakeClock(1000000)
+        c = self.new(size=1 << 16, capacity=16, clock=clock)
+        assert [] == c.set_multi({"k1": 1, "k2": 2, "k3": 3}, 10)
+        assert c.touch("k1", 100)
+        assert [] == c.touch_multi(["k2"], 100)
+        clock.advance(11)
+        assert {"k1": 1, "k2": 2} == c.get_multi(["k1", "k2", "k3"])
+        assert not c.touch("k3", 100)
+        assert 1 == c.get_and_touch("k1", 200)
+        clock.advance(100)
+        assert {"k1": 1} == c.get_multi(["k1", "k2", "k3"])
+
+    def test_get_copy_under_lock(self):
+        class RacingCache(MappedFileCache):
+            racing = False
+
+            def release(self):
+                MappedFileCache.release(self)
+                if self.racing:
+                    # another process writes once the lock is released
+                    self.racing = False
+                    self.flush_all()
+                    self.set("x", b"y" * 100)
+
+        c = RacingCache(self.path, size=1 << 16, capacity=16)
+        assert c.set("k", b"v" * 100)
+        c.racing = True
+        assert b"v" * 100 == c.get("k")
+        c.close()
+
+    def test_value_too_large(self):
+        c = self.new(size=1 << 16, capacity=16)
+        assert not c.set("k", b"x" * (1 << 16))
+        assert c.set("k", b"x" * 100)
+
+    def test_survives_reopen(self):
+        c = MappedFileCache(self.path, size=1 << 20)
+        c.set_multi({"k1": "v1", "k2": b"v2"}, 100)
+        c.incr("n", initial_value=0)
+        c.close()
+        c = self.new(size=1 << 16)
+        assert 1 << 20 == c.end
+        assert {"k1": "v1", "k2": b"v2", "n": 1} == c.get_multi(
+            ["k1", "k2", "n"]
+        )
+
+    def test_get_view(self):
+        c = self.new(size=1 << 20)
+        c.set_multi({"b": b"bytes", "s": "string"})
+        view = c.get_view("b")
+        assert isinstance(view, memoryview)
+        assert b"bytes" == view
+        view.release()
+        assert "string" == c.get_view("s")
+        assert c.get_view("x") is None
+
+    def test_expired(self):
+        clock = FakeClock(1000000)
+        c = self.new(size=1 << 20, clock=clock)
+        assert [] == c.set_multi({"k1": 1, "k2": 2}, 10)
+        assert c.set("k3", 3, 100)
+        clock.advance(11)
+        assert c.get("k1") is None
+        assert c.add("k2", 20)
+        assert c.incr("k1") is None
+        assert {"k2": 20, "k3": 3} == c.get_multi(["k1", "k2", "k3"])
+
+    def test_compact_keeps_live_records(self):
+        clock = FakeClock(1000000)
+        c = self.new(size=1 << 16, capacity=64, clock=clock)
+        for i in range(200):
+            assert c.set("live", i)
+            assert c.set("short%d" % i, b"x" * 1000, 5)
+            clock.advance(1)
+        assert 199 == c.get("live")
+        assert b"x" * 1000 == c.get("short199")
+        assert c.get("short190") is None
+
+    def test_compact_evicts_all(self):
+        c = self.new(size=1 << 16, capacity=16)
+        room = c.end - c.data_offset
+        assert c.set("a", b"x" * 1000)
+        assert c.set("b", b"x" * (room - 200))
+        assert c.get("a") is None
+        assert b"x" * (room - 200) == c.get("b")
+
+    def test_compact_random(self):
+        for seed in range(150):
+            clock = FakeClock(1000000)
+            c = MappedFileCache(
+                self.path, size=1 << 14, capacity=32, clock=clock
+            )
+            rnd = random.Random(seed)
+            model = {}
+            for n in range(300):
+                key = "k%d" % rnd.randrange(40)
+                r = rnd.random()
+                if r < 0.2:
+                    c.delete(key)
+                    model.pop(key, None)
+                elif r < 0.7:
+                    value = b"x" * rnd.randrange(10, 1500)
+                    assert c.set(key, value, rnd.randrange(1, 20))
+                    model[key] = value
+                    assert value == c.get(key)
+                else:
+                    value = c.get(key)
+                    assert value is None or value == model[key]
+                clock.advance(rnd.randrange(3))
+            for key, value in c.get_multi(list(model)).items():
+                assert value == model[key]
+            c.close()
+            os.remove(self.path)
+
+    def test_slots_evicted(self):
+        c = self.new(size=1 << 20, capacity=64)
+        for i in range(200):
+            assert c.set("k%d" % i, i)
+        assert c.get("k0") is None
+        assert 199 == c.get("k199")
+
+    def test_flush_all(self):
+        c = self.new(size=1 << 20)
+        c.set_multi({"k1": 1, "k2": 2})
+        assert c.flush_all()
+        assert {} == c.get_multi(["k1", "k2"])
+        assert c.set("k1", 1)
+
+    @skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_shared_between_processes(self):
+        c = self.new(size=1 << 20)
+        pids = []
+        for n in range(4):
+            pid = os.fork()
+            if pid == 0:  # pragma: nocover
+                code = 1
+                try:
+                    child = MappedFileCache(self.path)
+                    for i in range(100):
+                        child.incr("counter", initial_value=0)
+                    if child.set("child%d" % n, n):
+                        code = 0
+                    child.close()
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        for pid in pids:
+            assert 0 == os.waitpid(pid, 0)[1]
+        assert 400 == c.get("counter")
+        assert {"child0": 0, "child3": 3} == c.get_multi(["child0", "child3"])
@@ -1,13 +1,20 @@
 import os
 from unittest import TestCase
 
+from wheezy.caching.codec import Codecs
 from wheezy.caching.memcache import Client
-from wheezy.caching.tests.test_cache import CacheTestMixin
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
 
 if Client:
     from wheezy.caching.memcache import MemcachedClient
 
-    class MemcacheClientTestCase(TestCase, CacheTestMixin):
+    class MemcacheClientTestCase(
+        TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+    ):
         def setUp(self):
             self.client = MemcachedClient(
                 [os.environ.get("MEMCACHED_HOST", "127.0.0.1")]
@@ -21,3 +28,16 @@ if Client:
             assert self.client.delete("d")
             self.setget("d", 1)
             assert self.client.delete("d")
+
+    class MemcacheClientCodecsTestCase(
+        TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+    ):
+        def setUp(self):
+            self.client = MemcachedClient(
+                [os.environ.get("MEMCACHED_HOST", "127.0.0.1")],
+                codecs=Codecs(),
+            )
+            self.namespace = None
+
+        def tearDown(self):
+            self.client.flush_all()
@@ -1,13 +1,485 @@
+import gc
+import os
+import random
+import shutil
+import tempfile
+from threading import Thread
+from time import sleep
 from unittest import TestCase
 
-from wheezy.caching.memory import MemoryCache
-from wheezy.caching.tests.test_cache import CacheTestMixin
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.memory import MemoryCache, Reaper
+from wheezy.caching.sharded import ShardedMemoryCache
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
 
 
-class MemoryCacheTestCase(TestCase, CacheTestMixin):
+class MemoryCacheTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
     def setUp(self):
         self.client = MemoryCache()
         self.namespace = None
 
     def tearDown(self):
         self.client.flush_all()
+
+
+class ConcurrentMemoryCacheTestCase(TestCase):
+    def test_readers_and_writers(self):
+        clock = FakeClock(1000000)
+        c = MemoryCache(buckets=10, bucket_interval=1, clock=clock)
+        errors = []
+
+        def reader():
+            try:
+                for i in range(20000):
+                    value = c.get(i % 100)
+                    assert value is None or value == i % 100
+                    values = c.get_multi(range(10))
+                    assert all(k == v for k, v in values.items())
+            except Exception as ex:  # pragma: nocover
+                errors.append(ex)
+
+        def writer():
+            for i in range(5000):
+                c.set(i % 100, i % 100, 1 + i % 3)
+                if i % 100 == 0:
+                    clock.advance(1)
+                if i % 7 == 0:
+                    c.delete(i % 100)
+
+        threads = [Thread(target=reader) for i in range(4)]
+        threads.append(Thread(target=writer))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors
+        clock.advance(10)
+        assert {} == c.get_multi(range(100))
+        assert not c.items
+
+
+class ExpireMemoryCacheTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000000)
+        self.client = MemoryCache(
+            buckets=10, bucket_interval=10, clock=self.clock
+        )
+
+    def indexed(self):
+        c = self.client
+        return sum(map(len, c.expire_buckets)) + sum(
+            map(len, c.expire_rounds.values())
+        )
+
+    def test_expired_items_removed_on_store(self):
+        c = self.client
+        assert [] == c.set_multi({"k1": 1, "k2": 2}, 15)
+        assert c.set("k3", 3, 35)
+        self.clock.advance(30)
+        assert c.set("k", 0)
+        assert ["k", "k3"] == sorted(c.items)
+        self.clock.advance(10)
+        assert c.set("k", 0)
+        assert ["k"] == sorted(c.items)
+        assert 0 == self.indexed()
+
+    def test_long_lived_items_cascade(self):
+        c = self.client
+        assert c.set("k", 1, 250)
+        assert 1 == len(c.expire_rounds)
+        for i in range(25):
+            self.clock.advance(10)
+            assert c.set("x", 0)
+            assert 1 == c.get("k")
+        assert not c.expire_rounds
+        self.clock.advance(10)
+        assert c.set("x", 0)
+        assert ["x"] == list(c.items)
+
+    def test_overwrite_does_not_duplicate(self):
+        c = self.client
+        for i in range(100):
+            self.clock.advance(1)
+            assert c.set("k", i, 50 + i * 10)
+        assert 1 == self.indexed()
+        assert c.delete("k")
+        assert 0 == self.indexed()
+
+    def test_expiry_index_stays_flat(self):
+        c = self.client
+        mapping = dict(("k%d" % i, i) for i in range(10000))
+        assert [] == c.set_multi(mapping, 7 * 86400)
+        for i in range(100):
+            self.clock.advance(10)
+            assert [] == c.set_multi(mapping, 7 * 86400)
+        assert 10000 == len(c.items)
+        assert 10000 == self.indexed()
+
+    def test_idle_gap(self):
+        c = self.client
+        assert c.set("k", 1, 15)
+        self.clock.advance(86400)
+        assert c.set("x", 0)
+        assert ["x"] == list(c.items)
+        assert 0 == self.indexed()
+
+    def test_evicted_items_unscheduled(self):
+        c = MemoryCache(
+            buckets=10, bucket_interval=10, max_items=2, clock=self.clock
+        )
+        for i in range(5):
+            assert c.set(i, i, 15)
+        assert 2 == sum(map(len, c.expire_buckets))
+
+
+class ReaperMemoryCacheTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000000)
+
+    def wait_for(self, condition):
+        for i in range(200):
+            if condition():
+                return True
+            sleep(0.01)
+        return False
+
+    def test_store_does_not_expire_inline(self):
+        c = MemoryCache(
+            buckets=10, bucket_interval=10, reaper=True, clock=self.clock
+        )
+        c.close()
+        assert c.set("k", 1, 5)
+        self.clock.advance(20)
+        assert c.set("x", 0)
+        assert ["k", "x"] == sorted(c.items)
+
+    def test_reaps_in_background(self):
+        c = MemoryCache(
+            buckets=10,
+            bucket_interval=10,
+            reaper=True,
+            reap_interval=0.01,
+            clock=self.clock,
+        )
+        self.addCleanup(c.close)
+        assert [] == c.set_multi(dict((i, i) for i in range(5000)), 5)
+        assert c.set("x", 0)
+        self.clock.advance(20)
+        assert self.wait_for(lambda: ["x"] == list(c.items))
+
+    def test_expire_in_slices(self):
+        c = MemoryCache(buckets=10, bucket_interval=10, clock=self.clock)
+        assert [] == c.set_multi(dict((i, i) for i in range(25)), 5)
+        self.clock.advance(20)
+        assert not c.expire(self.clock.now, 10)
+        assert 15 == len(c.items)
+        assert not c.expire(self.clock.now, 10)
+        assert c.expire(self.clock.now, 10)
+        assert not c.items
+
+    def test_touch_after_expire_in_slices(self):
+        clock = FakeClock(1000)
+        c = MemoryCache(buckets=2, bucket_interval=10, clock=clock)
+        assert c.set("a", 1, 25)
+        assert c.set("b", 2, 25)
+        clock.advance(20)
+        assert not c.expire(clock.now, 1)
+        assert c.touch("a", 0)
+        assert c.touch("b", 0)
+        clock.advance(100)
+        assert c.expire(clock.now)
+        assert {"a": 1, "b": 2} == c.get_multi(["a", "b"])
+
+    def test_touch_expire_in_slices_random(self):
+        for seed in range(100):
+            rnd = random.Random(seed)
+            clock = FakeClock(1000)
+            c = MemoryCache(buckets=3, bucket_interval=5, clock=clock)
+            model = {}
+            for i in range(300):
+                key = "k%d" % rnd.randrange(20)
+                r = rnd.random()
+                if r < 0.3:
+                    time = rnd.choice((0, rnd.randrange(1, 60)))
+                    assert c.set(key, i, time)
+                    model[key] = (i, c.items[key].expires)
+                elif r < 0.6:
+                    time = rnd.choice((0, rnd.randrange(1, 60)))
+                    if c.touch(key, time):
+                        model[key] = (model[key][0], c.items[key].expires)
+                elif r < 0.8:
+                    c.expire(clock.now, rnd.randrange(1, 4))
+                else:
+                    clock.advance(rnd.randrange(10))
+                now = clock.now
+                for key, (value, expires) in model.items():
+                    if expires >= now:
+                        assert value == c.items[key].value
+                scheduled = [
+                    key
+                    for bucket in c.expire_buckets
+                    + list(c.expire_rounds.values())
+                    for key in bucket
+                ]
+                assert len(scheduled) == len(set(scheduled))
+
+    def test_stop(self):
+        c = MemoryCache(reaper=True, reap_interval=60)
+        assert c.reaper.thread.is_alive()
+        c.close()
+        assert not c.reaper.thread.is_alive()
+
+    def test_exits_once_cache_collected(self):
+        c = MemoryCache(reaper=True, reap_interval=0.01)
+        thread = c.reaper.thread
+        del c
+        gc.collect()
+        thread.join(2)
+        assert not thread.is_alive()
+
+    def test_shared_by_shards(self):
+        c = ShardedMemoryCache(
+            shards=4, reaper=True, reap_interval=0.01, clock=self.clock
+        )
+        self.addCleanup(c.close)
+        assert isinstance(c.reaper, Reaper)
+        assert all(shard.reaper is c.reaper for shard in c.shards)
+        assert [] == c.set_multi(dict((i, i) for i in range(100)), 5)
+        self.clock.advance(100)
+        assert self.wait_for(
+            lambda: not any(shard.items for shard in c.shards)
+        )
+
+
+class BoundedMemoryCacheTestCase(TestCase, CacheTestMixin):
+    def setUp(self):
+        self.client = MemoryCache(max_items=10)
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+    def test_evicts_least_recently_used(self):
+        c = MemoryCache(max_items=3)
+        assert [] == c.set_multi({"k1": 1, "k2": 2, "k3": 3}, 100)
+        assert 1 == c.get("k1")
+        assert {"k2": 2} == c.get_multi(["k2"])
+        assert c.add("k4", 4, 100)
+        assert ["k1", "k2", "k4"] == sorted(c.items)
+        assert 1 == c.evictions
+
+    def test_incr_initial_value_evicts(self):
+        c = MemoryCache(max_items=1)
+        assert c.set("k1", 1, 100)
+        assert 1 == c.incr("k2", initial_value=0)
+        assert ["k2"] == list(c.items)
+        assert 1 == c.evictions
+
+    def test_store_multi_over_limit(self):
+        c = MemoryCache(max_items=2)
+        mapping = dict(("k%d" % i, i) for i in range(5))
+        assert [] == c.set_multi(mapping, 100)
+        assert 2 == len(c.items)
+        assert 3 == c.evictions
+
+    def test_delete_unlinks(self):
+        c = MemoryCache(max_items=2)
+        assert [] == c.set_multi({"k1": 1, "k2": 2}, 100)
+        assert c.delete("k1")
+        assert c.delete_multi(["k2"])
+        assert c.policy.root.next is c.policy.root
+        assert c.set_multi({"k3": 3, "k4": 4}, 100) == []
+        assert 0 == c.evictions
+
+    def test_never_expiring_items_are_evicted(self):
+        c = MemoryCache(max_items=100)
+        for i in range(1000):
+            c.set(i, i)
+        assert 100 == len(c.items)
+        assert 900 == c.evictions
+
+
+class BudgetedMemoryCacheTestCase(TestCase, CacheTestMixin):
+    def setUp(self):
+        self.client = MemoryCache(max_bytes=10000)
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+    def test_size_tracks_items(self):
+        c = MemoryCache(max_bytes=100, sizeof=len)
+        assert [] == c.set_multi({"k1": "x" * 10, "k2": "x" * 20}, 100)
+        assert 34 == c.size
+        assert c.replace("k1", "x" * 30, 100)
+        assert 54 == c.size
+        assert c.delete("k2")
+        assert 32 == c.size
+        assert c.flush_all()
+        assert 0 == c.size
+
+    def test_evicts_to_stay_under_budget(self):
+        c = MemoryCache(max_bytes=100, sizeof=len)
+        for i in range(10):
+            assert c.set("k%d" % i, "x" * 18, 100)
+        assert 100 == c.size
+        assert ["k5", "k6", "k7", "k8", "k9"] == sorted(c.items)
+        assert 5 == c.evictions
+
+    def test_too_large_item_replaces_nothing(self):
+        c = MemoryCache(max_bytes=100, sizeof=len)
+        assert c.set("k", "x", 100)
+        assert ["k"] == c.set_multi({"k": "x" * 100}, 100)
+        assert c.get("k") is None
+        assert 0 == c.size
+
+    def test_incr_updates_size(self):
+        c = MemoryCache(max_bytes=1000)
+        assert 1 == c.incr("k", initial_value=0)
+        size = c.size
+        assert 2**40 == c.incr("k", 2**40 - 1)
+        assert c.size > size
+
+    def test_default_estimator(self):
+        c = MemoryCache(max_bytes=100000)
+        assert c.set("k", ["x" * 1000, {"a": b"y" * 1000}], 100)
+        assert c.size > 2000
+
+
+class StatsMemoryCacheTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000)
+
+    def test_get(self):
+        for max_items in (0, 10):
+            c = MemoryCache(max_items=max_items, clock=self.clock, stats=True)
+            c.set_multi({"k1": 1, "k2": 2}, 10)
+            c.get("k1")
+            c.get("x")
+            c.get_multi(["k1", "k2", "x"])
+            self.clock.advance(20)
+            c.get("k1")
+            c.get_multi(["k2"])
+            s = c.stats()
+            assert 7 == s["cmd_get"]
+            assert 3 == s["get_hits"]
+            assert 4 == s["get_misses"]
+            assert 2 == s["get_expired"]
+
+    def test_store(self):
+        c = MemoryCache(stats=True)
+        c.add("k", 1)
+        c.add("k", 1)
+        c.replace("x", 1)
+        c.add_multi({"k": 1, "k2": 2})
+        c.replace_multi({"k": 1, "x": 1})
+        s = c.stats()
+        assert 7 == s["cmd_set"]
+        assert 2 == s["add_failures"]
+        assert 2 == s["replace_failures"]
+        assert 2 == s["curr_items"]
+
+    def test_evictions(self):
+        c = MemoryCache(max_items=2, stats=True)
+        c.set_multi({"k1": 1, "k2": 2, "k3": 3}, 100)
+        s = c.stats()
+        assert 1 == s["evictions"]
+        assert 2 == s["curr_items"]
+
+    def test_reclaimed(self):
+        c = MemoryCache(bucket_interval=1, clock=self.clock, stats=True)
+        c.set_multi({"k1": 1, "k2": 2}, 5)
+        self.clock.advance(10)
+        c.set("k3", 3, 100)
+        s = c.stats()
+        assert 2 == s["reclaimed"]
+        assert 1 == s["curr_items"]
+
+    def test_not_counted(self):
+        c = MemoryCache()
+        c.set("k", 1)
+        c.get("k")
+        s = c.stats()
+        assert 0 == s["cmd_get"]
+        assert 0 == s["cmd_set"]
+        assert 1 == s["curr_items"]
+
+    def test_threads(self):
+        c = MemoryCache(stats=True)
+        c.set("k", 1)
+
+        def worker():
+            for i in range(10000):
+                c.get("k")
+                c.get("x")
+
+        threads = [Thread(target=worker) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        s = c.stats()
+        assert 80000 == s["get_hits"]
+        assert 80000 == s["get_misses"]
+        assert len(c.counters.stripes) <= 1
+
+
+class SnapshotMemoryCacheTestCase(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "snapshot")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        clock = FakeClock(1000000)
+        c = MemoryCache(clock=clock)
+        mapping = dict(("k%d" % i, [i]) for i in range(25000))
+        c.set_multi(mapping, 100)
+        c.set("forever", 1)
+        c.set("absolute", 2, 2000000)
+        assert 25002 == c.dump(self.path)
+        assert not os.path.exists(self.path + ".tmp")
+        clock.advance(50)
+        c = MemoryCache(clock=clock)
+        assert 25002 == c.load(self.path)
+        assert mapping == c.get_multi(list(mapping))
+        clock.advance(50)
+        assert 1 == c.get("forever")
+        assert 2 == c.get("absolute")
+        assert mapping == c.get_multi(list(mapping))
+        clock.advance(1)
+        assert {} == c.get_multi(list(mapping))
+        assert 1 == c.get("forever")
+
+    def test_expired_not_dumped_nor_loaded(self):
+        clock = FakeClock(1000000)
+        c = MemoryCache(clock=clock)
+        c.set("k1", 1, 10)
+        c.set("k2", 2, 20)
+        clock.advance(11)
+        assert 1 == c.dump(self.path)
+        clock.advance(10)
+        c = MemoryCache(clock=clock)
+        assert 0 == c.load(self.path)
+        assert {} == c.items
+
+    def test_load_bounded(self):
+        c = MemoryCache()
+        c.set_multi(dict(("k%d" % i, i) for i in range(100)), 100)
+        c.dump(self.path)
+        c = MemoryCache(max_items=10)
+        c.load(self.path)
+        assert 10 == len(c.items)
+
+    def test_not_a_snapshot(self):
+        with open(self.path, "wb") as f:
+            f.write(b"x" * 100)
+        self.assertRaises(ValueError, MemoryCache().load, self.path)
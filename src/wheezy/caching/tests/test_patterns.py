@@ -1,6 +1,9 @@
 import unittest
 from unittest.mock import ANY, Mock, patch
 
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.compress import CompressingCache
+from wheezy.caching.memory import MemoryCache
 from wheezy.caching.patterns import Cached, OnePass, key_builder
 
 
@@ -84,6 +87,16 @@ class CachedTestCase(unittest.TestCase):
         self.cached.get_multi(["key"])
         self.mock_cache.get_multi.assert_called_once_with(["key"], "ns")
 
+    def test_touch(self):
+        """Ensure touch operation is passed to cache."""
+        self.cached.touch("key")
+        self.mock_cache.touch.assert_called_once_with("key", 10, "ns")
+
+    def test_touch_multi(self):
+        """Ensure touch_multi operation is passed to cache."""
+        self.cached.touch_multi(["key"])
+        self.mock_cache.touch_multi.assert_called_once_with(["key"], 10, "ns")
+
     def test_delete(self):
         """Ensure delete operation is passed to cache."""
         self.cached.delete("key", 0)
@@ -137,6 +150,310 @@ class CachedTestCase(unittest.TestCase):
         assert "key" == mk("cls")
 
 
+class SlidingCachedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000)
+        self.cache = MemoryCache(clock=self.clock)
+        self.cached = Cached(self.cache, time=10, sliding=True)
+
+    def test_get(self):
+        """Each read extends expiration time."""
+        self.cached.set("key", "value")
+        for i in range(3):
+            self.clock.advance(8)
+            assert "value" == self.cached.get("key")
+        self.clock.advance(11)
+        assert self.cached.get("key") is None
+
+    def test_get_multi(self):
+        """Only keys read are extended."""
+        self.cached.set_multi({"k1": 1, "k2": 2})
+        self.clock.advance(8)
+        assert {"k1": 1} == self.cached.get_multi(["k1", "x"])
+        self.clock.advance(8)
+        assert {"k1": 1} == self.cached.get_multi(["k1", "k2"])
+
+    def test_get_or_set(self):
+        """Cache patterns read with sliding expiration."""
+        self.cached.set("key", "value")
+        self.clock.advance(8)
+        assert "value" == self.cached.get_or_set("key", Mock())
+        self.clock.advance(8)
+        assert "value" == self.cached.get("key")
+
+
+class JitterCachedTestCase(unittest.TestCase):
+    def misses(self, jitter):
+        """Warms up 1000 keys and returns a number of keys expired
+        in each second that follows.
+        """
+        clock = FakeClock(1000)
+        cached = Cached(MemoryCache(clock=clock), time=100, jitter=jitter)
+        keys = ["k%d" % i for i in range(1000)]
+        assert [] == cached.set_multi(dict((key, 1) for key in keys))
+        misses = []
+        found = len(keys)
+        for i in range(120):
+            clock.advance(1)
+            n = len(cached.get_multi(keys))
+            misses.append(found - n)
+            found = n
+        assert 0 == found
+        return misses
+
+    def test_no_jitter(self):
+        """All keys expire in the same second."""
+        assert 1000 == max(self.misses(0))
+
+    def test_set_multi(self):
+        """Misses are spread over jitter part of time."""
+        misses = self.misses(0.2)
+        assert max(misses) < 250
+        assert len([n for n in misses if n]) > 5
+        assert not any(misses[:79])
+
+    def test_set(self):
+        """Time of a single write is shortened by up to jitter."""
+        clock = FakeClock(1000)
+        cached = Cached(MemoryCache(clock=clock), time=100, jitter=0.2)
+        times = set()
+        for i in range(100):
+            cached.set("k%d" % i, 1)
+            times.add(cached.cache.items["k%d" % i].expires - 1000)
+        assert len(times) > 1
+        assert 80 <= min(times) and max(times) <= 100
+
+    def test_touch(self):
+        """Touch shortens time of each write as set does."""
+        clock = FakeClock(1000)
+        cached = Cached(MemoryCache(clock=clock), time=100, jitter=0.2)
+        keys = ["k%d" % i for i in range(100)]
+        cached.set_multi(dict((key, 1) for key in keys))
+        for touch in (
+            lambda: [cached.touch(key) for key in keys],
+            lambda: [cached.touch_multi([key]) for key in keys],
+        ):
+            touch()
+            times = set(cached.cache.items[key].expires - 1000 for key in keys)
+            assert len(times) > 1
+            assert 80 <= min(times) and max(times) <= 100
+
+    def test_short_time(self):
+        """A jittered time is never shortened down to 0 (never)."""
+        clock = FakeClock(1000)
+        cached = Cached(MemoryCache(clock=clock), time=2, jitter=0.9)
+        keys = ["k%d" % i for i in range(100)]
+        assert [] == cached.set_multi(dict((key, 1) for key in keys))
+        for key in keys:
+            cached.set(key + "s", 1)
+        assert all(
+            1001 <= item.expires <= 1002
+            for item in cached.cache.items.values()
+        )
+
+    def test_invalid_jitter(self):
+        for jitter in (-0.1, 1, 2):
+            self.assertRaises(
+                AssertionError, Cached, MemoryCache(), jitter=jitter
+            )
+
+
+class NoneCachedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000)
+        self.cache = MemoryCache(clock=self.clock)
+        self.cached = Cached(
+            self.cache, time=100, none_time=10, clock=self.clock
+        )
+        self.create_factory = Mock(return_value=None)
+
+    def test_disabled(self):
+        """A None result is not cached by default."""
+        cached = Cached(self.cache, time=100)
+        assert cached.get_or_set("key", self.create_factory) is None
+        assert cached.get_or_set("key", self.create_factory) is None
+        assert 2 == self.create_factory.call_count
+        assert "key" not in self.cache.items
+
+    def test_get_or_set(self):
+        """A None result is cached for none_time."""
+        for i in range(2):
+            assert self.cached.get_or_set("key", self.create_factory) is None
+        assert 1 == self.create_factory.call_count
+        assert self.cached.get("key") is None
+        assert {} == self.cached.get_multi(["key"])
+        self.clock.advance(11)
+        assert self.cached.get_or_set("key", self.create_factory) is None
+        assert 2 == self.create_factory.call_count
+
+    def test_get_or_add(self):
+        """A None result is added."""
+        for i in range(2):
+            assert (
+                self.cached.get_or_add("key", self.create_factory, None)
+                is None
+            )
+        assert 1 == self.create_factory.call_count
+
+    def test_get_or_create(self):
+        """A None result is cached by one pass create."""
+        for i in range(2):
+            assert (
+                self.cached.get_or_create("key", self.create_factory) is None
+            )
+        assert 1 == self.create_factory.call_count
+
+    def test_wraps_get_or_set(self):
+        """A None result is cached by decorator."""
+
+        @self.cached.wraps_get_or_set(make_key=lambda i: "key:%d" % i)
+        def find(i):
+            return self.create_factory(i)
+
+        assert find(1) is None
+        assert find(1) is None
+        self.create_factory.assert_called_once_with(1)
+
+    def test_get_or_set_multi(self):
+        """Args the factory did not return are cached as None."""
+        create_factory = Mock(return_value={1: "a"})
+
+        def mk(i):
+            return "k%d" % i
+
+        for i in range(2):
+            assert {1: "a"} == self.cached.get_or_set_multi(
+                mk, create_factory, [1, 2]
+            )
+        create_factory.assert_called_once_with([1, 2])
+        self.clock.advance(11)
+        create_factory.return_value = {2: "b"}
+        assert {1: "a", 2: "b"} == self.cached.get_or_set_multi(
+            mk, create_factory, [1, 2]
+        )
+        create_factory.assert_called_with([2])
+
+    def test_pickled(self):
+        """The marker survives a cache that pickles values."""
+        cached = Cached(CompressingCache(self.cache), time=100, none_time=10)
+        for i in range(2):
+            assert cached.get_or_set("key", self.create_factory) is None
+        assert 1 == self.create_factory.call_count
+
+
+class StaleCachedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000)
+        self.cache = MemoryCache(clock=self.clock)
+        self.cached = Cached(
+            self.cache, time=10, stale_time=60, clock=self.clock
+        )
+        self.cached.get_or_create("key", lambda: "v1")
+
+    def test_fresh(self):
+        """An item read before time is not refreshed."""
+        create_factory = Mock(return_value="v2")
+        self.clock.advance(10)
+        assert "v1" == self.cached.get_or_create("key", create_factory)
+        assert "v1" == self.cached.get("key")
+        assert {"key": "v1"} == self.cached.get_multi(["key"])
+        assert not create_factory.called
+
+    def test_refresh(self):
+        """A caller that enters one pass refreshes the item."""
+        self.clock.advance(11)
+        assert "v2" == self.cached.get_or_create("key", lambda: "v2")
+        assert "v2" == self.cached.get("key")
+        assert self.cache.get("one_pass:key") is None
+
+    def test_stale(self):
+        """Other callers get a stale item at once."""
+        create_factory = Mock(return_value="v2")
+        self.clock.advance(11)
+        assert self.cache.add("one_pass:key", 1, 10)
+        assert "v1" == self.cached.get_or_create("key", create_factory)
+        assert not create_factory.called
+
+    def test_executor(self):
+        """A stale item is refreshed by executor."""
+        executor = Mock()
+        self.cached.executor = executor
+        self.clock.advance(11)
+        assert "v1" == self.cached.get_or_create("key", lambda: "v2")
+        assert "v1" == self.cached.get_or_create("key", lambda: "v3")
+        executor.submit.assert_called_once_with(
+            self.cached.refresh, ANY, "key", ANY, None
+        )
+        args = executor.submit.call_args[0]
+        assert "v2" == args[0](*args[1:])
+        assert "v2" == self.cached.get("key")
+        assert self.cache.get("one_pass:key") is None
+
+    def test_executor_fails(self):
+        """One pass is released if a refresh is not submitted."""
+        executor = Mock()
+        executor.submit.side_effect = RuntimeError("shutdown")
+        self.cached.executor = executor
+        self.clock.advance(11)
+        self.assertRaises(
+            RuntimeError, self.cached.get_or_create, "key", lambda: "v2"
+        )
+        assert self.cache.get("one_pass:key") is None
+        self.cached.executor = None
+        assert "v2" == self.cached.get_or_create("key", lambda: "v2")
+
+    def test_expired(self):
+        """An item is dropped past stale_time."""
+        self.clock.advance(71)
+        assert self.cached.get("key") is None
+        assert "v2" == self.cached.get_or_create("key", lambda: "v2")
+
+    def test_other_patterns(self):
+        """Other cache patterns read a value of a stale item."""
+        calls = []
+
+        def create_factory(*args):
+            calls.append(args)
+            return "v2"
+
+        cached = self.cached
+        for clock in (0, 11):
+            self.clock.advance(clock)
+            assert "v1" == cached.get_or_set("key", create_factory)
+            assert "v1" == cached.get_or_add("key", create_factory, None)
+            assert (
+                "v1"
+                == cached.wraps_get_or_set(
+                    create_factory, make_key=lambda: "key"
+                )()
+            )
+            assert (
+                "v1"
+                == cached.wraps_get_or_add(
+                    create_factory, make_key=lambda: "key"
+                )()
+            )
+            assert {"key": "v1"} == cached.get_or_set_multi(
+                lambda key: key, create_factory, ["key"]
+            )
+        assert not calls
+
+    def test_wraps_get_or_create(self):
+        """A decorated function refreshes a stale item."""
+        calls = []
+
+        @self.cached.wraps_get_or_create(make_key=lambda: "key")
+        def create():
+            calls.append(1)
+            return "v%d" % (len(calls) + 1)
+
+        assert "v1" == create()
+        self.clock.advance(11)
+        assert "v2" == create()
+        assert "v2" == create()
+        assert 1 == len(calls)
+
+
 class OnePassTestCase(unittest.TestCase):
     def setUp(self):
         self.mock_cache = Mock()
@@ -151,6 +468,14 @@ class OnePassTestCase(unittest.TestCase):
         assert self.one_pass.acquired
         self.mock_cache.add.assert_called_once_with("key", ANY, 10, "ns")
 
+    def test_enter_marker_from_clock(self):
+        """The marker is the current time of the clock."""
+        one_pass = OnePass(
+            self.mock_cache, "key", time=10, clock=FakeClock(100)
+        )
+        one_pass.__enter__()
+        self.mock_cache.add.assert_called_once_with("key", 100, 10, None)
+
     def test_exit_acquired(self):
         """Releases key if acquired."""
         self.mock_cache.add.return_value = True
@@ -0,0 +1,92 @@
+from random import Random
+from unittest import TestCase
+
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.policy import CountMinSketch
+from wheezy.caching.tests.test_cache import CacheTestMixin
+
+
+def zipf_trace(n, keys, s=1.0, seed=7):
+    weights = [1.0 / (i**s) for i in range(1, keys + 1)]
+    return Random(seed).choices(range(keys), weights=weights, k=n)
+
+
+def scan_trace(trace, every, length):
+    """Injects a run of unique one-hit keys after *every* requests."""
+    result = []
+    scan_id = 0
+    for i, key in enumerate(trace):
+        result.append(key)
+        if i % every == 0:
+            for _ in range(length):
+                scan_id += 1
+                result.append("scan:%d" % scan_id)
+    return result
+
+
+def hit_ratio(cache, trace):
+    hits = 0
+    for key in trace:
+        if cache.get(key) is None:
+            cache.set(key, key, 100)
+        else:
+            hits += 1
+    return hits / len(trace)
+
+
+class TinyLFUMemoryCacheTestCase(TestCase, CacheTestMixin):
+    def setUp(self):
+        self.client = MemoryCache(max_items=10, policy="tinylfu")
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+    def test_zipf_hit_ratio(self):
+        trace = zipf_trace(30000, 5000)
+        lru = hit_ratio(MemoryCache(max_items=250), trace)
+        tinylfu = hit_ratio(
+            MemoryCache(max_items=250, policy="tinylfu"), trace
+        )
+        assert tinylfu > lru + 0.05
+
+    def test_zipf_with_scans_hit_ratio(self):
+        trace = scan_trace(zipf_trace(30000, 5000), 100, 200)
+        lru = hit_ratio(MemoryCache(max_items=250), trace)
+        tinylfu = hit_ratio(
+            MemoryCache(max_items=250, policy="tinylfu"), trace
+        )
+        assert tinylfu > 1.5 * lru
+
+    def test_weighted(self):
+        c = MemoryCache(max_bytes=5000, sizeof=len, policy="tinylfu")
+        trace = zipf_trace(5000, 1000)
+        for key in trace:
+            key = str(key)
+            if c.get(key) is None:
+                c.set(key, "x" * 50, 100)
+        assert c.size <= 5000
+        assert 0 < len(c.items) <= 5000 // 50
+
+    def test_delete_and_flush(self):
+        c = MemoryCache(max_items=100, policy="tinylfu")
+        for i in range(300):
+            c.set(i, i, 100)
+            c.get(i % 10)
+        assert 100 == len(c.items)
+        assert c.delete_multi(list(c.items)[:50])
+        assert 50 == c.policy.weight
+        assert c.flush_all()
+        assert 0 == c.policy.weight
+
+
+class CountMinSketchTestCase(TestCase):
+    def test_aging(self):
+        s = CountMinSketch(16, sample_size=100)
+        for _ in range(15):
+            s.increment("a")
+        assert 15 == s.frequency("a")
+        for i in range(85):
+            s.increment(i)
+        assert 7 == s.frequency("a")
+        assert s.additions < 100
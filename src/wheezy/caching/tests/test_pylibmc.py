@@ -3,7 +3,12 @@ import warnings
 from queue import Queue
 from unittest import TestCase
 
-from wheezy.caching.tests.test_cache import CacheTestMixin
+from wheezy.caching.codec import Codecs
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
 
 try:
     warnings.simplefilter("ignore")
@@ -29,7 +34,9 @@ else:
         1,
     )
 
-    class PylibmcClientTestCase(TestCase, CacheTestMixin):
+    class PylibmcClientTestCase(
+        TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+    ):
         def setUp(self):
             self.client = MemcachedClient(client_pool)
             self.namespace = None
@@ -43,3 +50,13 @@ else:
             assert not self.client.delete_multi(keys)
             self.setget_multi(mapping)
             assert self.client.delete_multi(keys)
+
+    class PylibmcClientCodecsTestCase(
+        TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+    ):
+        def setUp(self):
+            self.client = MemcachedClient(client_pool, codecs=Codecs())
+            self.namespace = None
+
+        def tearDown(self):
+            self.client.flush_all()
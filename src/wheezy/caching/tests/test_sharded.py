@@ -0,0 +1,60 @@
+from threading import Thread
+from unittest import TestCase
+
+from wheezy.caching.sharded import ShardedMemoryCache
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
+
+
+class ShardedMemoryCacheTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
+    def setUp(self):
+        self.client = ShardedMemoryCache(shards=4)
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+    def test_keys_spread_over_shards(self):
+        mapping = dict(("k%d" % i, i) for i in range(100))
+        assert [] == self.client.set_multi(mapping, 100)
+        counts = [len(shard.items) for shard in self.client.shards]
+        assert 100 == sum(counts)
+        assert all(counts)
+        assert mapping == self.client.get_multi(list(mapping))
+
+    def test_bounded(self):
+        c = ShardedMemoryCache(shards=4, max_items=40)
+        for i in range(1000):
+            c.set(i, i, 100)
+        assert 40 == sum(len(shard.items) for shard in c.shards)
+        assert 960 == c.evictions
+
+    def test_stats(self):
+        c = ShardedMemoryCache(shards=4, stats=True)
+        c.set_multi(dict(("k%d" % i, i) for i in range(100)), 100)
+        c.get_multi(["k%d" % i for i in range(200)])
+        s = c.stats()
+        assert 100 == s["cmd_set"]
+        assert 100 == s["get_hits"]
+        assert 100 == s["get_misses"]
+        assert 100 == s["curr_items"]
+
+    def test_concurrent_incr(self):
+        c = self.client
+
+        def worker():
+            for i in range(1000):
+                c.incr(i % 50, initial_value=0)
+
+        threads = [Thread(target=worker) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        values = c.get_multi(range(50))
+        assert 8000 == sum(values.values())
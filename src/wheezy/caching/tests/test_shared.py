@@ -0,0 +1,148 @@
+import os
+import random
+from unittest import TestCase, skipUnless
+
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.shared import SharedMemoryCache
+from wheezy.caching.tests.test_cache import CacheTestMixin, TouchTestMixin
+
+
+class SharedMemoryCacheTestCase(TestCase, CacheTestMixin, TouchTestMixin):
+    def setUp(self):
+        self.client = SharedMemoryCache(
+            size=1 << 20, stripes=4, page_size=4096
+        )
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.close()
+        self.client.unlink()
+
+
+class SharedMemoryCacheLayoutTestCase(TestCase):
+    def new(self, **kwargs):
+        c = SharedMemoryCache(**kwargs)
+        self.addCleanup(c.unlink)
+        self.addCleanup(c.close)
+        return c
+
+    def test_too_small(self):
+        self.assertRaises(ValueError, SharedMemoryCache, size=1 << 10)
+
+    def test_value_too_large(self):
+        c = self.new(size=1 << 20, page_size=1 << 12)
+        assert not c.set("k", "x" * (1 << 12))
+        assert ["k"] == c.set_multi({"k": "x" * (1 << 12)})
+        assert c.set("k", "x" * 100)
+
+    def test_touch_expires(self):
+        clock = FakeClock(1000000)
+        c = self.new(size=1 << 20, stripes=1, clock=clock)
+        assert [] == c.set_multi({"k1": 1, "k2": 2, "k3": 3}, 10)
+        assert c.touch("k1", 100)
+        assert [] == c.touch_multi(["k2"], 100)
+        clock.advance(11)
+        assert {"k1": 1, "k2": 2} == c.get_multi(["k1", "k2", "k3"])
+        assert not c.touch("k3", 100)
+        assert 1 == c.get_and_touch("k1", 200)
+        clock.advance(100)
+        assert {"k1": 1} == c.get_multi(["k1", "k2", "k3"])
+
+    def test_expired(self):
+        clock = FakeClock(1000000)
+        c = self.new(size=1 << 20, stripes=1, clock=clock)
+        assert [] == c.set_multi({"k1": 1, "k2": 2}, 10)
+        assert c.set("k3", 3, 100)
+        clock.advance(10)
+        assert 1 == c.get("k1")
+        clock.advance(1)
+        assert c.get("k1") is None
+        assert c.add("k2", 20)
+        assert c.delete("k2")
+        assert c.incr("k1") is None
+        assert {"k3": 3} == c.get_multi(["k1", "k2", "k3"])
+        assert 1 == c.header(0, 0)
+
+    def test_slots_evicted(self):
+        c = self.new(size=1 << 20, capacity=64, stripes=2)
+        for i in range(200):
+            assert c.set("k%d" % i, i)
+        assert c.header(0, 0) + c.header(1, 0) <= 2 * c.max_count
+        assert 200 - 2 * c.max_count == c.evictions
+        assert 199 == c.get("k199")
+
+    def test_chunks_evicted(self):
+        c = self.new(size=1 << 18, capacity=4096, stripes=1, page_size=4096)
+        value = "x" * 1000
+        for i in range(1000):
+            assert c.set("k%d" % i, value)
+        assert c.evictions > 0
+        assert value == c.get("k999")
+
+    def test_remove_keeps_probe_sequences(self):
+        c = self.new(size=1 << 20, capacity=256, stripes=2)
+        rnd = random.Random(7)
+        model = {}
+        for n in range(5000):
+            key = "k%d" % rnd.randrange(150)
+            if rnd.random() < 0.4:
+                assert c.delete(key) == (key in model)
+                model.pop(key, None)
+            else:
+                assert c.set(key, n)
+                model[key] = n
+        assert model == c.get_multi(["k%d" % i for i in range(150)])
+        assert 0 == c.evictions
+
+    def test_hash_collision(self):
+        # keys of equal length and crc32
+        c = self.new(size=1 << 20, capacity=113, stripes=1)
+        for i in range(3):
+            assert c.set("plumless", 1)
+            assert c.set("buckeroo", 2)
+            assert 1 == c.get("plumless")
+            assert 2 == c.get("buckeroo")
+        assert 2 == c.header(0, 0)
+        assert c.delete("buckeroo")
+        assert c.delete("plumless")
+        assert 0 == c.header(0, 0)
+
+    def test_flush_all(self):
+        c = self.new(size=1 << 20, page_size=4096)
+        keys = ["k%d" % i for i in range(100)]
+        c.set_multi(dict((key, 1) for key in keys))
+        assert c.flush_all()
+        assert {} == c.get_multi(keys)
+        assert c.set("k", 1)
+
+
+@skipUnless(hasattr(os, "fork"), "requires fork")
+class SharedMemoryCacheForkTestCase(TestCase):
+    def setUp(self):
+        self.client = SharedMemoryCache(size=1 << 20, page_size=4096)
+
+    def tearDown(self):
+        self.client.close()
+        self.client.unlink()
+
+    def test_shared_between_processes(self):
+        c = self.client
+        c.set("parent", 1)
+        pids = []
+        for n in range(4):
+            pid = os.fork()
+            if pid == 0:  # pragma: nocover
+                code = 1
+                try:
+                    if c.get("parent") == 1:
+                        for i in range(100):
+                            c.incr("counter", initial_value=0)
+                        if c.set("child%d" % n, n):
+                            code = 0
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        for pid in pids:
+            assert 0 == os.waitpid(pid, 0)[1]
+        assert 400 == c.get("counter")
+        assert {"child0": 0, "child3": 3} == c.get_multi(["child0", "child3"])
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+from threading import Thread
+from unittest import TestCase
+
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.sqlite import SQLiteCache
+from wheezy.caching.tests.test_cache import CacheTestMixin, TouchTestMixin
+
+
+class SQLiteCacheTestCase(TestCase, CacheTestMixin, TouchTestMixin):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.client = SQLiteCache(os.path.join(self.path, "cache.db"))
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.path)
+
+
+class SQLiteCacheFileTestCase(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def new(self, **kwargs):
+        c = SQLiteCache(self.path, **kwargs)
+        self.addCleanup(c.close)
+        return c
+
+    def test_batches(self):
+        c = self.new()
+        mapping = dict(("k%d" % i, i) for i in range(1000))
+        assert [] == c.set_multi(mapping)
+        assert mapping == c.get_multi(list(mapping) + ["x"])
+        assert c.delete_multi(list(mapping)[:700])
+        assert 300 == len(c.get_multi(mapping))
+
+    def test_expired(self):
+        clock = FakeClock(1000000)
+        c = self.new(clock=clock)
+        assert [] == c.set_multi({"k1": 1, "k2": 2, "k3": 3}, 10)
+        clock.advance(11)
+        assert c.get("k1") is None
+        assert {} == c.get_multi(["k1", "k2"])
+        assert c.add("k1", 10)
+        assert not c.replace("k2", 20)
+        assert not c.delete("k3")
+        assert c.incr("k2") is None
+        assert 1 == c.incr("k2", initial_value=0)
+
+    def test_prune(self):
+        clock = FakeClock(1000000)
+        c = self.new(clock=clock, prune_interval=10, prune_limit=2)
+        c.set_multi(dict(("k%d" % i, i) for i in range(5)), 5)
+        clock.advance(10)
+        c.set("x", 1)
+        count = "SELECT COUNT(*) FROM cache"
+        assert 4 == c.connection().execute(count).fetchone()[0]
+        c.set("x", 1)
+        assert 4 == c.connection().execute(count).fetchone()[0]
+        clock.advance(10)
+        c.set("x", 1)
+        assert 2 == c.connection().execute(count).fetchone()[0]
+
+    def test_shared_by_instances(self):
+        c1 = self.new()
+        c2 = self.new()
+        c1.set("k", "v")
+        assert "v" == c2.get("k")
+        assert 1 == c2.incr("n", initial_value=0)
+        assert 2 == c1.incr("n")
+
+    def test_connection_per_thread(self):
+        c = self.new()
+
+        def worker():
+            for i in range(50):
+                c.incr("counter", initial_value=0)
+
+        threads = [Thread(target=worker) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert 200 == c.get("counter")
+        assert 5 == len(c.connections)
@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+from time import sleep
+from unittest import TestCase, skipUnless
+
+from wheezy.caching.client import CacheClient
+from wheezy.caching.clock import FakeClock
+from wheezy.caching.dependency import CacheDependency
+from wheezy.caching.invalidation import (
+    MAX_MESSAGE_SIZE,
+    InvalidationBus,
+    LocalTransport,
+    UnixDatagramTransport,
+    encode_messages,
+)
+from wheezy.caching.memory import MemoryCache
+from wheezy.caching.tests.test_cache import (
+    CacheTestMixin,
+    CasTestMixin,
+    TouchTestMixin,
+)
+from wheezy.caching.tiered import TieredCache
+
+
+class RecordingCache(MemoryCache):
+    def __init__(self, **kwargs):
+        super(RecordingCache, self).__init__(**kwargs)
+        self.requested = []
+
+    def get(self, key, namespace=None):
+        self.requested.append(key)
+        return super(RecordingCache, self).get(key, namespace)
+
+    def get_multi(self, keys, namespace=None):
+        self.requested.extend(keys)
+        return super(RecordingCache, self).get_multi(keys, namespace)
+
+
+class TieredCacheTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
+    def setUp(self):
+        self.client = TieredCache(MemoryCache())
+        self.namespace = None
+
+    def tearDown(self):
+        self.client.flush_all()
+
+
+class TieredCacheNamespaceTestCase(
+    TestCase, CacheTestMixin, CasTestMixin, TouchTestMixin
+):
+    def setUp(self):
+        self.client = CacheClient(
+            {"default": MemoryCache(), "near": TieredCache(MemoryCache())},
+            "default",
+        )
+        self.namespace = "near"
+
+    def tearDown(self):
+        self.client.flush_all()
+
+
+class TieredCacheTiersTestCase(TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000000)
+        self.l2 = RecordingCache(clock=self.clock)
+        self.l1 = MemoryCache(max_items=100, clock=self.clock)
+        self.c = TieredCache(self.l2, self.l1, time=5)
+
+    def test_get_fills_l1(self):
+        self.l2.set("k", 1, 100)
+        assert 1 == self.c.get("k")
+        assert 1 == self.c.get("k")
+        assert ["k"] == self.l2.requested
+        self.clock.advance(6)
+        assert 1 == self.c.get("k")
+        assert ["k", "k"] == self.l2.requested
+
+    def test_keys_iterator(self):
+        self.l2.set_multi({"k1": 1, "k2": 2}, 100)
+        self.l1.set("k1", 10, 5)
+        assert {"k1": 10, "k2": 2} == self.c.get_multi(
+            key for key in ["k1", "k2", "k3"]
+        )
+        assert self.c.delete_multi(key for key in ["k1", "k2"])
+        assert {} == self.l1.get_multi(["k1", "k2"])
+        assert {} == self.l2.get_multi(["k1", "k2"])
+
+    def test_get_multi_asks_l2_for_misses(self):
+        self.l2.set_multi({"k1": 1, "k2": 2}, 100)
+        self.l1.set("k1", 10, 5)
+        assert {"k1": 10, "k2": 2} == self.c.get_multi(["k1", "k2", "k3"])
+        assert ["k2", "k3"] == self.l2.requested
+        assert {"k1": 10, "k2": 2} == self.c.get_multi(["k1", "k2"])
+        assert ["k2", "k3"] == self.l2.requested
+
+    def test_writes_go_to_both(self):
+        assert self.c.set("k", 1, 100)
+        assert 1 == self.l1.get("k")
+        assert 1 == self.l2.get("k")
+        assert ["k"] == self.c.add_multi({"k": 2, "a": 3}, 100)
+        assert self.l1.get("k") is None
+        assert 3 == self.l1.get("a")
+        assert self.c.delete("a")
+        assert self.l1.get("a") is None
+        assert self.l2.get("a") is None
+
+    def test_l1_copy_is_short_lived(self):
+        self.c.set("k", 1, 100)
+        self.l2.set("k", 2, 100)
+        assert 1 == self.c.get("k")
+        self.clock.advance(6)
+        assert 2 == self.c.get("k")
+
+    def test_incr(self):
+        assert self.c.incr("n") is None
+        assert 1 == self.c.incr("n", initial_value=0)
+        assert 1 == self.l1.get("n")
+        assert 0 == self.c.decr("n")
+        assert 0 == self.l1.get("n")
+
+
+class TieredCacheInvalidationTestCase(TestCase):
+    def setUp(self):
+        peers = []
+        self.buses = [
+            InvalidationBus(LocalTransport(peers)),
+            InvalidationBus(LocalTransport(peers)),
+        ]
+        l2 = MemoryCache()
+        self.c1, self.c2 = [
+            TieredCache(l2, bus=bus, channel="near") for bus in self.buses
+        ]
+
+    def tearDown(self):
+        for bus in self.buses:
+            bus.close()
+
+    def deliver(self):
+        b1, b2 = self.buses
+        b1.flush()
+        b2.flush()
+        b1.receive(0)
+        b2.receive(0)
+
+    def test_delete(self):
+        self.c1.set("k", 1, 100)
+        self.deliver()
+        assert 1 == self.c2.get("k")
+        assert 1 == self.c2.l1.get("k")
+        assert self.c1.delete("k")
+        self.deliver()
+        assert self.c2.l1.get("k") is None
+        assert self.c2.get("k") is None
+
+    def test_write(self):
+        self.c1.set_multi({"k1": 1, "k2": 2}, 100)
+        assert {"k1": 1, "k2": 2} == self.c2.get_multi(["k1", "k2"])
+        self.c1.set_multi({"k1": 10}, 100)
+        self.c1.incr("k2")
+        self.deliver()
+        assert {"k1": 10, "k2": 3} == self.c2.get_multi(["k1", "k2"])
+
+    def test_dependency(self):
+        dependency = CacheDependency(self.c1)
+        self.c1.set("k", 1, 100)
+        dependency.add("master", "k")
+        assert 1 == self.c2.get("k")
+        dependency.delete("master")
+        self.deliver()
+        assert self.c2.get("k") is None
+
+    def test_bus_thread(self):
+        for bus in self.buses:
+            bus.start()
+        self.c1.set("k", 1, 100)
+        assert 1 == self.c2.get("k")
+        self.c1.delete("k")
+        for i in range(100):
+            if self.c2.l1.get("k") is None:
+                break
+            sleep(0.01)
+        assert self.c2.l1.get("k") is None
+
+    def test_publish_not_str(self):
+        b1, b2 = self.buses
+        self.assertRaises(TypeError, b1.publish, "near", ["k", 1])
+        assert {} == b1.pending
+
+
+class EncodeMessagesTestCase(TestCase):
+    def test_size(self):
+        for key in ("x", "\u00e9", "\u4e2d\u6587", '"\\', "\U0001f600"):
+            keys = ["%s%d" % (key * (i % 50), i) for i in range(20000)]
+            messages = encode_messages("near", keys)
+            assert len(messages) > 1
+            for message in messages:
+                assert len(message) <= MAX_MESSAGE_SIZE
+            assert keys == [
+                key
+                for message in messages
+                for key in json.loads(message.decode("UTF-8"))[1]
+            ]
+
+
+@skipUnless(hasattr(socket, "AF_UNIX"), "requires unix sockets")
+class UnixDatagramTransportTestCase(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_send_receive(self):
+        t1 = UnixDatagramTransport(self.dir, "a")
+        t2 = UnixDatagramTransport(self.dir, "b")
+        t3 = UnixDatagramTransport(self.dir, "c")
+        t3.close()
+        open(os.path.join(self.dir, "stale.sock"), "w").close()
+        t1.send(b"m1")
+        t1.send(b"m2")
+        assert [b"m1", b"m2"] == t2.receive(1.0)
+        assert [] == t1.receive(0.01)
+        assert ["a.sock", "b.sock"] == sorted(os.listdir(self.dir))
+        t1.close()
+        t2.close()
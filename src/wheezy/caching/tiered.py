@@ -0,0 +1,235 @@
+from wheezy.caching.memory import MemoryCache
+
+
+class TieredCache(object):
+    """A near cache: a bounded in-process ``l1`` cache (defaults to
+    ``MemoryCache`` of ``max_items``) in front of a shared ``l2`` cache
+    (e.g. memcached).
+
+    Reads go to ``l1`` first, ``l2`` hits fill ``l1`` for ``time``
+    seconds, so a copy in ``l1`` is at most that old. ``get_multi``
+    asks ``l2`` for ``l1`` misses only. Writes and deletes go to both.
+
+    If ``bus`` is set (see
+    :py:class:`~wheezy.caching.invalidation.InvalidationBus`), keys
+    written or deleted are published to ``channel``, so other processes
+    drop them from their ``l1``.
+
+    >>> l2 = MemoryCache()
+    >>> c = TieredCache(l2, time=5)
+    >>> l2.set_multi({'k1': 1, 'k2': 2}, 100)
+    []
+    >>> sorted(c.get_multi(['k1', 'k2', 'k3']).items())
+    [('k1', 1), ('k2', 2)]
+    >>> sorted(c.l1.items)
+    ['k1', 'k2']
+    """
+
+    def __init__(
+        self, l2, l1=None, time=5, max_items=10000, bus=None, channel=""
+    ):
+        self.l2 = l2
+        self.l1 = l1 or MemoryCache(max_items=max_items)
+        self.time = time
+        self.bus = bus
+        self.channel = channel
+        if bus is not None:
+            bus.subscribe(channel, self.l1)
+
+    def set(self, key, value, time=0, namespace=None):
+        """Sets a key's value, regardless of previous contents
+        in cache.
+        """
+        if self.l2.set(key, value, time, namespace):
+            self.invalidate((key,))
+            return self.l1.set(key, value, self.l1_time(time), namespace)
+        self.l1.delete(key, 0, namespace)
+        return False
+
+    def set_multi(self, mapping, time=0, namespace=None):
+        """Set multiple keys' values at once."""
+        keys_failed = self.l2.set_multi(mapping, time, namespace)
+        self.fill_multi(mapping, keys_failed, time, namespace)
+        return keys_failed
+
+    def add(self, key, value, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not
+        already.
+        """
+        if self.l2.add(key, value, time, namespace):
+            self.invalidate((key,))
+            return self.l1.set(key, value, self.l1_time(time), namespace)
+        self.l1.delete(key, 0, namespace)
+        return False
+
+    def add_multi(self, mapping, time=0, namespace=None):
+        """Adds multiple values at once, with no effect for keys
+        already in cache.
+        """
+        keys_failed = self.l2.add_multi(mapping, time, namespace)
+        self.fill_multi(mapping, keys_failed, time, namespace)
+        return keys_failed
+
+    def replace(self, key, value, time=0, namespace=None):
+        """Replaces a key's value, failing if item isn't already."""
+        if self.l2.replace(key, value, time, namespace):
+            self.invalidate((key,))
+            return self.l1.set(key, value, self.l1_time(time), namespace)
+        self.l1.delete(key, 0, namespace)
+        return False
+
+    def replace_multi(self, mapping, time=0, namespace=None):
+        """Replaces multiple values at once, with no effect for
+        keys not in cache.
+        """
+        keys_failed = self.l2.replace_multi(mapping, time, namespace)
+        self.fill_multi(mapping, keys_failed, time, namespace)
+        return keys_failed
+
+    def get(self, key, namespace=None):
+        """Looks up a single key."""
+        value = self.l1.get(key, namespace)
+        if value is None:
+            value = self.l2.get(key, namespace)
+            if value is not None:
+                self.l1.set(key, value, self.time, namespace)
+        return value
+
+    def get_multi(self, keys, namespace=None):
+        """Looks up multiple keys from cache in one operation.
+        This is the recommended way to do bulk loads.
+        """
+        keys = list(keys)
+        results = self.l1.get_multi(keys, namespace)
+        missing = [key for key in keys if key not in results]
+        if missing:
+            found = self.l2.get_multi(missing, namespace)
+            if found:
+                self.l1.set_multi(found, self.time, namespace)
+                results.update(found)
+        return results
+
+    def gets(self, key, namespace=None):
+        """Looks up a single key in ``l2``, returns a tuple of value
+        and cas token.
+        """
+        value, token = self.l2.gets(key, namespace)
+        if value is not None:
+            self.l1.set(key, value, self.time, namespace)
+        return value, token
+
+    def gets_multi(self, keys, namespace=None):
+        """Looks up multiple keys in ``l2``, returns a dict of found
+        keys to a tuple of value and cas token.
+        """
+        results = self.l2.gets_multi(keys, namespace)
+        if results:
+            self.l1.set_multi(
+                dict((key, value) for key, (value, token) in results.items()),
+                self.time,
+                namespace,
+            )
+        return results
+
+    def cas(self, key, value, token, time=0, namespace=None):
+        """Sets a key's value, if and only if the item is not changed
+        since it was looked up by ``gets``.
+        """
+        if self.l2.cas(key, value, token, time, namespace):
+            self.invalidate((key,))
+            return self.l1.set(key, value, self.l1_time(time), namespace)
+        self.l1.delete(key, 0, namespace)
+        return False
+
+    def touch(self, key, time=0, namespace=None):
+        """Sets a new expiration ``time`` of a key in ``l2``, the
+        value is kept. Returns False if ``key`` is not found.
+        """
+        return self.l2.touch(key, time, namespace)
+
+    def touch_multi(self, keys, time=0, namespace=None):
+        """Sets a new expiration ``time`` of multiple keys in ``l2``.
+        Returns a list of keys not found.
+        """
+        return self.l2.touch_multi(keys, time, namespace)
+
+    def get_and_touch(self, key, time=0, namespace=None):
+        """Looks up a single key in ``l2`` and sets its new
+        expiration ``time``.
+        """
+        value = self.l2.get_and_touch(key, time, namespace)
+        if value is not None:
+            self.l1.set(key, value, self.time, namespace)
+        return value
+
+    def delete(self, key, seconds=0, namespace=None):
+        """Deletes a key from cache."""
+        self.invalidate((key,))
+        self.l1.delete(key, 0, namespace)
+        return self.l2.delete(key, seconds, namespace)
+
+    def delete_multi(self, keys, seconds=0, namespace=None):
+        """Delete multiple keys at once."""
+        keys = list(keys)
+        self.invalidate(keys)
+        self.l1.delete_multi(keys, 0, namespace)
+        return self.l2.delete_multi(keys, seconds, namespace)
+
+    def incr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically increments a key's value."""
+        value = self.l2.incr(key, delta, namespace, initial_value)
+        self.invalidate((key,))
+        if value is None:
+            self.l1.delete(key, 0, namespace)
+        else:
+            self.l1.set(key, value, self.time, namespace)
+        return value
+
+    def decr(self, key, delta=1, namespace=None, initial_value=None):
+        """Atomically decrements a key's value."""
+        value = self.l2.decr(key, delta, namespace, initial_value)
+        self.invalidate((key,))
+        if value is None:
+            self.l1.delete(key, 0, namespace)
+        else:
+            self.l1.set(key, value, self.time, namespace)
+        return value
+
+    def flush_all(self):
+        """Deletes everything in ``l2`` and local ``l1``. The flush is
+        not published to ``bus``, ``l1`` of other processes keeps
+        copies for up to ``time`` seconds.
+        """
+        self.l1.flush_all()
+        return self.l2.flush_all()
+
+    # region: internal details
+
+    def l1_time(self, time):
+        """Returns a time for ``l1`` copy of item stored for ``time``.
+
+        >>> c = TieredCache(None, time=5)
+        >>> c.l1_time(0), c.l1_time(3), c.l1_time(100), c.l1_time(3000000)
+        (5, 3, 5, 5)
+        """
+        if 0 < time < self.time:
+            return time
+        return self.time
+
+    def invalidate(self, keys):
+        """Publishes ``keys`` to the invalidation bus if any."""
+        if self.bus is not None:
+            self.bus.publish(self.channel, keys)
+
+    def fill_multi(self, mapping, keys_failed, time, namespace):
+        if keys_failed:
+            self.l1.delete_multi(keys_failed, 0, namespace)
+            failed = set(keys_failed)
+            mapping = dict(
+                (key, value)
+                for key, value in mapping.items()
+                if key not in failed
+            )
+        if mapping:
+            self.invalidate(list(mapping))
+            self.l1.set_multi(mapping, self.l1_time(time), namespace)
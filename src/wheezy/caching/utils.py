@@ -1,4 +1,8 @@
 from datetime import timedelta
+from random import random
+
+# max number of distinct times a multi key write is split into
+JITTER_GROUPS = 10
 
 
 def total_seconds(delta):
@@ -29,3 +33,59 @@ def total_seconds(delta):
         raise TypeError(
             "Expecting type datetime.timedelta " "or int for seconds"
         )
+
+
+def jitter_time(time, jitter):
+    """Returns ``time`` shortened at random by up to ``jitter``
+    fraction of it, so items written together do not expire in the
+    same second. ``jitter`` is in range [0, 1), the result is at
+    least 1 second.
+
+    >>> 80 <= jitter_time(100, 0.2) <= 100
+    True
+    >>> jitter_time(1, 0.9)
+    1
+
+    Unless ``time`` means never or an absolute unix time.
+
+    >>> jitter_time(0, 0.2), jitter_time(3000000, 0.2)
+    (0, 3000000)
+    """
+    assert 0 <= jitter < 1
+    if 0 < time < 2592000:
+        return max(time - int(random() * (int(time * jitter) + 1)), 1)
+    return time
+
+
+def jitter_multi(store_multi, mapping, time, jitter, namespace=None):
+    """Stores ``mapping`` with ``store_multi`` (e.g. ``set_multi`` of a
+    cache) split into at most ``JITTER_GROUPS`` groups of keys, each
+    with ``time`` shortened by a different part of ``jitter``. Returns a
+    list of keys failed.
+
+    >>> from wheezy.caching.memory import MemoryCache
+    >>> c = MemoryCache()
+    >>> mapping = dict((i, i) for i in range(100))
+    >>> jitter_multi(c.set_multi, mapping, 100, 0.2)
+    []
+    >>> times = set(item.expires for item in c.items.values())
+    >>> 1 < len(times) <= JITTER_GROUPS
+    True
+    """
+    assert 0 <= jitter < 1
+    spread = 0 < time < 2592000 and int(time * jitter) or 0
+    if not spread or len(mapping) < 2:
+        return store_multi(mapping, jitter_time(time, jitter), namespace)
+    n = min(spread + 1, JITTER_GROUPS)
+    groups = [{} for i in range(n)]
+    for key, value in mapping.items():
+        groups[int(random() * n)][key] = value
+    failed = []
+    for i, group in enumerate(groups):
+        if group:
+            failed.extend(
+                store_multi(
+                    group, max(time - spread * i // (n - 1), 1), namespace
+                )
+            )
+    return failed